@@ -0,0 +1,131 @@
+'''
+This module provides the AccessLog class, an asynchronous and sampled access log with one
+structured line per request.
+
+Request handlers only put a log record into a queue (QueueHandler). A QueueListener thread
+formats the line and writes it to the output, so neither formatting nor the write to stdout
+happen on the request path. The line is logfmt, e.g.
+
+    [Access] method=GET path=/api/display status=200 duration_ms=12.3 bytes=245
+    remote=192.168.1.20 device=AA:BB:CC:DD:EE:FF
+
+Sampling: of the successful requests only the share sample_rate is logged. Errors (status 400
+and above) and slow requests are always logged.
+
+Classes:
+    AccessLog: Queue based access log with sampling.
+
+Functions:
+    queue_logging: Returns a QueueHandler and a QueueListener for the given handlers.
+
+Usage example:
+    access_log = AccessLog(logging.StreamHandler(sys.stdout), sample_rate=0.1)
+    access_log.start()
+    access_log.log('GET', '/status', 200, 0.0012, bytes=512, remote='127.0.0.1')
+    access_log.stop()
+'''
+import random
+import logging
+import logging.handlers
+import queue
+
+logger = logging.getLogger('__main__')
+logger.info('[AccessLog] loading module ')
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    '''
+    QueueHandler that leaves the formatting to the listener thread. The standard QueueHandler
+    formats the message in the calling thread, the access log records only carry immutable
+    arguments, so they can be formatted later.
+    '''
+    def prepare(self, record):
+        return record
+
+
+def queue_logging(*handlers, defer_formatting=False):
+    """
+    Returns a QueueHandler and a QueueListener writing the queued records to the handlers.
+    With defer_formatting the message is formatted in the listener thread, this is only safe
+    for records whose arguments are not changed after the logging call.
+    """
+    log_queue = queue.SimpleQueue()
+    handler_class = _DeferredQueueHandler if defer_formatting else logging.handlers.QueueHandler
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    return handler_class(log_queue), listener
+
+
+class AccessLog:
+    '''
+    One structured line per request, sampled and written by a listener thread.
+    '''
+    def __init__(self, handler, sample_rate=1.0, name="trmnl.access"):
+        self.sample_rate = sample_rate
+        self.counters = {"requests": 0, "logged": 0}
+        self._logger = logging.getLogger(name)
+        self._logger.propagate = False
+        self._logger.setLevel(logging.INFO)
+        queue_handler, self._listener = queue_logging(handler, defer_formatting=True)
+        self._logger.handlers = [queue_handler]
+        self._started = False
+
+    def start(self):
+        """
+        Starts the listener thread.
+        """
+        if not self._started:
+            self._listener.start()
+            self._started = True
+
+    def stop(self):
+        """
+        Writes the queued lines and stops the listener thread.
+        """
+        if self._started:
+            self._listener.stop()
+            self._started = False
+
+    def sampled(self, status, always=False):
+        """
+        Returns True if the request is logged: errors and forced requests always, others with
+        the probability sample_rate.
+        """
+        return always or status >= 400 or (
+            self.sample_rate >= 1.0 or random.random() < self.sample_rate
+        )
+
+    def log(self, method, path, status, duration, always=False, **fields):
+        """
+        Queues the access line of a request (duration in seconds), extra fields like size,
+        remote or device are appended as key=value.
+        """
+        self.counters["requests"] += 1
+        if not self.sampled(status, always):
+            return False
+        self.counters["logged"] += 1
+        names = "".join(f" {name}=%s" for name in fields)
+        self._logger.info(
+            "[Access] method=%s path=%s status=%s duration_ms=%.1f" + names,
+            method,
+            _quote(path),
+            status,
+            duration * 1000,
+            *(_quote(value) for value in fields.values()),
+        )
+        return True
+
+    def stats(self):
+        """
+        Returns the sample rate and the counters of the access log.
+        """
+        return {"sample_rate": self.sample_rate, **self.counters}
+
+
+def _quote(value):
+    """
+    Quotes a logfmt value containing spaces, quotes or equal signs.
+    """
+    value = "-" if value is None else str(value)
+    if any(char in value for char in ' "='):
+        return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+    return value
@@ -0,0 +1,109 @@
+#! /usr/bin/env python
+"""
+Benchmark of the peak memory of a /server/battery?all response, built at once versus streamed.
+
+For synthetic histories (one sample every 2 minutes) the former response (list of dicts of the
+whole range, encoded to one JSON string) is compared with the streamed response (generator of
+the rows, encoded in chunks by json_array_chunks). The peak memory is measured with tracemalloc.
+
+Run from the repository root:
+    python benchmarks/bench_battery_stream.py [rows ...]
+"""
+import os
+import sys
+import json
+import time
+import random
+import tracemalloc
+
+from harness import REPO_DIR, run_row_counts
+
+sys.path.insert(0, REPO_DIR)
+# pylint: disable=wrong-import-position
+from telemetry_store import TelemetryStore, format_timestamp
+from streaming import json_array_chunks, csv_chunks
+
+SAMPLE_INTERVAL = 120
+
+
+def iter_rows(store):
+    """
+    Yields the rows of the whole history like iter_client_data in trmnl_server.
+    """
+    for epoch, battery_voltage, rssi in store.iter_range():
+        yield {
+            "battery_voltage": battery_voltage,
+            "rssi": rssi,
+            "timestamp": format_timestamp(epoch),
+        }
+
+
+def built_at_once(store):
+    """
+    The former battery_view: all rows as list, encoded to one JSON string.
+    """
+    rows = list(iter_rows(store))
+    return len(json.dumps(rows, separators=(",", ":"), sort_keys=True))
+
+
+def streamed(store):
+    """
+    The streamed battery_view: the chunks are sent (here: counted) one after another.
+    """
+    return sum(len(chunk) for chunk in json_array_chunks(iter_rows(store)))
+
+
+def streamed_csv(store):
+    """
+    The streamed CSV export.
+    """
+    return sum(
+        len(chunk)
+        for chunk in csv_chunks(iter_rows(store), ["timestamp", "battery_voltage", "rssi"])
+    )
+
+
+def measure(func, store):
+    """
+    Returns response size, duration in milliseconds and peak memory in MB of the call.
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = func(store)
+    duration = (time.perf_counter() - start) * 1000
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, duration, peak / 1e6
+
+
+def run(rows, workdir):
+    """
+    Runs the benchmark for the given number of rows and prints one result line per variant.
+    """
+    store = TelemetryStore(os.path.join(workdir, f"clientData_{rows}.bin"))
+    start = int(time.time()) - rows * SAMPLE_INTERVAL
+    store.append(
+        (
+            start + row * SAMPLE_INTERVAL,
+            round(random.uniform(3.3, 4.1), 2),
+            random.randint(-90, -40),
+        )
+        for row in range(rows)
+    )
+    for name, func in (("at once", built_at_once), ("streamed", streamed), ("csv", streamed_csv)):
+        size, duration, peak = measure(func, store)
+        print(
+            f"{rows:>8d} rows | {name:8s} | {size / 1e6:7.1f} MB response | "
+            f"{duration:9.1f} ms | peak {peak:8.1f} MB"
+        )
+
+
+def main():
+    """
+    Runs the benchmark for 10k, 100k and 500k rows or the given row counts.
+    """
+    run_row_counts(run, [10_000, 100_000, 500_000])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#! /usr/bin/env python
+"""
+Benchmark of the 1-bit BMP encoding of a 800x480 frame.
+
+Compares the previous path (PIL BMP save plus patching the palette in the header) with the
+native encoder in bmp_encoder.py. Reports the encode time and the allocated memory per frame.
+
+Run from the repository root:
+    python benchmarks/bench_bmp_encoder.py [frames]
+"""
+import os
+import sys
+import time
+import tracemalloc
+from io import BytesIO
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bmp_encoder import encode_image_1bpp_bmp  # pylint: disable=wrong-import-position
+
+FRAME_SIZE = (800, 480)
+
+
+def encode_pil(image):
+    """
+    Previous encoding path: PIL BMP save and palette patch at offset 54.
+    """
+    img_io = BytesIO()
+    image.save(img_io, format="BMP")
+    img_io.seek(54)
+    img_io.write(bytes([0, 0, 0, 0, 255, 255, 255, 0]))
+    img_io.seek(0)
+    return img_io
+
+
+def encode_native(image):
+    """
+    Native encoder path.
+    """
+    return BytesIO(encode_image_1bpp_bmp(image))
+
+
+def measure(encode, image, frames, repeats=5):
+    """
+    Returns the encode time in microseconds (best of the repeats) and the allocated bytes
+    per frame.
+    """
+    encode(image)
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(frames):
+            encode(image)
+        durations.append((time.perf_counter() - start) / frames)
+    duration = min(durations)
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    encode(image)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return round(duration * 1e6, 1), peak - before
+
+
+def main():
+    """
+    Runs the benchmark and prints one line per encoder.
+    """
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    dummy_path = os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "web", "dummy.bmp"
+    )
+    image = Image.open(dummy_path).convert("1").resize(FRAME_SIZE)
+    if encode_pil(image).getvalue() != encode_native(image).getvalue():
+        print("WARNING: encoders produce different output")
+    print(f"{frames} frames {FRAME_SIZE[0]}x{FRAME_SIZE[1]}")
+    for name, encode in (("pil_save_and_patch", encode_pil), ("native", encode_native)):
+        duration_us, allocated = measure(encode, image, frames)
+        print(f"{name:20s} {duration_us:10.1f} us/frame {allocated:10d} bytes allocated/frame")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#! /usr/bin/env python
+"""
+Checks that a slow upstream image does not stall concurrent requests in cooperative mode.
+
+A local upstream HTTP server answers image requests after a delay. trmnl_server's app is served
+by the server's QuietWSGIServer in a child process, once in the default mode and once with
+TRMNL_COOPERATIVE_IO=1. While /api/display waits for the slow upstream image, /status,
+/settings and /image/dummy.bmp are requested concurrently and their latency is reported.
+Exits with 1 if a concurrent request in cooperative mode waited for the upstream image.
+
+Run from the repository root:
+    python benchmarks/bench_cooperative_io.py
+"""
+import os
+import sys
+import time
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+
+from harness import (
+    REPO_DIR, free_port, prepare_workdir, import_server, serve_app, serve_or_run, start_child,
+    stop_child,
+)
+
+UPSTREAM_DELAY = 3.0
+PROBE_PATHS = ["/status", "/settings", "/image/dummy.bmp"]
+
+
+class SlowImageHandler(BaseHTTPRequestHandler):
+    """
+    Serves the dummy image after UPSTREAM_DELAY seconds.
+    """
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """
+        Answer every GET with the dummy image after the delay.
+        """
+        time.sleep(UPSTREAM_DELAY)
+        with open(os.path.join(REPO_DIR, "web", "dummy.bmp"), "rb") as image_file:
+            content = image_file.read()
+        self.send_response(200)
+        self.send_header("Content-Type", "image/bmp")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        return
+
+
+def serve(port, workdir):
+    """
+    Child process: serve trmnl_server's app without TLS.
+    """
+    serve_app(import_server(workdir), port)
+
+
+def run_mode(cooperative, workdir):
+    """
+    Starts the server in the given mode and measures concurrent request latencies while
+    /api/display waits for the slow upstream image.
+    """
+    port = free_port()
+    env = dict(os.environ, TRMNL_COOPERATIVE_IO="1" if cooperative else "0")
+    child, _ = start_child(__file__, port, workdir, env=env)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        def timed(path, headers=None):
+            start = time.perf_counter()
+            requests.get(base_url + path, headers=headers, timeout=30)
+            return path, time.perf_counter() - start
+
+        display_headers = {"Battery-Voltage": "3.9", "RSSI": "-60", "Refresh-Rate": "900"}
+        with ThreadPoolExecutor(max_workers=len(PROBE_PATHS) + 1) as executor:
+            display = executor.submit(timed, "/api/display", display_headers)
+            time.sleep(0.3)  # let /api/display reach the upstream fetch
+            probes = [executor.submit(timed, path) for path in PROBE_PATHS]
+            results = dict(probe.result() for probe in probes)
+            results["/api/display"] = display.result()[1]
+        return results
+    finally:
+        stop_child(child)
+
+
+def main():
+    """
+    Runs the check in default and cooperative mode and prints the latencies.
+    """
+    upstream = ThreadingHTTPServer(("127.0.0.1", free_port()), SlowImageHandler)
+    threading.Thread(target=upstream.serve_forever, daemon=True).start()
+    workdir = prepare_workdir(f"http://127.0.0.1:{upstream.server_address[1]}/screen.bmp")
+    failed = False
+    try:
+        for cooperative in (False, True):
+            results = run_mode(cooperative, workdir)
+            mode = "cooperative" if cooperative else "default"
+            for path, latency in results.items():
+                print(f"{mode:12s} {path:20s} {latency * 1000:8.1f} ms")
+            # the probes are sent while /api/display waits for the upstream image, with
+            # cooperative I/O none of them may have to wait until the upstream answers
+            stalled = [p for p in PROBE_PATHS if results[p] >= UPSTREAM_DELAY * 0.9]
+            if cooperative and stalled:
+                print(f"FAILED: stalled by slow upstream image: {', '.join(stalled)}")
+                failed = True
+    finally:
+        upstream.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    serve_or_run(serve, main)
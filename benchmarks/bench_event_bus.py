@@ -0,0 +1,84 @@
+#! /usr/bin/env python
+"""
+Benchmark of the event bus behind the /events stream of the web dashboard.
+
+1. Cost of publish() per event and per subscriber for 1, 10 and 100 subscriptions, the cost
+   per subscriber should stay constant (one deque append and one wakeup, the event is encoded
+   once).
+2. A subscription that never reads (a slow browser tab) keeps at most queue_size events, the
+   older ones are dropped and counted.
+3. Requests per minute of one open dashboard tab with the former polling (status every 5 s,
+   logs every second, server load every 30 s, charts every minute) compared with one stream.
+
+Run from the repository root:
+    python benchmarks/bench_event_bus.py [events]
+"""
+import os
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+# pylint: disable=wrong-import-position
+from event_bus import EventBus
+
+QUEUE_SIZE = 100
+POLLING_INTERVALS = {"/status": 5, "/server/log": 1, "/status/history": 30, "/server/battery": 60}
+EVENT = {
+    "timestamp": "2025-01-30 12:00:00",
+    "context": "[Request received at /api/display]",
+    "info": "ID: AA:BB:CC:DD:EE:FF, Battery-Voltage: 3.9, RSSI: -60, Refresh-Rate: 900",
+}
+
+
+def publish_cost(subscribers, events):
+    """
+    Returns the microseconds per publish() and the nanoseconds per delivered event with the
+    given number of subscriptions, the queues are drained every QUEUE_SIZE events.
+    """
+    bus = EventBus(queue_size=QUEUE_SIZE, max_subscribers=subscribers)
+    subscriptions = [bus.subscribe() for _ in range(subscribers)]
+    start = time.perf_counter()
+    for event in range(events):
+        bus.publish("log", EVENT)
+        if event % QUEUE_SIZE == QUEUE_SIZE - 1:
+            for subscription in subscriptions:
+                subscription.messages.clear()
+    duration = time.perf_counter() - start
+    return duration / events * 1e6, duration / (events * subscribers) * 1e9
+
+
+def slow_subscriber(events):
+    """
+    Publishes events to a subscription that never reads, returns its queue length and the
+    number of dropped events.
+    """
+    bus = EventBus(queue_size=QUEUE_SIZE)
+    subscription = bus.subscribe()
+    for _ in range(events):
+        bus.publish("log", EVENT)
+    return len(subscription.messages), subscription.dropped
+
+
+def main():
+    """
+    Runs the benchmarks and prints the results.
+    """
+    events = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    for subscribers in (1, 10, 100):
+        per_event, per_subscriber = publish_cost(subscribers, events)
+        print(
+            f"{subscribers:4d} subscribers {per_event:9.2f} us/event "
+            f"{per_subscriber:7.1f} ns/event/subscriber"
+        )
+
+    queued, dropped = slow_subscriber(events)
+    print(f"slow subscriber: {queued} queued, {dropped} dropped of {events} events")
+
+    polling = sum(60 / interval for interval in POLLING_INTERVALS.values())
+    print(f"dashboard tab: polling {polling:.0f} requests/min, events 1 stream")
+    print("OK" if queued == QUEUE_SIZE and queued + dropped == events else "FAILED")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+#! /usr/bin/env python
+"""
+Load generator simulating a fleet of TRMNL devices against trmnl_server over TLS.
+
+trmnl_server's app is served by the server's QuietWSGIServer with TLS in a child process on
+localhost (or an already running server is given with --url). Every simulated device runs in a
+thread of its own and follows the sequence of the firmware:
+
+    setup   - GET /api/setup with ID, FW-Version and Model once
+    display - GET /api/display with Battery-Voltage, RSSI and Refresh-Rate on every wake
+    image   - GET of the returned image_url on the same connection
+    log     - POST /api/log with a few log entries on some wakes (--log-probability)
+
+A device wakes every --refresh seconds with its own jitter (the refresh time is compressed, the
+devices of a real fleet wake every 15 minutes) and opens a new TLS connection per wake, like a
+device coming out of deep sleep. Setup and first wake of the devices are spread over one refresh
+period.
+
+For every fleet size the p50/p95/p99 latency and the error rate are reported per step and for
+the whole wake (display and image). The fleet size at which the wake latency degrades is the
+capacity of the server.
+
+Run from the repository root:
+    python benchmarks/bench_fleet_load.py [--devices 10 50 100] [--duration 30] [--refresh 5]
+"""
+import ssl
+import json
+import time
+import random
+import shutil
+import argparse
+import threading
+import http.client
+from urllib.parse import urlsplit
+
+from harness import (
+    free_port, prepare_workdir, import_server, serve_tls, serve_or_run, start_child, stop_child,
+)
+
+STEPS = ("setup", "display", "image", "log", "wake")
+
+
+def serve(port, workdir):
+    """
+    Child process: serve trmnl_server's app with TLS like in production.
+    """
+    trmnl_server = import_server(workdir)
+    serve_tls(trmnl_server, port, workdir, trmnl_server.config_manager.config["ssl_key_type"])
+
+
+class FleetStats:
+    '''
+    Latencies in milliseconds and errors per step, shared by the device threads.
+    '''
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {step: [] for step in STEPS}
+        self.errors = {step: 0 for step in STEPS}
+
+    def record(self, step, start, ok=True):
+        """
+        Records the latency since start (perf_counter) or an error of the step.
+        """
+        with self._lock:
+            if ok:
+                self.latencies[step].append((time.perf_counter() - start) * 1000)
+            else:
+                self.errors[step] += 1
+
+    def summary(self):
+        """
+        Returns count, errors, error rate and p50/p95/p99 in milliseconds per step.
+        """
+        summary = {}
+        with self._lock:
+            for step in STEPS:
+                latencies = sorted(self.latencies[step])
+                errors = self.errors[step]
+                total = len(latencies) + errors
+                summary[step] = {
+                    "count": total,
+                    "errors": errors,
+                    "error_rate": round(errors / total, 4) if total else 0.0,
+                    **{
+                        f"p{percentile}_ms": (
+                            round(latencies[int(percentile / 100 * (len(latencies) - 1))], 2)
+                            if latencies else None
+                        )
+                        for percentile in (50, 95, 99)
+                    },
+                }
+        return summary
+
+
+class Device:
+    '''
+    A simulated device with its own ID, battery, signal and jittered refresh schedule.
+    '''
+    def __init__(self, index, server, options, stats):
+        self.mac = ":".join(f"{byte:02X}" for byte in (0xA0, 0xB0, 0, 0, index >> 8, index & 255))
+        # host, port and client SSL context
+        self.server = server
+        self.options = options
+        self.stats = stats
+        self.random = random.Random(index)
+        self.battery_voltage = self.random.uniform(3.6, 4.1)
+        self.log_id = 0
+
+    def request(self, connection, method, path, headers, body=None):
+        """
+        Sends a request and returns the response body, raises for a status other than 200.
+        """
+        connection.request(method, path, body=body, headers=headers)
+        response = connection.getresponse()
+        data = response.read()
+        if response.status != 200:
+            raise http.client.HTTPException(f"{path}: HTTP {response.status}")
+        return data
+
+    def connect(self):
+        """
+        Opens a new TLS connection, like a device after deep sleep.
+        """
+        host, port, context = self.server
+        return http.client.HTTPSConnection(
+            host, port, context=context, timeout=self.options.timeout
+        )
+
+    def step(self, name, connection, method, path, headers, body=None):  # pylint: disable=R0913,R0917
+        """
+        Runs one step and records its latency. Returns the response body or None on errors.
+        """
+        start = time.perf_counter()
+        try:
+            data = self.request(connection, method, path, headers, body)
+        except (OSError, http.client.HTTPException):
+            self.stats.record(name, start, ok=False)
+            return None
+        self.stats.record(name, start)
+        return data
+
+    def setup(self):
+        """
+        Registers the device with /api/setup.
+        """
+        connection = self.connect()
+        try:
+            headers = {"ID": self.mac, "FW-Version": "1.5.2", "Model": "og"}
+            self.step("setup", connection, "GET", "/api/setup", headers)
+        finally:
+            connection.close()
+
+    def wake(self):
+        """
+        Runs one wake: /api/display, the image and sometimes /api/log on one connection.
+        """
+        self.battery_voltage = max(3.3, self.battery_voltage - self.random.uniform(0, 0.002))
+        headers = {
+            "ID": self.mac,
+            "Access-Token": f"key_{self.mac.replace(':', '')}",
+            "Battery-Voltage": f"{self.battery_voltage:.2f}",
+            "RSSI": str(self.random.randint(-85, -45)),
+            "Refresh-Rate": "900",
+            "FW-Version": "1.5.2",
+        }
+        start = time.perf_counter()
+        connection = self.connect()
+        try:
+            data = self.step("display", connection, "GET", "/api/display", headers)
+            if data is None:
+                self.stats.record("wake", start, ok=False)
+                return
+            image_path = urlsplit(json.loads(data)["image_url"]).path
+            if self.step("image", connection, "GET", image_path, {"ID": self.mac}) is None:
+                self.stats.record("wake", start, ok=False)
+                return
+            self.stats.record("wake", start)
+            if self.random.random() < self.options.log_probability:
+                self.post_log(connection, headers)
+        finally:
+            connection.close()
+
+    def post_log(self, connection, headers):
+        """
+        Posts a few log entries in the schema of the firmware.
+        """
+        logs = []
+        for _ in range(self.random.randint(1, 3)):
+            self.log_id += 1
+            logs.append({
+                "creation_timestamp": int(time.time()),
+                "log_id": self.log_id,
+                "log_message": "wifi connection took longer than expected",
+                "log_codeline": 587,
+                "log_sourcefile": "src/bl.cpp",
+                "device_status_stamp": {
+                    "wifi_rssi_level": int(headers["RSSI"]),
+                    "wifi_status": "connected",
+                    "refresh_rate": 900,
+                    "time_since_last_sleep_start": 900,
+                    "current_fw_version": "1.5.2",
+                    "special_function": "none",
+                    "battery_voltage": self.battery_voltage,
+                    "wakeup_reason": "timer",
+                    "free_heap_size": 160000,
+                },
+            })
+        body = json.dumps({"log": {"logs_array": logs}})
+        self.step("log", connection, "POST", "/api/log",
+                  {"ID": self.mac, "Content-Type": "application/json"}, body)
+
+    def run(self, stop_at):
+        """
+        Sets up the device at a random time of the first refresh period and wakes it on its
+        jittered schedule until stop_at.
+        """
+        refresh = self.options.refresh
+        time.sleep(self.random.uniform(0, refresh))
+        self.setup()
+        next_wake = time.monotonic()
+        while True:
+            delay = next_wake - time.monotonic()
+            if next_wake >= stop_at:
+                return
+            if delay > 0:
+                time.sleep(delay)
+            self.wake()
+            jitter = self.random.uniform(-self.options.jitter, self.options.jitter)
+            next_wake += refresh * (1 + jitter)
+
+
+def run_fleet(devices, host, port, options):
+    """
+    Runs a fleet of devices for options.duration seconds and returns the statistics.
+    """
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    stats = FleetStats()
+    stop_at = time.monotonic() + options.duration
+    threads = [
+        threading.Thread(
+            target=Device(index, (host, port, context), options, stats).run, args=(stop_at,),
+            daemon=True,
+        )
+        for index in range(devices)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return stats.summary()
+
+
+def print_summary(devices, summary, duration):
+    """
+    Prints the statistics of one fleet size.
+    """
+    wakes = summary["wake"]["count"]
+    print(f"\n{devices} devices, {wakes} wakes, {wakes / duration:.1f} wakes/s")
+    print(f"  {'step':8s} {'count':>7s} {'errors':>7s} {'p50 ms':>9s} {'p95 ms':>9s} "
+          f"{'p99 ms':>9s}")
+    for step in STEPS:
+        result = summary[step]
+        if not result["count"]:
+            continue
+        percentiles = " ".join(
+            f"{result[key]:9.1f}" if result[key] is not None else f"{'-':>9s}"
+            for key in ("p50_ms", "p95_ms", "p99_ms")
+        )
+        print(f"  {step:8s} {result['count']:7d} {result['error_rate'] * 100:6.1f}% "
+              f"{percentiles}")
+
+
+def start_server():
+    """
+    Starts trmnl_server in a child process. Returns the process, port and working directory.
+    """
+    workdir = prepare_workdir()
+    port = free_port()
+    child, _ = start_child(__file__, port, workdir)
+    return child, port, workdir
+
+
+def main():
+    """
+    Runs the fleets of the given sizes one after another and prints the results.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--devices", type=int, nargs="+", default=[10, 50, 100],
+                        help="fleet sizes, run one after another")
+    parser.add_argument("--duration", type=float, default=30, help="seconds per fleet size")
+    parser.add_argument("--refresh", type=float, default=5, help="seconds between two wakes")
+    parser.add_argument("--jitter", type=float, default=0.2,
+                        help="relative jitter of the refresh time per wake")
+    parser.add_argument("--log-probability", type=float, default=0.1,
+                        help="share of wakes posting to /api/log")
+    parser.add_argument("--timeout", type=float, default=30, help="request timeout in seconds")
+    parser.add_argument("--url", help="running server, e.g. https://127.0.0.1:83")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    options = parser.parse_args()
+
+    child = workdir = None
+    if options.url:
+        url = urlsplit(options.url)
+        host, port = url.hostname, url.port or 443
+    else:
+        child, port, workdir = start_server()
+        host = "127.0.0.1"
+    results = {}
+    try:
+        for devices in options.devices:
+            summary = run_fleet(devices, host, port, options)
+            print_summary(devices, summary, options.duration)
+            results[str(devices)] = summary
+    finally:
+        if child is not None:
+            stop_child(child)
+            shutil.rmtree(workdir, ignore_errors=True)
+    if options.output:
+        with open(options.output, "w", encoding="utf-8") as file:
+            json.dump({"options": vars(options), "results": results}, file, indent=2)
+
+
+if __name__ == "__main__":
+    serve_or_run(serve, main)
@@ -0,0 +1,78 @@
+#! /usr/bin/env python
+"""
+Regression check and benchmark of the glyph atlas of the footer.
+
+Complete footers (add_footer_to_image of trmnl_server) are rendered for every WiFi and battery
+percentage, charging included, once with the glyph atlases and once with PIL's text rendering
+(atlases switched off), and the decoded pixels are compared. Reported are the milliseconds per
+footer both ways (render cache cleared before every footer). The check fails (exit code 1) if a
+footer drawn with the atlas differs from the PIL rendering.
+
+Run from the repository root:
+    python benchmarks/bench_footer_atlas.py
+"""
+import os
+import sys
+import time
+import shutil
+from io import BytesIO
+from PIL import Image
+
+from harness import prepare_workdir, import_server, report_failures
+
+# battery percentage 255 is drawn as charging
+FOOTER_VALUES = [(value, value) for value in range(101)] + [(60, 255)]
+
+
+def render(trmnl_server, source, values, atlases):
+    """
+    Renders the footers of the values with the given glyph atlases (empty for PIL text
+    rendering). Returns the decoded pixels per values, the rendered minute and the milliseconds
+    per footer.
+    """
+    trmnl_server.render_resources.atlases = atlases
+    minute = trmnl_server.datetime.datetime.now().minute
+    frames = {}
+    start = time.perf_counter()
+    for wifi, battery in values:
+        trmnl_server.render_cache.clear()
+        frame = trmnl_server.add_footer_to_image(BytesIO(source), wifi, battery)
+        frames[(wifi, battery)] = Image.open(frame).convert("1").tobytes()
+    duration = (time.perf_counter() - start) / len(values) * 1000
+    return frames, minute, duration
+
+
+def main():
+    """
+    Renders the footers with and without atlas, prints the durations and compares the pixels.
+    """
+    workdir = prepare_workdir()
+    try:
+        trmnl_server = import_server(workdir, quiet=True)
+        with open(os.path.join(workdir, "web", "dummy.bmp"), "rb") as image_file:
+            source = image_file.read()
+        atlases = dict(trmnl_server.render_resources.atlases)
+        print(f"glyph atlases: {', '.join(atlases) or 'none'}")
+        # the footer shows the time, both renderings have to show the same minute
+        for _ in range(3):
+            with_atlas, minute, atlas_ms = render(trmnl_server, source, FOOTER_VALUES, atlases)
+            with_pil, pil_minute, pil_ms = render(trmnl_server, source, FOOTER_VALUES, {})
+            if minute == pil_minute == trmnl_server.datetime.datetime.now().minute:
+                break
+        trmnl_server.render_resources.atlases = atlases
+        trmnl_server.writer.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"atlas      {atlas_ms:7.2f} ms/footer")
+    print(f"PIL text   {pil_ms:7.2f} ms/footer")
+    failures = [
+        f"footer wifi {wifi} % battery {battery} % differs from PIL rendering"
+        for wifi, battery in FOOTER_VALUES
+        if with_atlas[(wifi, battery)] != with_pil[(wifi, battery)]
+    ]
+    return report_failures(failures)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
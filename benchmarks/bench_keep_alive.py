@@ -0,0 +1,171 @@
+#! /usr/bin/env python
+"""
+Benchmark and check of HTTP keep-alive for the device wake sequence.
+
+A device wake is a GET of /api/display followed by a GET of the returned image URL. trmnl_server's
+app is served by the server's QuietWSGIServer (KeepAliveHandler, TLS) in a child process and the
+wake sequence is run sequentially:
+
+    separate   - each of the two requests opens its own TLS connection
+    keep-alive - the image request reuses the connection of /api/display
+
+Reported are wakes per second, the mean duration of the image request and the connections and
+reused requests per wake counted by /server/connections. The check fails (exit code 1) if a
+keep-alive wake opens more than one connection, if an idle connection is not closed after the
+idle timeout or if a connection is not closed at its request limit.
+
+Run from the repository root:
+    python benchmarks/bench_keep_alive.py [wakes]
+"""
+import ssl
+import sys
+import json
+import time
+import shutil
+import http.client
+from urllib.parse import urlsplit
+
+from harness import (
+    DEVICE_HEADERS, free_port, prepare_workdir, import_server, report_failures, serve_tls,
+    serve_or_run, start_child, stop_child,
+)
+
+IDLE_TIMEOUT = 1.0
+MAX_REQUESTS = 10
+
+
+def serve(port, workdir):
+    """
+    Child process: serve trmnl_server's app with TLS, a short idle timeout and request limit.
+    """
+    trmnl_server = import_server(workdir)
+    trmnl_server.KeepAliveHandler.idle_timeout = IDLE_TIMEOUT
+    trmnl_server.KeepAliveHandler.max_requests = MAX_REQUESTS
+    serve_tls(trmnl_server, port, workdir)
+
+
+def client_context():
+    """
+    Returns a client SSL context without certificate verification like the device.
+    """
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+def get(connection, path, headers=None):
+    """
+    Sends a GET request on the connection and returns the response and its body.
+    """
+    connection.request("GET", path, headers=headers or {})
+    response = connection.getresponse()
+    return response, response.read()
+
+
+def connection_stats(port, context):
+    """
+    Returns the connection counters of the server (on a connection of its own).
+    """
+    connection = http.client.HTTPSConnection("127.0.0.1", port, context=context)
+    try:
+        return json.loads(get(connection, "/server/connections")[1])
+    finally:
+        connection.close()
+
+
+def wake(port, context, keep_alive):
+    """
+    Runs one device wake and returns the duration of the image request in milliseconds.
+    """
+    connection = http.client.HTTPSConnection("127.0.0.1", port, context=context)
+    try:
+        headers = dict(DEVICE_HEADERS)
+        if not keep_alive:
+            headers["Connection"] = "close"
+        _, body = get(connection, "/api/display", headers)
+        image_path = urlsplit(json.loads(body)["image_url"]).path
+        if not keep_alive:
+            connection.close()
+            connection = http.client.HTTPSConnection("127.0.0.1", port, context=context)
+        start = time.perf_counter()
+        response, _ = get(connection, image_path)
+        duration = (time.perf_counter() - start) * 1000
+        if response.status != 200:
+            raise RuntimeError(f"{image_path}: HTTP {response.status}")
+        return duration
+    finally:
+        connection.close()
+
+
+def run(port, context, keep_alive, wakes):
+    """
+    Runs the wakes and prints wakes per second, image request duration and connection counters.
+    Returns the number of connections and reused requests per wake.
+    """
+    before = connection_stats(port, context)
+    start = time.perf_counter()
+    image_durations = [wake(port, context, keep_alive) for _ in range(wakes)]
+    duration = time.perf_counter() - start
+    after = connection_stats(port, context)
+    # the stats request itself opens one connection
+    connections = (after["connections"] - before["connections"] - 1) / wakes
+    reused = (after["reused_requests"] - before["reused_requests"]) / wakes
+    print(
+        f"{'keep-alive' if keep_alive else 'separate':10s} {wakes / duration:7.1f} wakes/s | "
+        f"image request {sum(image_durations) / wakes:6.2f} ms | "
+        f"{connections:4.2f} connections/wake | {reused:4.2f} reused requests/wake"
+    )
+    return connections, reused
+
+
+def check_limits(port, context):
+    """
+    Checks that an idle connection is closed after the idle timeout and a connection is closed
+    with 'Connection: close' after MAX_REQUESTS requests. Returns a list of failures.
+    """
+    failures = []
+    before = connection_stats(port, context)
+    connection = http.client.HTTPSConnection("127.0.0.1", port, context=context)
+    get(connection, "/server/connections")
+    time.sleep(IDLE_TIMEOUT + 0.5)
+    after = connection_stats(port, context)
+    if after["idle_closed"] <= before["idle_closed"]:
+        failures.append("idle connection not closed after the idle timeout")
+    connection.close()
+
+    connection = http.client.HTTPSConnection("127.0.0.1", port, context=context)
+    for request in range(1, MAX_REQUESTS + 1):
+        response, _ = get(connection, "/server/connections")
+        if response.will_close != (request == MAX_REQUESTS):
+            failures.append(
+                f"request {request}: Connection header '{response.getheader('Connection')}'"
+            )
+            break
+    connection.close()
+    return failures
+
+
+def main():
+    """
+    Runs the wake sequence with separate and persistent connections and checks the results.
+    """
+    wakes = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    workdir = prepare_workdir()
+    port = free_port()
+    child, _ = start_child(__file__, port, workdir)
+    try:
+        context = client_context()
+        run(port, context, False, wakes)
+        connections, reused = run(port, context, True, wakes)
+        failures = check_limits(port, context)
+        if connections != 1 or reused != 1:
+            failures.insert(0, "keep-alive wake did not reuse its connection for the image")
+    finally:
+        stop_child(child)
+        shutil.rmtree(workdir, ignore_errors=True)
+    return report_failures(failures)
+
+
+if __name__ == "__main__":
+    serve_or_run(serve, main)
@@ -0,0 +1,70 @@
+#! /usr/bin/env python
+"""
+Check of the prerender scheduling with devices that wake up and devices that stopped.
+
+A PrerenderScheduler with a compressed lead time, refresh time and maximum frame age renders a
+dummy frame. Live devices contact on every predicted wake-up (take_frame and schedule like
+/api/display), missing devices contact once and never again. Reported are the renders, the
+frames taken on time and the devices still known to the scheduler. The check fails (exit code
+1) if a device is rendered more than once per predicted wake-up, if a live wake gets no
+prerendered frame or if a missing device is not forgotten after the maximum frame age.
+
+Run from the repository root:
+    python benchmarks/bench_prerender.py [wakes]
+"""
+import sys
+import time
+
+from harness import REPO_DIR, report_failures
+
+sys.path.insert(0, REPO_DIR)
+# pylint: disable=wrong-import-position
+from prerender import PrerenderScheduler
+
+LIVE_DEVICES = 3
+MISSING_DEVICES = 5
+REFRESH_TIME = 0.3
+LEAD_TIME = 0.1
+MAX_FRAME_AGE = 0.5
+
+
+def main():
+    """
+    Runs the live and missing devices and checks the renders and the known devices.
+    """
+    wakes = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    scheduler = PrerenderScheduler(
+        lambda: b"frame", lambda: "config", lead_time=LEAD_TIME, max_frame_age=MAX_FRAME_AGE
+    )
+    scheduler.start()
+    live = [f"live-{device}" for device in range(LIVE_DEVICES)]
+    for device_id in live + [f"missing-{device}" for device in range(MISSING_DEVICES)]:
+        scheduler.take_frame(device_id)
+        scheduler.schedule(device_id, time.time(), REFRESH_TIME)
+    for _ in range(wakes):
+        time.sleep(REFRESH_TIME)
+        for device_id in live:
+            scheduler.take_frame(device_id)
+            scheduler.schedule(device_id, time.time(), REFRESH_TIME)
+    time.sleep(LEAD_TIME)
+    stats = scheduler.stats()
+
+    # every live wake plus the one upcoming wake per live device, one wake per missing device
+    expected_renders = LIVE_DEVICES * (wakes + 1) + MISSING_DEVICES
+    print(
+        f"{stats['renders']} renders (expected {expected_renders}) | "
+        f"{stats['on_time']} on time, {stats['late']} late of {LIVE_DEVICES * wakes} live wakes "
+        f"| {stats['devices']} devices known"
+    )
+    failures = []
+    if stats["renders"] > expected_renders:
+        failures.append("devices rendered more than once per predicted wake-up")
+    if stats["on_time"] < LIVE_DEVICES * (wakes - 1):
+        failures.append("live wakes without prerendered frame")
+    if stats["devices"] != LIVE_DEVICES or len(scheduler.frames) > LIVE_DEVICES:
+        failures.append("missing devices not forgotten")
+    return report_failures(failures)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
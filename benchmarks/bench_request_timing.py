@@ -0,0 +1,95 @@
+#! /usr/bin/env python
+"""
+Benchmark of the overhead of the request stage timing (Server-Timing header, slow request log).
+
+1. Cost of one stage(name) block: without a current timer (timing switched off), with a timer,
+   compared with an empty with block of a shared null context.
+2. Requests per second of /api/display (render cache hits) and /status through the test client
+   of trmnl_server's app, with request_timing switched on and off.
+
+Run from the repository root:
+    python benchmarks/bench_request_timing.py [requests]
+"""
+import sys
+import time
+import shutil
+from contextlib import nullcontext
+
+from harness import DEVICE_HEADERS, REPO_DIR, prepare_workdir, import_server
+
+sys.path.insert(0, REPO_DIR)
+# pylint: disable=wrong-import-position
+from request_timing import start_timer, stop_timer, stage
+
+STAGE_CALLS = 1_000_000
+
+
+def stage_cost(calls):
+    """
+    Returns the nanoseconds per with block of a null context, of stage() without a timer and of
+    stage() with a timer.
+    """
+    results = {}
+    null = nullcontext()
+    start = time.perf_counter()
+    for _ in range(calls):
+        with null:
+            pass
+    results["empty with block"] = time.perf_counter() - start
+
+    stop_timer()
+    start = time.perf_counter()
+    for _ in range(calls):
+        with stage("load_image"):
+            pass
+    results["stage, timing off"] = time.perf_counter() - start
+
+    start_timer()
+    start = time.perf_counter()
+    for _ in range(calls):
+        with stage("load_image"):
+            pass
+    results["stage, timing on"] = time.perf_counter() - start
+    stop_timer()
+    return {name: duration / calls * 1e9 for name, duration in results.items()}
+
+
+def requests_per_second(client, path, requests, headers=None):
+    """
+    Returns the requests per second of sequential GET requests of the path.
+    """
+    client.get(path, headers=headers)
+    start = time.perf_counter()
+    for _ in range(requests):
+        client.get(path, headers=headers)
+    return requests / (time.perf_counter() - start)
+
+
+def main():
+    """
+    Runs both benchmarks and prints the results.
+    """
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    for name, cost in stage_cost(STAGE_CALLS).items():
+        print(f"{name:20s} {cost:7.1f} ns")
+
+    workdir = prepare_workdir()
+    try:
+        trmnl_server = import_server(workdir, quiet=True)
+        trmnl_server.config_manager.config["slow_request_ms"] = 0
+        client = trmnl_server.app.test_client()
+        for path, headers in (("/api/display", DEVICE_HEADERS), ("/status", None)):
+            for timing in (False, True):
+                trmnl_server.config_manager.config["request_timing"] = timing
+                rate = requests_per_second(client, path, requests, headers)
+                print(
+                    f"{path:13s} request_timing {'on ' if timing else 'off'} "
+                    f"{rate:8.1f} requests/s"
+                )
+        trmnl_server.writer.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
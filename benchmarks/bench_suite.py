@@ -0,0 +1,291 @@
+#! /usr/bin/env python
+"""
+Offline benchmark suite of the render, persistence and API hot paths with JSON results.
+
+A local stand-in HTTP server serves an 800x480 source image (with ETag and 304 Not Modified
+like a dashboard server) and is configured as image_path of trmnl_server in a temporary working
+directory. The suite measures:
+
+    render      - add_footer_to_image (cold: render cache cleared, cached) and get_no_image
+    helpers     - get_battery_state and get_wifi_signal_strength
+    persistence - reading_client_data of synthetic telemetry stores of 10k, 100k and 1M samples
+    api         - /api/display, /image/screen.bmp, /status and /server/battery end to end
+                  through the Flask test client, /status, /settings and /server/battery
+                  also revalidated with If-None-Match (304 Not Modified)
+
+Every benchmark reports per call: runs, mean, median, p95 and min in milliseconds. The results
+are printed as JSON (or written to --output) together with Python, platform and git revision.
+With --compare the results are compared with those of an earlier run, a ratio above 1 means
+the current run is slower.
+
+Run from the repository root:
+    python benchmarks/bench_suite.py [--output results.json] [--compare baseline.json]
+                                     [--quick]
+"""
+import os
+import io
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import statistics
+import threading
+import subprocess
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from PIL import Image
+
+from harness import DEVICE_HEADERS, REPO_DIR, prepare_workdir, import_server
+
+SAMPLE_INTERVAL = 120
+
+
+def source_image():
+    """
+    Returns an 800x480 BMP with some structure, like a rendered dashboard.
+    """
+    image = Image.new("1", (800, 480), color=1)
+    pixels = image.load()
+    for y in range(0, 480, 3):
+        for x in range((y * 7) % 11, 800, 5):
+            pixels[x, y] = 0
+    buffer = io.BytesIO()
+    image.save(buffer, format="BMP")
+    return buffer.getvalue()
+
+
+class StandInImageHandler(BaseHTTPRequestHandler):
+    """
+    Serves the source image with ETag, answers a matching If-None-Match with 304.
+    """
+    content = b""
+    etag = '"bench"'
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """
+        Answer every GET with the source image or 304 Not Modified.
+        """
+        if self.headers.get("If-None-Match") == self.etag:
+            self.send_response(304)
+            self.send_header("ETag", self.etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/bmp")
+        self.send_header("Content-Length", str(len(self.content)))
+        self.send_header("ETag", self.etag)
+        self.end_headers()
+        self.wfile.write(self.content)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        return
+
+
+def start_stand_in():
+    """
+    Starts the stand-in image server in a thread and returns it.
+    """
+    StandInImageHandler.content = source_image()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInImageHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def measure(func, runs, number=1, setup=None):
+    """
+    Calls func number times per run and returns the statistics of the duration per call in
+    milliseconds. setup is called before every run and not measured.
+    """
+    func()
+    durations = []
+    for _ in range(runs):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        durations.append((time.perf_counter() - start) * 1000 / number)
+    durations.sort()
+    return {
+        "runs": runs,
+        "number": number,
+        "mean_ms": round(statistics.fmean(durations), 6),
+        "median_ms": round(statistics.median(durations), 6),
+        "p95_ms": round(durations[min(len(durations) - 1, int(len(durations) * 0.95))], 6),
+        "min_ms": round(durations[0], 6),
+    }
+
+
+def fill_store(store, samples):
+    """
+    Appends synthetic samples (one every SAMPLE_INTERVAL seconds up to now) to the store.
+    """
+    start = int(time.time()) - samples * SAMPLE_INTERVAL
+    store.append(
+        (
+            start + sample * SAMPLE_INTERVAL,
+            round(random.uniform(3.3, 4.1), 2),
+            random.randint(-90, -40),
+        )
+        for sample in range(samples)
+    )
+
+
+def bench_render(server, runs):
+    """
+    Benchmarks add_footer_to_image (cold and cached) and get_no_image.
+    """
+    source = io.BytesIO(StandInImageHandler.content)
+    return {
+        "render.add_footer_to_image.cold": measure(
+            lambda: server.add_footer_to_image(source, 80, 75), runs,
+            setup=server.render_cache.clear,
+        ),
+        "render.add_footer_to_image.cached": measure(
+            lambda: server.add_footer_to_image(source, 80, 75), runs, number=10
+        ),
+        "render.get_no_image": measure(server.get_no_image, runs),
+    }
+
+
+def bench_helpers(server, runs):
+    """
+    Benchmarks get_battery_state and get_wifi_signal_strength.
+    """
+    return {
+        "helpers.get_battery_state": measure(
+            lambda: server.get_battery_state(3.7), runs, number=10000
+        ),
+        "helpers.get_wifi_signal_strength": measure(
+            lambda: server.get_wifi_signal_strength(-67), runs, number=10000
+        ),
+    }
+
+
+def bench_persistence(server, workdir, sizes, runs):
+    """
+    Benchmarks reading_client_data of synthetic telemetry stores of the given sizes.
+    """
+    results = {}
+    original_store = server.telemetry_store
+    try:
+        for samples in sizes:
+            store = server.TelemetryStore(os.path.join(workdir, "db", f"bench_{samples}.bin"))
+            fill_store(store, samples)
+            server.telemetry_store = store
+            results[f"persistence.reading_client_data.{samples}"] = measure(
+                server.reading_client_data, max(1, runs // max(1, samples // 10_000))
+            )
+    finally:
+        server.telemetry_store = original_store
+    return results
+
+
+def bench_api(server, runs):
+    """
+    Benchmarks the API end to end through the Flask test client.
+    """
+    client = server.app.test_client()
+
+    def get(path, headers=None, status=200):
+        response = client.get(path, headers=headers)
+        if response.status_code != status:
+            raise RuntimeError(f"{path}: HTTP {response.status_code}")
+        response.get_data()
+        return response
+
+    def revalidate(path):
+        etag = {"If-None-Match": get(path).headers["ETag"]}
+        return measure(lambda: get(path, etag, 304), runs)
+
+    fill_store(server.telemetry_store, 10_000)
+    return {
+        "api./api/display": measure(lambda: get("/api/display", DEVICE_HEADERS), runs),
+        "api./image/screen.bmp": measure(lambda: get("/image/screen.bmp"), runs),
+        "api./status": measure(lambda: get("/status"), runs),
+        "api./server/battery": measure(lambda: get("/server/battery"), runs),
+        "api./server/battery?all": measure(lambda: get("/server/battery?all"), max(1, runs // 10)),
+        "api./status 304": revalidate("/status"),
+        "api./settings 304": revalidate("/settings"),
+        "api./server/battery 304": revalidate("/server/battery"),
+    }
+
+
+def git_revision():
+    """
+    Returns the git revision of the repository or None.
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True,
+            text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_file):
+    """
+    Prints the median of every benchmark next to the one of the baseline run.
+    """
+    with open(baseline_file, "r", encoding="utf-8") as file:
+        baseline = json.load(file)["results"]
+    print(f"{'benchmark':45s} {'baseline ms':>12s} {'current ms':>12s} {'ratio':>7s}")
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before, now = baseline[name]["median_ms"], result["median_ms"]
+        ratio = now / before if before else float("inf")
+        print(f"{name:45s} {before:12.6g} {now:12.6g} {ratio:7.2f}")
+
+
+def main():
+    """
+    Runs the suite and prints or writes the results as JSON.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--output", help="write the JSON results to this file")
+    parser.add_argument("--compare", help="compare with the JSON results of an earlier run")
+    parser.add_argument("--runs", type=int, default=30, help="runs per benchmark")
+    parser.add_argument("--quick", action="store_true", help="skip the 1M samples store")
+    args = parser.parse_args()
+
+    stand_in = start_stand_in()
+    workdir = prepare_workdir(
+        f"http://127.0.0.1:{stand_in.server_port}/screen.bmp", "slow_request_ms: 0\n"
+    )
+    try:
+        trmnl_server = import_server(workdir, quiet=True)
+        sizes = [10_000, 100_000] + ([] if args.quick else [1_000_000])
+        results = {}
+        results.update(bench_render(trmnl_server, args.runs))
+        results.update(bench_helpers(trmnl_server, args.runs))
+        results.update(bench_persistence(trmnl_server, workdir, sizes, args.runs))
+        results.update(bench_api(trmnl_server, args.runs))
+        trmnl_server.writer.close()
+    finally:
+        stand_in.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "runs": args.runs,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#! /usr/bin/env python
+"""
+Benchmark of the telemetry store against the former text file parsing.
+
+For synthetic histories (one sample every 2 minutes) the former full parse of
+db/clientData.txt is compared with the one-time import, a one day range query, a one hour range
+query and a full scan of the binary telemetry store.
+
+Run from the repository root:
+    python benchmarks/bench_telemetry_store.py [rows ...]
+"""
+import os
+import sys
+import time
+import random
+
+from harness import REPO_DIR, run_row_counts
+
+sys.path.insert(0, REPO_DIR)
+# pylint: disable=wrong-import-position
+from telemetry_store import TelemetryStore, TIMESTAMP_FORMAT
+
+SAMPLE_INTERVAL = 120
+
+
+def write_legacy_file(path, rows):
+    """
+    Writes a synthetic client data text file with the given number of rows ending now.
+    """
+    start = int(time.time()) - rows * SAMPLE_INTERVAL
+    with open(path, "w", encoding="utf-8") as legacy_file:
+        for row in range(rows):
+            timestamp = time.strftime(
+                TIMESTAMP_FORMAT, time.localtime(start + row * SAMPLE_INTERVAL)
+            )
+            legacy_file.write(
+                f"{timestamp} -- bVolt: {round(random.uniform(3.3, 4.1), 2)}, "
+                f"rssi: {random.randint(-90, -40)}\n"
+            )
+
+
+def parse_legacy_file(path):
+    """
+    The former reading_client_data: parse every line, build dicts and sort them.
+    """
+    entries = []
+    with open(path, "r", encoding="utf-8") as legacy_file:
+        for line in legacy_file.readlines():
+            data = line.split(" -- ")
+            entries.append(
+                {
+                    "battery_voltage": float(data[1].split(",")[0].split(": ")[1]),
+                    "rssi": int(data[1].split(",")[1].split(": ")[1]),
+                    "timestamp": data[0],
+                }
+            )
+    return sorted(entries, key=lambda x: x["timestamp"])
+
+
+def timed(func, *args):
+    """
+    Returns the result and the duration in milliseconds of the call.
+    """
+    start = time.perf_counter()
+    result = func(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def run(rows, workdir):
+    """
+    Runs the benchmark for the given number of rows and prints one result line.
+    """
+    legacy_path = os.path.join(workdir, f"clientData_{rows}.txt")
+    write_legacy_file(legacy_path, rows)
+    legacy_size = os.path.getsize(legacy_path)
+    _, parse_ms = timed(parse_legacy_file, legacy_path)
+
+    store_path = os.path.join(workdir, f"clientData_{rows}.bin")
+    store, import_ms = timed(TelemetryStore, store_path, legacy_path)
+    now = time.time()
+    day, day_ms = timed(store.query, now - 86400, now)
+    hour, hour_ms = timed(store.query, now - 3600, now)
+    everything, all_ms = timed(store.query)
+    print(
+        f"{rows:>8d} rows | text {legacy_size / 1e6:6.1f} MB parse {parse_ms:9.1f} ms | "
+        f"store {os.path.getsize(store_path) / 1e6:6.1f} MB import {import_ms:9.1f} ms | "
+        f"1 day ({len(day)}) {day_ms:7.2f} ms | 1 hour ({len(hour)}) {hour_ms:6.2f} ms | "
+        f"all ({len(everything)}) {all_ms:8.1f} ms"
+    )
+
+
+def main():
+    """
+    Runs the benchmark for 10k, 100k and 1M rows or the given row counts.
+    """
+    run_row_counts(run, [10_000, 100_000, 1_000_000])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#! /usr/bin/env python
+"""
+Benchmark of full and resumed TLS handshakes with RSA 4096 and ECDSA P-256 certificates.
+
+For both key types a certificate is generated with generate_self_signed_cert and trmnl_server's
+app is served by the server's QuietWSGIServer with the SSL context of create_ssl_context in a child
+process. A client opens sequential connections, each doing the handshake and one small request
+like a device wake (TLS 1.2 and TLS 1.3, without certificate verification like the device):
+
+    full    - every connection does a full handshake
+    resumed - every connection resumes the session of the previous one (ticket/session cache)
+
+Reported are connections per second and the share of resumed sessions. The RSA 4096 full
+handshake is the former setup.
+
+Run from the repository root:
+    python benchmarks/bench_tls_handshake.py [connections]
+"""
+import os
+import ssl
+import sys
+import time
+import shutil
+import socket
+
+from harness import (
+    free_port, prepare_workdir, import_server, serve_app, serve_or_run, start_child, stop_child,
+)
+
+REQUEST = b"GET /image/dummy.bmp HTTP/1.1\r\nHost: bench\r\nConnection: close\r\n\r\n"
+
+
+def serve(port, workdir, key_type):
+    """
+    Child process: generate the certificate and serve trmnl_server's app with TLS.
+    """
+    trmnl_server = import_server(workdir)
+    cert_file = os.path.join(workdir, "ssl", f"cert_{key_type}.pem")
+    key_file = os.path.join(workdir, "ssl", f"key_{key_type}.pem")
+    start = time.perf_counter()
+    trmnl_server.generate_self_signed_cert(cert_file, key_file, "127.0.0.1", key_type)
+    duration = (time.perf_counter() - start) * 1000
+    context = trmnl_server.create_ssl_context(cert_file, key_file)
+    serve_app(
+        trmnl_server, port, context, f"generated {key_type} certificate in {duration:.0f} ms"
+    )
+
+
+def connect(port, client_context, session=None):
+    """
+    Opens one TLS connection, sends one request and reads the response. Returns the session
+    and whether it was resumed.
+    """
+    with socket.create_connection(("127.0.0.1", port)) as raw_socket:
+        # like lwIP on the device: no Nagle delay between the handshake and the request
+        raw_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with client_context.wrap_socket(raw_socket, session=session) as tls_socket:
+            tls_socket.sendall(REQUEST)
+            while tls_socket.recv(65536):
+                pass
+            return tls_socket.session, tls_socket.session_reused
+
+
+def run(port, tls_version, resume, connections):
+    """
+    Returns connections per second and resumed share for sequential connections.
+    """
+    client_context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    client_context.check_hostname = False
+    client_context.verify_mode = ssl.CERT_NONE
+    client_context.minimum_version = tls_version
+    client_context.maximum_version = tls_version
+    session, _ = connect(port, client_context)
+    resumed = 0
+    start = time.perf_counter()
+    for _ in range(connections):
+        new_session, reused = connect(port, client_context, session if resume else None)
+        resumed += reused
+        if resume:
+            session = new_session
+    duration = time.perf_counter() - start
+    return connections / duration, resumed / connections
+
+
+def main():
+    """
+    Runs the benchmark for RSA 4096 and ECDSA P-256 and prints the results.
+    """
+    connections = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    workdir = prepare_workdir()
+    try:
+        for key_type in ("rsa", "ecdsa"):
+            port = free_port()
+            child, line = start_child(__file__, port, workdir, key_type, ready_line="generated")
+            try:
+                print(line)
+                for version_name, tls_version in (
+                    ("TLSv1.2", ssl.TLSVersion.TLSv1_2),
+                    ("TLSv1.3", ssl.TLSVersion.TLSv1_3),
+                ):
+                    for resume in (False, True):
+                        rate, resumed = run(port, tls_version, resume, connections)
+                        print(
+                            f"{key_type:6s} {version_name:8s} "
+                            f"{'resumed' if resume else 'full':8s} "
+                            f"{rate:8.1f} connections/s ({resumed * 100:5.1f} % resumed)"
+                        )
+            finally:
+                stop_child(child)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    serve_or_run(serve, main)
@@ -0,0 +1,195 @@
+"""
+Shared harness of the benchmarks: working directory, free port, device headers and trmnl_server
+in a child process.
+
+A benchmark starts itself as child process with '--serve <port> <workdir> ...' (serve_or_run
+dispatches between both roles). The child imports trmnl_server for the working directory
+(import_server), prepares it and calls serve_app, which prints the ready line and serves the
+app. The parent waits for the ready line and the open port (start_child) and terminates the
+child at the end (stop_child).
+
+Usage example:
+    workdir = prepare_workdir()
+    port = free_port()
+    child, _ = start_child(__file__, port, workdir)
+    try:
+        ...
+    finally:
+        stop_child(child)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if __name__ == "__main__":
+        serve_or_run(serve, main)
+"""
+import os
+import sys
+import time
+import shutil
+import socket
+import logging
+import contextlib
+import tempfile
+import subprocess
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+READY_LINE = "serving"
+DEVICE_HEADERS = {
+    "ID": "AA:BB:CC:DD:EE:FF",
+    "Refresh-Rate": "900",
+    "Battery-Voltage": "3.9",
+    "RSSI": "-60",
+}
+
+
+def free_port():
+    """
+    Returns a free local TCP port.
+    """
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def prepare_workdir(image_path=None, extra_config=""):
+    """
+    Creates a working directory with config, web, logs, db and ssl folders for the server. The
+    image_path defaults to the dummy image of the working directory, extra_config is appended to
+    config.yaml.
+    """
+    workdir = tempfile.mkdtemp(prefix="trmnl_bench_")
+    shutil.copytree(os.path.join(REPO_DIR, "web"), os.path.join(workdir, "web"))
+    for folder in ("logs", "db", "ssl"):
+        os.makedirs(os.path.join(workdir, folder))
+    if image_path is None:
+        image_path = os.path.join(workdir, "web", "dummy.bmp")
+    with open(os.path.join(workdir, "config.yaml"), "w", encoding="utf-8") as config_file:
+        config_file.write(
+            f"image_path: {image_path}\nimage_modification: true\nrefresh_time: 900\n"
+            "battery_max_voltage: 4.1\nbattery_min_voltage: 2.3\ntime_zone: UTC\n"
+            + extra_config
+        )
+    return workdir
+
+
+def run_row_counts(run, default_counts):
+    """
+    Calls run(rows, workdir) for the row counts given as arguments (or default_counts) with a
+    temporary working directory.
+    """
+    row_counts = [int(arg) for arg in sys.argv[1:]] or default_counts
+    workdir = tempfile.mkdtemp(prefix="trmnl_bench_")
+    try:
+        for rows in row_counts:
+            run(rows, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def report_failures(failures):
+    """
+    Prints the failed checks and the result, returns the exit code of the check.
+    """
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    print("OK" if not failures else f"{len(failures)} check(s) failed")
+    return 1 if failures else 0
+
+
+def import_server(workdir, quiet=False):
+    """
+    Imports and returns trmnl_server with the given working directory. With quiet the server
+    writes its log to stderr and only its warnings and errors (the access log only failed
+    requests), so stdout is left to the results of the benchmark.
+    """
+    sys.argv = [sys.argv[0], workdir]
+    if REPO_DIR not in sys.path:
+        sys.path.insert(0, REPO_DIR)
+    # the log handler of trmnl_server is bound to the sys.stdout of its import
+    with contextlib.redirect_stdout(sys.stderr if quiet else sys.stdout):
+        import trmnl_server  # pylint: disable=import-outside-toplevel
+    if quiet:
+        # trmnl_server logs to its module logger, the other modules to '__main__'
+        for name in (trmnl_server.__name__, "__main__"):
+            logging.getLogger(name).setLevel(logging.WARNING)
+        trmnl_server.access_log.sample_rate = 0.0
+    return trmnl_server
+
+
+def serve_app(trmnl_server, port, ssl_context=None, ready_line=READY_LINE):
+    """
+    Child process: prints the ready line and serves trmnl_server's app with the server's
+    QuietWSGIServer (with TLS if ssl_context is given) until the process is terminated.
+    """
+    print(ready_line, flush=True)
+    # the parent stops reading the pipe after the ready line, the server output must not block
+    with open(os.devnull, "w", encoding="utf-8") as devnull:
+        os.dup2(devnull.fileno(), sys.stdout.fileno())
+    ssl_args = {"ssl_context": ssl_context} if ssl_context is not None else {}
+    server = trmnl_server.QuietWSGIServer(
+        ("127.0.0.1", port), trmnl_server.app, log=None, **ssl_args
+    )
+    server.serve_forever()
+
+
+def serve_tls(trmnl_server, port, workdir, key_type="ecdsa", ready_line=READY_LINE):
+    """
+    Child process: generates a certificate of the key type in the working directory and serves
+    trmnl_server's app with TLS like in production.
+    """
+    cert_file = os.path.join(workdir, "ssl", f"cert_{key_type}.pem")
+    key_file = os.path.join(workdir, "ssl", f"key_{key_type}.pem")
+    trmnl_server.generate_self_signed_cert(cert_file, key_file, "127.0.0.1", key_type)
+    context = trmnl_server.create_ssl_context(cert_file, key_file)
+    serve_app(trmnl_server, port, context, ready_line)
+
+
+def wait_for_port(port, attempts=100):
+    """
+    Waits until the local port accepts connections, at most attempts times 0.1 seconds.
+    """
+    for _ in range(attempts):
+        try:
+            socket.create_connection(("127.0.0.1", port)).close()
+            return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def start_child(script, port, workdir, *args, env=None, ready_line=READY_LINE):
+    """
+    Starts the benchmark script as server child process with '--serve port workdir args' and
+    waits for the line starting with ready_line and for its port. Returns the process and the
+    ready line.
+    """
+    child = subprocess.Popen(  # pylint: disable=consider-using-with
+        [sys.executable, os.path.abspath(script), "--serve", str(port), workdir, *args],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+        env=env,
+    )
+    line = child.stdout.readline()
+    while line and not line.startswith(ready_line):
+        line = child.stdout.readline()
+    wait_for_port(port)
+    return child, line.strip()
+
+
+def stop_child(child):
+    """
+    Terminates the server child process and waits for it.
+    """
+    child.terminate()
+    child.wait()
+
+
+def serve_or_run(serve, main):
+    """
+    Calls serve(port, workdir, args) in the child process started by start_child, otherwise
+    main(), and exits with its return value.
+    """
+    if len(sys.argv) >= 4 and sys.argv[1] == "--serve":
+        serve(int(sys.argv[2]), *sys.argv[3:])
+    else:
+        sys.exit(main())
@@ -0,0 +1,77 @@
+'''
+This module provides a native encoder for 1-bit BMP images.
+
+The encoder writes the complete BMP file (file header, info header, black/white palette and the
+bottom-up pixel rows padded to 4 bytes) of a PIL mode '1' image, without PIL's BMP save and the
+subsequent patching of the palette in the BMP header.
+
+Functions:
+    encode_image_1bpp_bmp: Encodes a PIL image as 1-bit BMP.
+
+Usage example:
+    bmp = encode_image_1bpp_bmp(image)
+    img_io = BytesIO(bmp)
+'''
+import functools
+import struct
+
+BMP_FILE_HEADER_SIZE = 14
+BMP_INFO_HEADER_SIZE = 40
+# palette index 0 black, index 1 white (blue, green, red, reserved)
+BMP_PALETTE_1BPP = bytes([0, 0, 0, 0, 255, 255, 255, 0])
+# 96 dpi as pixels per meter, like PIL's BMP encoder
+BMP_PIXELS_PER_METER = 3780
+
+_HEADER_FORMAT = "<2sIHHIIiiHHIIiiII"
+
+
+def _bmp_layout(width, height):
+    """
+    Returns row bytes, padded row stride, pixel data offset and pixel data size of a 1-bit BMP.
+    """
+    row_bytes = (width + 7) // 8
+    stride = (row_bytes + 3) & ~3
+    offset = BMP_FILE_HEADER_SIZE + BMP_INFO_HEADER_SIZE + len(BMP_PALETTE_1BPP)
+    return row_bytes, stride, offset, stride * height
+
+
+@functools.lru_cache(maxsize=8)
+def _bmp_header(width, height):
+    """
+    Returns file header, info header and palette of a 1-bit BMP with the given size.
+    """
+    _, _, offset, image_size = _bmp_layout(width, height)
+    return struct.pack(
+        _HEADER_FORMAT,
+        b"BM",
+        offset + image_size,  # file size
+        0,  # reserved
+        0,  # reserved
+        offset,  # pixel data offset
+        BMP_INFO_HEADER_SIZE,
+        width,
+        height,  # positive height: rows are stored bottom-up
+        1,  # planes
+        1,  # bits per pixel
+        0,  # no compression
+        image_size,
+        BMP_PIXELS_PER_METER,
+        BMP_PIXELS_PER_METER,
+        2,  # colors used
+        2,  # colors important
+    ) + BMP_PALETTE_1BPP
+
+
+def encode_image_1bpp_bmp(image):
+    """
+    Encodes a PIL image as 1-bit BMP. Images in other modes than '1' are converted first.
+
+    PIL's raw packer already writes the rows bottom-up with the padded BMP stride, so the file
+    is the cached header followed by the packed pixel data. PIL only packs into a new bytes
+    object, so joining it with the header copies the pixel data once. The encoding allocates
+    about as much memory as PIL's BMP save, it only saves the BMP plugin and the palette patch.
+    """
+    if image.mode != "1":
+        image = image.convert("1")
+    _, stride, _, _ = _bmp_layout(image.width, image.height)
+    return _bmp_header(image.width, image.height) + image.tobytes("raw", ("1", stride, -1))
@@ -2,22 +2,53 @@
 This module provides the ConfigManager class for managing configuration settings
 of the application. The configuration settings are stored in a 'config.yaml' file.
 
+The file is written atomically (temporary file and rename), so a crash or a concurrent reader
+never sees a half written file. A watcher thread reloads the file in place when it is changed
+externally and notifies the registered listeners about the changed keys.
+
+Every value is converted to the type of its default and validated (VALUE_CHECKS and the battery
+voltage range), whether it is set by update() or read from the file. An invalid update raises
+ValueError, an invalid file is refused at startup and ignored by the reload.
+
 Classes:
     ConfigManager: Manages loading, updating, and saving configuration settings.
 
 Usage example:
     config_manager = ConfigManager('/path/to/config/directory')
     config_manager.set_refresh_time(600)
+    config_manager.update({'refresh_time': 600, 'image_modification': False})
+    config_manager.add_listener(lambda changed_keys: print(changed_keys))
+    config_manager.watch(interval=2)
 '''
 import os
 import sys
+import math
+import time
 import logging
+import tempfile
+import threading
 import yaml
+import pytz
 
 logger = logging.getLogger('__main__')
 logger.info('[Config] loading module ')
 
-class ConfigManager:
+LOG_LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR')
+SSL_KEY_TYPES = ('rsa', 'ecdsa')
+# checks of single settings after the type conversion, a failing check rejects the value
+VALUE_CHECKS = {
+    'refresh_time': lambda value: value > 0,
+    'battery_max_voltage': math.isfinite,
+    'battery_min_voltage': math.isfinite,
+    'time_zone': lambda value: value in pytz.all_timezones_set,
+    'ssl_key_type': lambda value: value in SSL_KEY_TYPES,
+    'http_port': lambda value: 0 <= value <= 65535,
+    'slow_request_ms': lambda value: value >= 0,
+    'log_level': lambda value: value.upper() in LOG_LEVELS,
+    'access_log_sample_rate': lambda value: 0 <= value <= 1,
+}
+
+class ConfigManager:  # pylint: disable=too-many-instance-attributes
     '''
     Manages the configuration settings for the application.
 
@@ -34,9 +65,21 @@ class ConfigManager:
             'refresh_time': 900,
             'battery_max_voltage': 4.1,
             'battery_min_voltage': 2.3,
-            'time_zone': 'UTC'  # Add default time zone
+            'time_zone': 'UTC',  # Add default time zone
+            'ssl_key_type': 'rsa',  # generated certificate key: 'rsa' (4096) or 'ecdsa' (P-256)
+            'http_port': 0,  # additional plain HTTP listener for a trusted LAN, 0: disabled
+            'request_timing': False,  # Server-Timing header with the stage durations
+            'slow_request_ms': 1000,  # requests taking longer go to the slow request log, 0: off
+            'log_level': 'INFO',  # DEBUG also logs full request headers and responses
+            'access_log_sample_rate': 1.0  # share of successful requests in the access log
         }
         self.config = self.default_config.copy()
+        # incremented with every change of a setting, e.g. for the ETag of the settings
+        self.generation = 0
+        self.listeners = []
+        self._signature = None
+        self._lock = threading.Lock()
+        self._watcher = None
         self.load_config()
 
     def load_config(self):
@@ -47,66 +90,216 @@ class ConfigManager:
         prompts the user to restart the server after configuring the settings.
         """
         if os.path.exists(self.config_file):
+            self._signature = self._file_signature()
             with open(self.config_file, 'r', encoding='utf-8') as f:
-                self.config.update(yaml.safe_load(f))
+                loaded = yaml.safe_load(f) or {}
+            try:
+                self.config.update(self._convert_all(loaded))
+            except (ValueError, AttributeError) as e:
+                logger.error('[Config] invalid config file %s: %s', self.config_file, str(e))
+                print(f"Invalid config file {self.config_file}: {e}")
+                sys.exit(1)
         else:
             self.write_config()
             print("Config file not found. Created a new one with default values.")
             print("Please restart the server after configuring the settings in config.yaml")
             sys.exit(0)
 
+    def _file_signature(self):
+        """
+        Returns modification time and size of the config file, None if it does not exist.
+        """
+        try:
+            stat = os.stat(self.config_file)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
     def write_config(self):
         """
         Writes the configuration to 'config.yaml' file located in the current directory.
+        The content is written to a temporary file in the same directory, which then replaces
+        the config file.
         """
         logger.info('[Config] writing config file')
-        with open(self.config_file, 'w', encoding='utf-8') as config_file_handle:
-            yaml.safe_dump(self.config, config_file_handle)
+        file_descriptor, temp_file = tempfile.mkstemp(
+            prefix='.config.', suffix='.yaml', dir=self.current_dir
+        )
+        try:
+            with os.fdopen(file_descriptor, 'w', encoding='utf-8') as config_file_handle:
+                yaml.safe_dump(self.config, config_file_handle)
+                config_file_handle.flush()
+                os.fsync(config_file_handle.fileno())
+            if os.path.exists(self.config_file):
+                os.chmod(temp_file, os.stat(self.config_file).st_mode & 0o777)
+            os.replace(temp_file, self.config_file)
+        except BaseException:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+            raise
+        self._signature = self._file_signature()
+
+    def update(self, values):
+        """
+        Updates several configuration settings with one write of the config file. The values
+        are converted to the type of the default value. Raises ValueError for unknown keys or
+        invalid values. Returns the list of changed keys.
+        """
+        for key in values:
+            if key not in self.default_config:
+                raise ValueError(f"unknown setting '{key}'")
+        with self._lock:
+            converted = self._convert_all(values)
+            changed = [key for key, value in converted.items() if self.config.get(key) != value]
+            if changed:
+                logger.info(
+                    '[Config] setting %s',
+                    ', '.join(f'{key} to {converted[key]}' for key in changed),
+                )
+                self.config.update(converted)
+                self.generation += 1
+                self.write_config()
+        self._notify(changed)
+        return changed
+
+    def _convert(self, key, value):
+        """
+        Converts a value to the type of the default value of the setting.
+        """
+        default_type = type(self.default_config[key])
+        try:
+            if default_type is bool:
+                if isinstance(value, str):
+                    if value.lower() not in ('true', 'false', '1', '0'):
+                        raise ValueError(value)
+                    return value.lower() in ('true', '1')
+                return bool(value)
+            if default_type is int:
+                converted = int(float(value))
+            else:
+                converted = default_type(value)
+        except (TypeError, ValueError, OverflowError) as e:
+            raise ValueError(f"invalid value for '{key}': {value!r}") from e
+        if default_type is str and not converted.strip():
+            raise ValueError(f"invalid value for '{key}': {value!r}")
+        check = VALUE_CHECKS.get(key)
+        if check is not None and not check(converted):
+            raise ValueError(f"invalid value for '{key}': {value!r}")
+        return converted
+
+    def _convert_all(self, values):
+        """
+        Converts and validates the known settings of values (unknown keys are kept as they are)
+        and checks that they fit to the other settings. Raises ValueError for invalid values.
+        """
+        converted = {
+            key: self._convert(key, value) if key in self.default_config else value
+            for key, value in values.items()
+        }
+        merged = {**self.config, **converted}
+        if merged['battery_min_voltage'] >= merged['battery_max_voltage']:
+            raise ValueError("battery_min_voltage has to be lower than battery_max_voltage")
+        return converted
+
+    def add_listener(self, listener):
+        """
+        Registers a function that is called with the list of changed keys after every change of
+        the configuration (by a setter or by an external edit of the file).
+        """
+        self.listeners.append(listener)
+
+    def _notify(self, changed):
+        if not changed:
+            return
+        for listener in self.listeners:
+            try:
+                listener(changed)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                logger.error('[Config] config listener failed: %s', str(e))
+
+    def reload_if_changed(self):
+        """
+        Reloads the config file in place if its modification time or size changed since it was
+        read or written. Returns the list of changed keys.
+        """
+        with self._lock:
+            signature = self._file_signature()
+            if signature is None or signature == self._signature:
+                return []
+            self._signature = signature
+            try:
+                with open(self.config_file, 'r', encoding='utf-8') as f:
+                    loaded = yaml.safe_load(f)
+            except (OSError, yaml.YAMLError) as e:
+                logger.warning('[Config] reloading config file failed: %s', str(e))
+                return []
+            if not isinstance(loaded, dict):
+                logger.warning('[Config] reloading config file failed: no settings found')
+                return []
+            try:
+                loaded = self._convert_all(loaded)
+            except ValueError as e:
+                logger.error('[Config] invalid config file, keeping the previous settings: %s', e)
+                return []
+            changed = [key for key, value in loaded.items() if self.config.get(key) != value]
+            self.config.update(loaded)
+            if changed:
+                self.generation += 1
+        if changed:
+            logger.info('[Config] reloaded config file, changed: %s', ', '.join(changed))
+        self._notify(changed)
+        return changed
+
+    def watch(self, interval=2):
+        """
+        Starts a thread that checks the config file every interval seconds and reloads it when
+        it was changed.
+        """
+        if self._watcher is not None:
+            return
+        self._watcher = threading.Thread(
+            target=self._watch, args=(interval,), name='config-watcher', daemon=True
+        )
+        self._watcher.start()
+        logger.info('[Config] watching config file every %s s', interval)
+
+    def _watch(self, interval):
+        while True:
+            time.sleep(interval)
+            self.reload_if_changed()
 
     def set_refresh_time(self, refresh_time):
         """
         Updates the configuration file with the new refresh time.
         """
-        logger.info('[Config] setting refresh time to %s', refresh_time)
-        self.config['refresh_time'] = refresh_time
-        self.write_config()
+        self.update({'refresh_time': refresh_time})
 
     def set_image_path(self, image_path):
         """
         Updates the configuration file with the new image path.
         """
-        logger.info('[Config] setting image path to %s', image_path)
-        self.config['image_path'] = image_path
-        self.write_config()
+        self.update({'image_path': image_path})
 
     def set_image_modification(self, image_modification):
         """
         Updates the configuration file with the new image modification setting.
         """
-        logger.info('[Config] setting image modification to %s', image_modification)
-        self.config['image_modification'] = image_modification
-        self.write_config()
+        self.update({'image_modification': image_modification})
 
     def set_battery_max_voltage(self, battery_max_voltage):
         """
         Updates the configuration file with the new battery max voltage.
         """
-        logger.info('[Config] setting battery max voltage to %s', battery_max_voltage)
-        self.config['battery_max_voltage'] = battery_max_voltage
-        self.write_config()
+        self.update({'battery_max_voltage': battery_max_voltage})
 
     def set_battery_min_voltage(self, battery_min_voltage):
         """
         Updates the configuration file with the new battery min voltage.
         """
-        logger.info('[Config] setting battery min voltage to %s', battery_min_voltage)
-        self.config['battery_min_voltage'] = battery_min_voltage
-        self.write_config()
+        self.update({'battery_min_voltage': battery_min_voltage})
 
     def set_time_zone(self, time_zone):
         """
         Updates the configuration file with the new time zone.
         """
-        logger.info('[Config] setting time zone to %s', time_zone)
-        self.config['time_zone'] = time_zone
-        self.write_config()
+        self.update({'time_zone': time_zone})
@@ -0,0 +1,79 @@
+'''
+This module provides the helpers for the cooperative I/O mode under gevent.
+
+In cooperative mode (environment variable TRMNL_COOPERATIVE_IO=1) trmnl_server monkey-patches
+the standard library before anything else is imported, so outbound HTTP, SSL and sleeps yield
+to other connections instead of blocking the only OS thread. Work that still blocks (PIL
+rendering, file appends) is handed to a bounded pool of native threads with run_blocking.
+Without cooperative mode run_blocking simply calls the function.
+
+Functions:
+    cooperative_mode_requested: Returns True if the cooperative mode is switched on.
+    enable_cooperative_mode: Monkey-patches the standard library for gevent.
+    run_blocking: Runs a blocking function in the thread pool (cooperative mode) or inline.
+
+Usage example:
+    if cooperative_mode_requested():
+        enable_cooperative_mode()
+    image = run_blocking(render_image, source)
+'''
+import os
+import contextvars
+
+COOPERATIVE_IO_ENV = "TRMNL_COOPERATIVE_IO"
+BLOCKING_POOL_SIZE = int(os.environ.get("TRMNL_BLOCKING_POOL_SIZE", "4"))
+
+_state = {"enabled": False, "pool": None}
+
+
+def cooperative_mode_requested():
+    """
+    Returns True if the cooperative mode is switched on with the environment variable.
+    """
+    return os.environ.get(COOPERATIVE_IO_ENV, "0").lower() in ("1", "true", "yes")
+
+
+def enable_cooperative_mode():
+    """
+    Monkey-patches sockets, ssl, sleeps and threading for gevent and creates the bounded
+    thread pool for blocking work. Has to be called before other modules are imported.
+    """
+    if _state["enabled"]:
+        return
+    from gevent import monkey  # pylint: disable=import-outside-toplevel
+
+    monkey.patch_all()
+    from gevent.threadpool import ThreadPool  # pylint: disable=import-outside-toplevel
+
+    _state["pool"] = ThreadPool(BLOCKING_POOL_SIZE)
+    _state["enabled"] = True
+
+
+def is_cooperative():
+    """
+    Returns True if the cooperative mode is active.
+    """
+    return _state["enabled"]
+
+
+def run_blocking(func, *args, **kwargs):
+    """
+    Runs a blocking function. In cooperative mode it is executed in the bounded thread pool and
+    only the calling greenlet waits for the result, otherwise it is called directly.
+    """
+    if _state["pool"] is None:
+        return func(*args, **kwargs)
+    # run in a copy of the caller's context, e.g. the stage timer of the request
+    return _state["pool"].apply(contextvars.copy_context().run, (func, *args), kwargs)
+
+
+def pool_stats():
+    """
+    Returns mode, size and current usage of the blocking thread pool.
+    """
+    pool = _state["pool"]
+    return {
+        "cooperative": _state["enabled"],
+        "pool_size": pool.maxsize if pool is not None else 0,
+        "pool_busy": len(pool) if pool is not None else 0,
+    }
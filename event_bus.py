@@ -0,0 +1,150 @@
+'''
+This module provides the EventBus class, an in-process publish/subscribe bus for the events of
+the server, and the encoding of the events as Server-Sent Events (SSE).
+
+publish() encodes an event once as SSE message and appends the same string to the queue of
+every subscription, so the cost per subscriber is one deque append and one wakeup. The queues
+are bounded: if a subscriber (e.g. a browser tab in the background) does not read, its oldest
+messages are dropped and counted instead of piling up in memory.
+
+The wakeup event is created by event_factory, under gevent it has to be gevent.event.Event so
+that a waiting stream only blocks its own greenlet. Publishing is possible from any thread.
+
+Classes:
+    Subscription: Bounded message queue of one subscriber.
+    EventBus: Fan-out of the published events to all subscriptions.
+
+Functions:
+    format_event: Returns an event as SSE message.
+
+Usage example:
+    event_bus = EventBus(queue_size=100, event_factory=gevent.event.Event)
+    subscription = event_bus.subscribe()
+    event_bus.publish('contact', {'device': 'AA:BB:CC:DD:EE:FF'})
+    messages = subscription.get(timeout=15)
+    event_bus.unsubscribe(subscription)
+'''
+import json
+import logging
+import itertools
+import threading
+from collections import deque
+
+logger = logging.getLogger('__main__')
+logger.info('[EventBus] loading module ')
+
+
+def format_event(event, data, event_id=None):
+    """
+    Returns the event with its JSON data as SSE message. Compact JSON has no line breaks, so
+    the data fits into one data line.
+    """
+    message = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{message}event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class Subscription:
+    '''
+    Bounded queue of the SSE messages of one subscriber, the oldest messages are dropped if the
+    subscriber does not keep up.
+    '''
+    def __init__(self, queue_size=100, event_factory=threading.Event):
+        self.messages = deque(maxlen=queue_size)
+        self.dropped = 0
+        self._wakeup = event_factory()
+
+    def put(self, message):
+        """
+        Appends a message and wakes up the waiting subscriber.
+        """
+        if len(self.messages) == self.messages.maxlen:
+            self.dropped += 1
+        self.messages.append(message)
+        self._wakeup.set()
+
+    def get(self, timeout=None):
+        """
+        Waits up to timeout seconds for messages and returns all queued messages, an empty list
+        if none arrived in time.
+        """
+        if not self.messages:
+            self._wakeup.wait(timeout)
+        # clear before draining, a message put in between sets the wakeup again
+        self._wakeup.clear()
+        messages = []
+        while self.messages:
+            messages.append(self.messages.popleft())
+        return messages
+
+
+class EventBus:
+    '''
+    Publishes events to a limited number of subscriptions with bounded queues.
+    '''
+    def __init__(self, queue_size=100, max_subscribers=20, event_factory=threading.Event):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.event_factory = event_factory
+        self.counters = {"published": 0, "delivered": 0, "dropped": 0, "rejected": 0}
+        # replaced on (un)subscribe, publish iterates over it without a lock
+        self._subscriptions = ()
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def subscribe(self):
+        """
+        Returns a new subscription or None if max_subscribers are already subscribed.
+        """
+        with self._lock:
+            if len(self._subscriptions) >= self.max_subscribers:
+                self.counters["rejected"] += 1
+                return None
+            subscription = Subscription(self.queue_size, self.event_factory)
+            self._subscriptions += (subscription,)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """
+        Removes the subscription and counts its dropped messages.
+        """
+        with self._lock:
+            if subscription not in self._subscriptions:
+                return
+            self._subscriptions = tuple(
+                other for other in self._subscriptions if other is not subscription
+            )
+            self.counters["dropped"] += subscription.dropped
+
+    def has_subscribers(self):
+        """
+        Returns True if at least one subscription exists.
+        """
+        return bool(self._subscriptions)
+
+    def publish(self, event, data):
+        """
+        Encodes the event once and queues it for every subscription. Returns the number of
+        subscriptions, without subscribers the event is not encoded at all.
+        """
+        subscriptions = self._subscriptions
+        if not subscriptions:
+            return 0
+        message = format_event(event, data, next(self._ids))
+        for subscription in subscriptions:
+            subscription.put(message)
+        self.counters["published"] += 1
+        self.counters["delivered"] += len(subscriptions)
+        return len(subscriptions)
+
+    def stats(self):
+        """
+        Returns the number of subscribers, their queued messages and the counters of the bus.
+        """
+        subscriptions = self._subscriptions
+        return {
+            "subscribers": len(subscriptions),
+            "queued": sum(len(subscription.messages) for subscription in subscriptions),
+            **self.counters,
+            "dropped": self.counters["dropped"]
+            + sum(subscription.dropped for subscription in subscriptions),
+        }
@@ -0,0 +1,263 @@
+'''
+This module provides the GroupCommitWriter class, a writer thread for append-only files.
+
+Request handlers only put entries into a bounded queue. The writer thread collects the entries
+and commits them in groups per registered sink: after max_batch entries or max_delay seconds
+after the first entry of a group, whichever comes first. Because of this, no request pays for
+opening and writing a file. The fsync policy sets when the written data is forced to disk:
+
+    'always'   - fsync after every group commit
+    'interval' - fsync at most every fsync_interval seconds per sink
+    'never'    - leave it to the operating system
+
+Bounded loss: if the process crashes, the entries of the last max_delay seconds are lost (at
+most queue_size entries). If the operating system crashes, additionally the entries written
+since the last fsync are lost ('interval': fsync_interval seconds).
+
+If the queue is full, submit waits up to put_timeout seconds for the writer (counted as
+backpressure). If the queue is still full after that, the entry is dropped and counted.
+
+A sink raising an exception only loses its current group (counted as error), the writer thread
+keeps running until stop() is called.
+
+Classes:
+    GroupCommitWriter: Bounded queue with a group committing writer thread.
+
+Usage example:
+    writer = GroupCommitWriter(max_batch=20, max_delay=1.0, fsync_policy='interval')
+    writer.register('server_log', server_log_rotator.append)
+    writer.start()
+    writer.submit('server_log', '2025-01-01 10:00:00 -- [context] -- info\\n')
+    writer.close()
+'''
+import time
+import queue
+import logging
+import threading
+from cooperative import run_blocking
+
+logger = logging.getLogger('__main__')
+logger.info('[GroupCommitWriter] loading module ')
+
+FSYNC_POLICIES = ("always", "interval", "never")
+
+
+class GroupCommitWriter:
+    '''
+    Writer thread committing queued entries in groups to the registered sinks.
+
+    A sink is a function write_batch(entries, fsync) that appends a list of entries and forces
+    them to disk if fsync is True. The optional on_commit(name, entries, seconds) is called after
+    every write of a sink with the number of entries and the duration, e.g. for metrics.
+    '''
+    def __init__(self, max_batch=20, max_delay=1.0, queue_size=1000, fsync_policy="interval",
+                 fsync_interval=5.0, put_timeout=0.5, on_commit=None):
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"fsync_policy has to be one of {', '.join(FSYNC_POLICIES)}")
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+        self.put_timeout = put_timeout
+        self.on_commit = on_commit
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._sinks = {}
+        self._last_fsync = {}
+        self._dirty = set()
+        self._thread = None
+        self._stopping = threading.Event()
+        self.counters = {
+            "submitted": 0,
+            "written": 0,
+            "commits": 0,
+            "fsyncs": 0,
+            "backpressure": 0,
+            "dropped": 0,
+            "errors": 0,
+        }
+
+    def register(self, name, write_batch):
+        """
+        Registers a sink under the given name.
+        """
+        self._sinks[name] = write_batch
+        self._last_fsync[name] = time.monotonic()
+
+    def start(self):
+        """
+        Starts the writer thread.
+        """
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="group-commit-writer", daemon=True)
+        self._thread.start()
+        logger.info(
+            "[GroupCommitWriter] committing every %s entries or %s s, fsync policy '%s'",
+            self.max_batch,
+            self.max_delay,
+            self.fsync_policy,
+        )
+
+    def submit(self, name, entry):
+        """
+        Queues an entry for the sink with the given name. Returns False if the entry was dropped
+        because the queue stayed full for put_timeout seconds.
+        """
+        if name not in self._sinks:
+            raise KeyError(f"unknown sink '{name}'")
+        self.counters["submitted"] += 1
+        try:
+            self._queue.put_nowait((name, entry))
+            return True
+        except queue.Full:
+            self.counters["backpressure"] += 1
+        try:
+            self._queue.put((name, entry), timeout=self.put_timeout)
+            return True
+        except queue.Full:
+            self.counters["dropped"] += 1
+            logger.warning("[GroupCommitWriter] queue full, dropped entry for '%s'", name)
+            return False
+
+    def flush(self, timeout=None):
+        """
+        Waits until all entries queued before the call are written and forced to disk.
+        Returns False if the timeout expired before.
+        """
+        if self._thread is None:
+            self._drain()
+            return True
+        done = threading.Event()
+        self._queue.put((None, done))
+        return done.wait(timeout)
+
+    def stop(self, timeout=10):
+        """
+        Writes all queued entries with fsync and ends the writer thread. Returns False if the
+        timeout expired before.
+        """
+        if self._thread is None:
+            return self.flush(timeout)
+        flushed = self.flush(timeout)
+        self._stopping.set()
+        # wakes up the thread waiting for the next entry
+        self._queue.put((None, None))
+        self._thread.join(timeout)
+        self._thread = None
+        return flushed
+
+    def close(self, timeout=10):
+        """
+        Writes all queued entries with fsync before the program exits.
+        """
+        return self.stop(timeout)
+
+    def _drain(self):
+        """
+        Writes everything in the queue without the writer thread (not started or shut down).
+        """
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        self._commit([item for item in batch if item[0] is not None], force_fsync=True)
+        for name, done in batch:
+            if name is None and done is not None:
+                done.set()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                self._run_once()
+            except Exception:  # pylint: disable=broad-exception-caught
+                self.counters["errors"] += 1
+                logger.exception("[GroupCommitWriter] writer loop failed")
+
+    def _run_once(self):
+        """
+        Waits for the next entry, collects its group and commits it.
+        """
+        try:
+            # while written data waits for its fsync, wake up to sync it in time
+            name, entry = self._queue.get(timeout=self.fsync_interval if self._dirty else None)
+        except queue.Empty:
+            self._commit([])
+            return
+        batch = [(name, entry)]
+        deadline = time.monotonic() + self.max_delay
+        while name is not None and len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                name, entry = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append((name, entry))
+        markers = [done for name, done in batch if name is None and done is not None]
+        try:
+            self._commit(
+                [item for item in batch if item[0] is not None], force_fsync=bool(markers)
+            )
+        finally:
+            # flush() must not wait forever for a failed group
+            for done in markers:
+                done.set()
+
+    def _commit(self, batch, force_fsync=False):
+        """
+        Writes the batch grouped by sink, one call per sink, and forces the written data of the
+        sinks to disk according to the fsync policy.
+        """
+        groups = {}
+        for name, entry in batch:
+            groups.setdefault(name, []).append(entry)
+        now = time.monotonic()
+        for name in self._sinks:
+            entries = groups.get(name, [])
+            fsync = bool(entries or name in self._dirty) and (
+                force_fsync
+                or self.fsync_policy == "always"
+                or (
+                    self.fsync_policy == "interval"
+                    and now - self._last_fsync[name] >= self.fsync_interval
+                )
+            )
+            if not entries and not fsync:
+                continue
+            start = time.monotonic()
+            try:
+                run_blocking(self._sinks[name], entries, fsync)
+            except Exception:  # pylint: disable=broad-exception-caught
+                # e.g. OSError, sqlite3.Error or an invalid entry: lose this group, not the thread
+                self.counters["errors"] += 1
+                logger.exception("[GroupCommitWriter] writing '%s' failed", name)
+                continue
+            if self.on_commit is not None:
+                self.on_commit(name, len(entries), time.monotonic() - start)
+            if entries:
+                self.counters["written"] += len(entries)
+                self.counters["commits"] += 1
+            if fsync:
+                self.counters["fsyncs"] += 1
+                self._last_fsync[name] = now
+                self._dirty.discard(name)
+            elif self.fsync_policy != "never":
+                self._dirty.add(name)
+
+    def stats(self):
+        """
+        Returns the configuration, the queue length and the counters of the writer.
+        """
+        return {
+            "max_batch": self.max_batch,
+            "max_delay": self.max_delay,
+            "fsync_policy": self.fsync_policy,
+            "fsync_interval": self.fsync_interval,
+            "queue_size": self._queue.maxsize,
+            "queued": self._queue.qsize(),
+            **self.counters,
+        }
@@ -0,0 +1,133 @@
+'''
+This module provides the KeepAliveHandler class, a gevent WSGI handler for persistent connections.
+
+A device wake is a GET of /api/display followed immediately by a GET of the image URL. With
+HTTP/1.1 keep-alive both requests use one connection, so the image request pays neither a TCP
+nor a TLS handshake. The handler bounds what a persistent connection may hold:
+
+    idle_timeout - seconds to wait for the next request line before the connection is closed
+    max_requests - requests served on one connection, the last response carries
+                   'Connection: close'
+
+The ConnectionStats counters show how often connections are reused.
+
+Classes:
+    ConnectionStats: Counters of connections, requests and reused connections.
+    KeepAliveHandler: WSGIHandler with idle timeout, request limit and connection counters.
+
+Usage example:
+    KeepAliveHandler.idle_timeout = 5
+    server = WSGIServer(('0.0.0.0', 83), app, handler_class=KeepAliveHandler)
+    print(KeepAliveHandler.connection_stats.stats())
+'''
+import logging
+import threading
+import gevent
+from gevent.pywsgi import WSGIHandler
+
+logger = logging.getLogger('__main__')
+logger.info('[KeepAlive] loading module ')
+
+
+class ConnectionStats:
+    '''
+    Counters of the connections and requests of the KeepAliveHandler.
+    '''
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {
+            "connections": 0,
+            "open": 0,
+            "requests": 0,
+            "reused_requests": 0,
+            "tls_resumed": 0,
+            "idle_closed": 0,
+            "limit_closed": 0,
+        }
+
+    def count(self, name, value=1):
+        """
+        Adds the value to the counter with the given name.
+        """
+        with self._lock:
+            self.counters[name] += value
+
+    def stats(self):
+        """
+        Returns the counters, the share of requests served on an already open connection and
+        the mean number of requests per connection.
+        """
+        with self._lock:
+            counters = dict(self.counters)
+        return {
+            **counters,
+            "reuse_ratio": (
+                round(counters["reused_requests"] / counters["requests"], 3)
+                if counters["requests"] else 0
+            ),
+            "requests_per_connection": (
+                round(counters["requests"] / counters["connections"], 2)
+                if counters["connections"] else 0
+            ),
+        }
+
+
+class KeepAliveHandler(WSGIHandler):
+    '''
+    WSGIHandler closing idle persistent connections after idle_timeout seconds and any
+    connection after max_requests requests, counting connections in connection_stats.
+    '''
+    idle_timeout = 5.0
+    max_requests = 100
+    connection_stats = ConnectionStats()
+
+    requests_handled = 0
+
+    def handle(self):
+        """
+        Handles all requests of the connection.
+        """
+        self.connection_stats.count("connections")
+        self.connection_stats.count("open")
+        if getattr(self.socket, "session_reused", False):
+            self.connection_stats.count("tls_resumed")
+        try:
+            super().handle()
+        finally:
+            self.connection_stats.count("open", -1)
+
+    def read_requestline(self):
+        """
+        Reads the next request line, returns an empty line (closing the connection) if none
+        arrives within idle_timeout seconds.
+        """
+        line = ""
+        with gevent.Timeout(self.idle_timeout, False):
+            line = super().read_requestline()
+            return line
+        self.connection_stats.count("idle_closed")
+        return line
+
+    def read_request(self, raw_requestline):
+        """
+        Parses the request and counts it, a request on an already used connection as reused.
+        """
+        result = super().read_request(raw_requestline)
+        self.requests_handled += 1
+        self.connection_stats.count("requests")
+        if self.requests_handled > 1:
+            self.connection_stats.count("reused_requests")
+        if self.requests_handled >= self.max_requests and not self.close_connection:
+            self.close_connection = True
+            self.connection_stats.count("limit_closed")
+        return result
+
+    def start_response(self, status, headers, exc_info=None):
+        """
+        Starts the response, announcing the close of a connection at its request limit.
+        """
+        if self.close_connection and self.request_version == "HTTP/1.1" and not any(
+            name.lower() == "connection" for name, _ in headers
+        ):
+            headers = list(headers) + [("Connection", "close")]
+        return super().start_response(status, headers, exc_info)
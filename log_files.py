@@ -0,0 +1,143 @@
+'''
+This module provides helpers for the append-only text files of the server (server.log,
+clientLog.txt): reading the last lines and rotating the files.
+
+tail_lines reads the file backwards in blocks from its end, so the cost depends on the number
+of returned lines and not on the file size. LogRotator renames a file after it exceeds a size
+or age limit, keeps a number of (optionally gzip compressed) rotated segments and deletes older
+ones, so disk usage stays bounded.
+
+Classes:
+    LogRotator: Size and age based rotation of an append-only file.
+
+Functions:
+    tail_lines: Returns the last lines of a text file.
+
+Usage example:
+    rotator = LogRotator('logs/server.log', max_bytes=5 * 1024 * 1024, max_age=7 * 86400)
+    rotator.append(['2025-01-01 10:00:00 -- [context] -- info\\n'])
+    last_lines = tail_lines('logs/server.log', 20)
+'''
+import os
+import gzip
+import time
+import shutil
+import logging
+import threading
+
+logger = logging.getLogger('__main__')
+logger.info('[LogFiles] loading module ')
+
+TAIL_BLOCK_SIZE = 8192
+
+
+def tail_lines(file_path, n, block_size=TAIL_BLOCK_SIZE):
+    """
+    Returns the last n lines of a text file (with line endings), reading blocks backwards from
+    the end of the file. Returns an empty list if the file does not exist.
+    """
+    if n <= 0:
+        return []
+    try:
+        with open(file_path, "rb") as file_handle:
+            file_handle.seek(0, os.SEEK_END)
+            position = file_handle.tell()
+            data = b""
+            # n lines need n + 1 line breaks unless the start of the file is reached
+            while position > 0 and data.count(b"\n") <= n:
+                read_size = min(block_size, position)
+                position -= read_size
+                file_handle.seek(position)
+                data = file_handle.read(read_size) + data
+    except FileNotFoundError:
+        return []
+    lines = data.decode("utf-8", errors="replace").splitlines(keepends=True)
+    return lines[-n:]
+
+
+class LogRotator:
+    '''
+    Appends lines to a file and rotates it after it exceeds max_bytes or max_age seconds.
+
+    Rotated segments are named '<file>.1', '<file>.2', ... (with '.gz' if compressed), '.1'
+    being the newest. Only the newest 'backups' segments are kept.
+    '''
+    def __init__(self, file_path, max_bytes=5 * 1024 * 1024, max_age=None, backups=5,
+                 compress=True):
+        self.file_path = file_path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.backups = backups
+        self.compress = compress
+        self.rotations = 0
+        self._lock = threading.Lock()
+        # the segment age starts with the last rotation, or the first write after startup
+        newest = self._segment_path(1)
+        self.segment_started = os.path.getmtime(newest) if os.path.exists(newest) else None
+
+    def _segment_path(self, index):
+        path = f"{self.file_path}.{index}"
+        if self.compress and not os.path.exists(path):
+            return path + ".gz"
+        return path
+
+    def append(self, lines, fsync=False):
+        """
+        Appends the lines to the file, rotating it before if a limit is reached. With fsync the
+        file is forced to disk after writing.
+        """
+        with self._lock:
+            if self.needs_rotation():
+                self.rotate()
+            with open(self.file_path, "a", encoding="utf-8") as file_handle:
+                file_handle.writelines(lines)
+                if fsync:
+                    file_handle.flush()
+                    os.fsync(file_handle.fileno())
+            if self.segment_started is None:
+                self.segment_started = time.time()
+
+    def needs_rotation(self):
+        """
+        Returns True if the file exceeds the size limit or the segment exceeds the age limit.
+        """
+        try:
+            size = os.path.getsize(self.file_path)
+        except FileNotFoundError:
+            return False
+        if size == 0:
+            return False
+        if self.max_bytes is not None and size >= self.max_bytes:
+            return True
+        return (
+            self.max_age is not None
+            and self.segment_started is not None
+            and time.time() - self.segment_started >= self.max_age
+        )
+
+    def rotate(self):
+        """
+        Renames the file to '<file>.1' (compressed if configured), shifts the older segments and
+        deletes the segments exceeding the number of backups.
+        """
+        for suffix in ("", ".gz"):
+            oldest = f"{self.file_path}.{self.backups}{suffix}"
+            if os.path.exists(oldest):
+                os.remove(oldest)
+        for index in range(self.backups - 1, 0, -1):
+            for suffix in ("", ".gz"):
+                source = f"{self.file_path}.{index}{suffix}"
+                if os.path.exists(source):
+                    os.replace(source, f"{self.file_path}.{index + 1}{suffix}")
+        if self.backups > 0:
+            newest = f"{self.file_path}.1"
+            os.replace(self.file_path, newest)
+            if self.compress:
+                with open(newest, "rb") as source, gzip.open(newest + ".gz", "wb") as target:
+                    shutil.copyfileobj(source, target)
+                os.remove(newest)
+        else:
+            os.remove(self.file_path)
+        self.segment_started = time.time()
+        self.rotations += 1
+        logger.info("[LogFiles] rotated %s", self.file_path)
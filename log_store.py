@@ -0,0 +1,364 @@
+'''
+This module provides the LogStore class, a structured and queryable store for the server log,
+and the DeviceLogStore class for the log entries posted by the devices to /api/log.
+
+Every log entry is a row (timestamp, context, device, info) in a SQLite database with indexes on
+the timestamp, on context and timestamp and on device and timestamp. Filtered queries (time
+range, context, device) are index lookups instead of a scan of the text log. Results are
+returned newest first and paged with a cursor (keyset pagination on timestamp and row id), so
+every page costs the same regardless of its position. Entries older than the retention time are
+deleted while writing.
+
+Device log entries follow the TRMNL firmware log schema (log_id, creation_timestamp,
+log_message, log_sourcefile, log_codeline, device_status_stamp, additional_info). They are
+parsed into typed columns, and entries retransmitted by a device are ignored by a unique
+constraint on device, creation timestamp and log id.
+
+Classes:
+    LogStore: SQLite store for structured server log entries.
+    DeviceLogStore: SQLite store for the parsed log entries of the devices.
+
+Functions:
+    parse_device_log: Converts a firmware log entry to a row of the device log.
+
+Usage example:
+    log_store = LogStore('db/serverLog.sqlite3', retention=30 * 86400)
+    log_store.insert([(time.time(), 'Request received at /api/display', 'ABC123', 'info')])
+    entries, next_cursor = log_store.query(since=from_ts, context='Request received at /api/log')
+    device_log_store.insert([parse_device_log(entry, 'ABC123') for entry in logs_array])
+'''
+import json
+import math
+import time
+import sqlite3
+import logging
+
+logger = logging.getLogger('__main__')
+logger.info('[LogStore] loading module ')
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS server_log ("
+    " id INTEGER PRIMARY KEY, ts REAL NOT NULL, context TEXT NOT NULL, device TEXT,"
+    " info TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS idx_server_log_ts ON server_log (ts)",
+    "CREATE INDEX IF NOT EXISTS idx_server_log_context_ts ON server_log (context, ts)",
+    "CREATE INDEX IF NOT EXISTS idx_server_log_device_ts ON server_log (device, ts)",
+)
+DEVICE_LOG_COLUMNS = (
+    "device", "created", "log_id", "received", "message", "source_file", "code_line",
+    "wifi_rssi", "wifi_status", "battery_voltage", "refresh_rate", "fw_version",
+    "wakeup_reason", "special_function", "sleep_duration", "free_heap", "max_alloc",
+    "retry_attempt", "extra",
+)
+DEVICE_LOG_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS device_log ("
+    " id INTEGER PRIMARY KEY, device TEXT NOT NULL, created INTEGER NOT NULL,"
+    " log_id INTEGER NOT NULL, received REAL NOT NULL, message TEXT, source_file TEXT,"
+    " code_line INTEGER, wifi_rssi INTEGER, wifi_status TEXT, battery_voltage REAL,"
+    " refresh_rate INTEGER, fw_version TEXT, wakeup_reason TEXT, special_function TEXT,"
+    " sleep_duration INTEGER, free_heap INTEGER, max_alloc INTEGER, retry_attempt INTEGER,"
+    " extra TEXT, UNIQUE (device, created, log_id))",
+    "CREATE INDEX IF NOT EXISTS idx_device_log_created ON device_log (created)",
+)
+SQLITE_INTEGER_RANGE = (-2**63, 2**63 - 1)  # signed 64 bit INTEGER of SQLite
+PURGE_INTERVAL = 3600  # seconds between two deletions of expired entries
+MAX_LIMIT = 1000
+CONTEXT_PREFIX_END = "\U0010ffff"  # sorts after every continuation of a context prefix
+
+
+def encode_cursor(ts, row_id):
+    """
+    Returns the cursor pointing behind the entry with the given timestamp and row id.
+    """
+    return f"{ts!r}:{row_id}"
+
+
+def decode_cursor(cursor):
+    """
+    Returns (timestamp, row id) of a cursor or None if the cursor is invalid.
+    """
+    try:
+        ts, row_id = cursor.split(":")
+        position = float(ts), int(row_id)
+    except (AttributeError, ValueError):
+        return None
+    return position if math.isfinite(position[0]) else None
+
+
+def _as_type(value, cast):
+    """
+    Converts the value with cast, None for missing or invalid values and for values SQLite
+    cannot store (integers beyond 64 bit, non finite floats).
+    """
+    try:
+        converted = cast(value) if value is not None else None
+    except (TypeError, ValueError, OverflowError):
+        return None
+    if cast is int and converted is not None and not (
+        SQLITE_INTEGER_RANGE[0] <= converted <= SQLITE_INTEGER_RANGE[1]
+    ):
+        return None
+    if cast is float and converted is not None and not math.isfinite(converted):
+        return None
+    return converted
+
+
+def parse_device_log(entry, device, received=None):
+    """
+    Converts a firmware log entry (dict of the TRMNL log schema) to a row of the device log.
+    Unknown keys are kept as JSON in the 'extra' column. Values that are invalid or cannot be
+    stored (e.g. integers beyond 64 bit) become None. Returns None for invalid entries.
+    """
+    if not isinstance(entry, dict):
+        return None
+    entry = dict(entry)
+    status = entry.pop("device_status_stamp", None)
+    status = dict(status) if isinstance(status, dict) else {}
+    info = entry.pop("additional_info", None)
+    info = dict(info) if isinstance(info, dict) else {}
+    received = time.time() if received is None else received
+    created = _as_type(entry.pop("creation_timestamp", None), int)
+    log_id = _as_type(entry.pop("log_id", None), int)
+    row = (
+        device,
+        created if created is not None else int(received),
+        log_id if log_id is not None else -1,
+        received,
+        _as_type(entry.pop("log_message", None), str),
+        _as_type(entry.pop("log_sourcefile", None), str),
+        _as_type(entry.pop("log_codeline", None), int),
+        _as_type(status.pop("wifi_rssi_level", None), int),
+        _as_type(status.pop("wifi_status", None), str),
+        _as_type(status.pop("battery_voltage", None), float),
+        _as_type(status.pop("refresh_rate", None), int),
+        _as_type(status.pop("current_fw_version", None), str),
+        _as_type(status.pop("wakeup_reason", None), str),
+        _as_type(status.pop("special_function", None), str),
+        _as_type(status.pop("time_since_last_sleep_start", None), int),
+        _as_type(status.pop("free_heap_size", None), int),
+        _as_type(status.pop("max_alloc_size", None), int),
+        _as_type(info.pop("retry_attempt", None), int),
+    )
+    extra = {**entry}
+    if status:
+        extra["device_status_stamp"] = status
+    if info:
+        extra["additional_info"] = info
+    return row + (json.dumps(extra, default=str) if extra else None,)
+
+
+def _connect(db_file):
+    connection = sqlite3.connect(db_file, timeout=10)
+    connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
+
+
+def _create_schema(db_file, schema):
+    connection = _connect(db_file)
+    try:
+        connection.execute("PRAGMA journal_mode=WAL")
+        with connection:
+            for statement in schema:
+                connection.execute(statement)
+    finally:
+        connection.close()
+
+
+def _query_page(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    db_file, select, conditions, parameters, order_column, limit, cursor
+):
+    """
+    Runs a filtered select ordered by order_column and row id (newest first) and returns the
+    rows of one page and the cursor of the next page. Raises ValueError for an invalid cursor.
+    """
+    limit = max(1, min(int(limit), MAX_LIMIT))
+    conditions, parameters = list(conditions), list(parameters)
+    position = decode_cursor(cursor) if cursor else None
+    if cursor and position is None:
+        raise ValueError(f"invalid cursor {cursor!r}")
+    if position is not None:
+        conditions.append(f"({order_column} < ? OR ({order_column} = ? AND id < ?))")
+        parameters.extend((position[0], position[0], position[1]))
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    connection = _connect(db_file)
+    try:
+        connection.row_factory = sqlite3.Row
+        rows = connection.execute(
+            f"{select} {where} ORDER BY {order_column} DESC, id DESC LIMIT ?",
+            (*parameters, limit + 1),
+        ).fetchall()
+    finally:
+        connection.close()
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor(rows[limit - 1][order_column], rows[limit - 1]["id"])
+    return [dict(row) for row in rows[:limit]], next_cursor
+
+
+class LogStore:
+    '''
+    SQLite store for structured server log entries with indexed time, context and device
+    queries and cursor pagination.
+
+    Every call opens its own connection, so the store can be used from the writer thread and
+    the request handlers at the same time (WAL mode: readers do not block the writer).
+    '''
+    def __init__(self, db_file, retention=None):
+        self.db_file = db_file
+        self.retention = retention
+        self._last_purge = 0
+        _create_schema(db_file, SCHEMA)
+        logger.info("[LogStore] using %s", db_file)
+
+    def insert(self, entries, fsync=False):
+        """
+        Inserts (timestamp, context, device, info) entries in one transaction. With fsync the
+        write-ahead log is checkpointed, which forces the committed entries to disk.
+        """
+        connection = _connect(self.db_file)
+        try:
+            with connection:
+                connection.executemany(
+                    "INSERT INTO server_log (ts, context, device, info) VALUES (?, ?, ?, ?)",
+                    entries,
+                )
+                self._purge(connection)
+            if fsync:
+                connection.execute("PRAGMA wal_checkpoint(PASSIVE)")
+        finally:
+            connection.close()
+
+    def _purge(self, connection):
+        """
+        Deletes the entries older than the retention time, at most every PURGE_INTERVAL seconds.
+        """
+        now = time.time()
+        if self.retention is None or now - self._last_purge < PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        deleted = connection.execute(
+            "DELETE FROM server_log WHERE ts < ?", (now - self.retention,)
+        ).rowcount
+        if deleted:
+            logger.info("[LogStore] deleted %s expired entries", deleted)
+
+    def query(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self, since=None, until=None, context=None, device=None, limit=100, cursor=None
+    ):
+        """
+        Returns the entries matching all given filters (timestamps in epoch seconds, context
+        matches as prefix), newest first, and the cursor of the next page (None on the last
+        page).
+        """
+        conditions, parameters = [], []
+        if since is not None:
+            conditions.append("ts >= ?")
+            parameters.append(since)
+        if until is not None:
+            conditions.append("ts <= ?")
+            parameters.append(until)
+        if context is not None:
+            # prefix as range of the (context, ts) index, LIKE would not use the index
+            conditions.append("context >= ? AND context < ?")
+            parameters.extend((context, context + CONTEXT_PREFIX_END))
+        if device is not None:
+            conditions.append("device = ?")
+            parameters.append(device)
+        return _query_page(
+            self.db_file,
+            "SELECT id, ts, context, device, info FROM server_log",
+            conditions,
+            parameters,
+            "ts",
+            limit,
+            cursor,
+        )
+
+
+class DeviceLogStore:
+    '''
+    SQLite store for the parsed log entries of the devices, deduplicated by device, creation
+    timestamp and log id, with indexed device and time queries and cursor pagination.
+    '''
+    def __init__(self, db_file, retention=None):
+        self.db_file = db_file
+        self.retention = retention
+        self._last_purge = 0
+        _create_schema(db_file, DEVICE_LOG_SCHEMA)
+        self.inserted = 0
+        self.duplicates = 0
+        logger.info("[DeviceLogStore] using %s", db_file)
+
+    def insert(self, batches, fsync=False):
+        """
+        Inserts lists of parsed rows (see parse_device_log) in one transaction, ignoring entries
+        that are already stored. With fsync the write-ahead log is checkpointed.
+        """
+        rows = [row for batch in batches for row in batch if row is not None]
+        connection = _connect(self.db_file)
+        try:
+            with connection:
+                before = connection.total_changes
+                connection.executemany(
+                    f"INSERT OR IGNORE INTO device_log ({', '.join(DEVICE_LOG_COLUMNS)})"
+                    f" VALUES ({', '.join('?' * len(DEVICE_LOG_COLUMNS))})",
+                    rows,
+                )
+                inserted = connection.total_changes - before
+                self._purge(connection)
+            if fsync:
+                connection.execute("PRAGMA wal_checkpoint(PASSIVE)")
+        finally:
+            connection.close()
+        self.inserted += inserted
+        self.duplicates += len(rows) - inserted
+
+    def _purge(self, connection):
+        """
+        Deletes the entries older than the retention time, at most every PURGE_INTERVAL seconds.
+        """
+        now = time.time()
+        if self.retention is None or now - self._last_purge < PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        deleted = connection.execute(
+            "DELETE FROM device_log WHERE received < ?", (now - self.retention,)
+        ).rowcount
+        if deleted:
+            logger.info("[DeviceLogStore] deleted %s expired entries", deleted)
+
+    def query(self, since=None, until=None, device=None, limit=100, cursor=None):
+        """
+        Returns the entries matching all given filters (creation timestamps in epoch seconds),
+        newest first, and the cursor of the next page (None on the last page).
+        """
+        conditions, parameters = [], []
+        if since is not None:
+            conditions.append("created >= ?")
+            parameters.append(int(since))
+        if until is not None:
+            conditions.append("created <= ?")
+            parameters.append(int(until))
+        if device is not None:
+            conditions.append("device = ?")
+            parameters.append(device)
+        return _query_page(
+            self.db_file,
+            f"SELECT id, {', '.join(DEVICE_LOG_COLUMNS)} FROM device_log",
+            conditions,
+            parameters,
+            "created",
+            limit,
+            cursor,
+        )
+
+    def stats(self):
+        """
+        Returns the number of stored, inserted and ignored (retransmitted) entries.
+        """
+        connection = _connect(self.db_file)
+        try:
+            stored = connection.execute("SELECT COUNT(*) FROM device_log").fetchone()[0]
+        finally:
+            connection.close()
+        return {"stored": stored, "inserted": self.inserted, "duplicates": self.duplicates}
@@ -0,0 +1,238 @@
+'''
+This module provides counters, histograms and gauges in the Prometheus text exposition format.
+
+Counters and histograms are updated where something happens (a request, a render, a commit).
+Gauges are read from a callback when the metrics are rendered, so sizes and queue depths come
+straight from the components that own them. Label values are given as keyword arguments.
+
+Classes:
+    Counter: Monotonic counter per label set.
+    Histogram: Cumulative bucket counts, sum and count of observations per label set.
+    Gauge: Value (or values per label set) returned by a callback at rendering time.
+    MetricsRegistry: Creates the metrics and renders all of them as text.
+
+Usage example:
+    metrics = MetricsRegistry()
+    requests_total = metrics.counter('requests_total', 'Requests', ('route',))
+    requests_total.inc(route='/api/display')
+    with metrics.histogram('render_seconds', 'Render time').time():
+        render()
+    metrics.gauge('queue_depth', 'Queued entries', lambda: queue.qsize())
+    text = metrics.render()
+'''
+import time
+import math
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger('__main__')
+logger.info('[Metrics] loading module ')
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(value):
+    """
+    Formats a sample value like Prometheus (integers without decimals, +Inf).
+    """
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int):
+        return str(value)
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    return repr(float(value))
+
+
+def _format_labels(labelnames, labelvalues, extra=()):
+    """
+    Formats the label set of a sample, e.g. {route="/status",status="200"}.
+    """
+    pairs = list(zip(labelnames, labelvalues)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for name, value in pairs
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+class _Metric:
+    '''
+    Common base of the metrics: name, help text, label names and a lock.
+    '''
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        """
+        Returns the tuple of label values in the order of labelnames.
+        """
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects the labels {', '.join(self.labelnames)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        """
+        Returns the samples of the metric as (suffix, label values, extra labels, value).
+        """
+        raise NotImplementedError
+
+    def render(self):
+        """
+        Returns the HELP and TYPE lines and the samples of the metric as text.
+        """
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labelvalues, extra, value in self.samples():
+            lines.append(
+                f"{self.name}{suffix}{_format_labels(self.labelnames, labelvalues, extra)} "
+                f"{_format_value(value)}"
+            )
+        return "\n".join(lines) + "\n"
+
+
+class Counter(_Metric):
+    '''
+    Monotonic counter per label set.
+    '''
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, value=1, **labels):
+        """
+        Increases the counter of the label set by value.
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def samples(self):
+        with self._lock:
+            return [("", key, (), value) for key, value in sorted(self._values.items())]
+
+
+class Histogram(_Metric):
+    '''
+    Cumulative bucket counts, sum and count of the observations per label set.
+    '''
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(float(bound) for bound in sorted(buckets))
+        self._values = {}
+
+    def observe(self, value, **labels):
+        """
+        Adds an observation to the histogram of the label set.
+        """
+        key = self._key(labels)
+        with self._lock:
+            bucket_counts, total, count = self._values.get(key, ([0] * len(self.buckets), 0, 0))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    bucket_counts[index] += 1
+                    break
+            self._values[key] = (bucket_counts, total + value, count + 1)
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        Observes the duration of the with block in seconds.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, (bucket_counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, bucket_counts):
+                    cumulative += bucket_count
+                    samples.append(("_bucket", key, (("le", _format_value(bound)),), cumulative))
+                samples.append(("_bucket", key, (("le", "+Inf"),), count))
+                samples.append(("_sum", key, (), total))
+                samples.append(("_count", key, (), count))
+        return samples
+
+
+class Gauge(_Metric):
+    '''
+    Value returned by a callback when the metrics are rendered. With label names the callback
+    returns a dict of label value tuples to values. With kind 'counter' it exposes a counter
+    kept by a component.
+    '''
+    def __init__(self, name, documentation, callback, labelnames=(), kind="gauge"):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+        self.kind = kind
+
+    def samples(self):
+        value = self.callback()
+        if not self.labelnames:
+            return [] if value is None else [("", (), (), value)]
+        return [
+            ("", tuple(str(label) for label in key), (), item)
+            for key, item in sorted(value.items())
+            if item is not None
+        ]
+
+
+class MetricsRegistry:
+    '''
+    Creates the metrics and renders all of them in the Prometheus text format.
+    '''
+    def __init__(self, prefix=""):
+        self.prefix = prefix
+        self._metrics = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        """
+        Creates and registers a Counter.
+        """
+        return self._add(Counter(self.prefix + name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """
+        Creates and registers a Histogram.
+        """
+        return self._add(Histogram(self.prefix + name, documentation, labelnames, buckets))
+
+    def gauge(self, name, documentation, callback, labelnames=(), kind="gauge"):
+        """
+        Creates and registers a Gauge reading its value from the callback.
+        """
+        return self._add(Gauge(self.prefix + name, documentation, callback, labelnames, kind))
+
+    def render(self):
+        """
+        Returns all metrics as text. A gauge whose callback fails is left out and logged.
+        """
+        parts = []
+        for metric in self._metrics:
+            try:
+                parts.append(metric.render())
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                logger.error("[Metrics] reading %s failed: %s", metric.name, str(e))
+        return "".join(parts)
@@ -0,0 +1,193 @@
+'''
+This module provides the PrerenderScheduler class for preparing the display image ahead of the
+next client wake-up.
+
+The next wake-up of each device is predicted from its last contact and the refresh time sent
+to it. Shortly before (lead time) the scheduler thread renders the frame of that device (in
+trmnl_server the fetched source image, the footer with the values of the wake is added on
+contact), so /api/display does not wait for the upstream image. Every frame is handed out
+once. Frames older than the maximum frame age or rendered with a different configuration are
+not used and the caller renders on demand. A device is rendered once per predicted wake-up and
+forgotten if it did not contact within the maximum frame age after it.
+
+Classes:
+    PrerenderScheduler: Background thread rendering frames ahead of predicted device wake-ups.
+
+Usage example:
+    scheduler = PrerenderScheduler(render_frame, config_key, lead_time=15)
+    scheduler.start()
+    frame = scheduler.take_frame('AA:BB:CC:DD:EE:FF')
+    scheduler.schedule('AA:BB:CC:DD:EE:FF', time.time(), 900)
+'''
+import time
+import logging
+import threading
+
+logger = logging.getLogger('__main__')
+logger.info('[Prerender] loading module ')
+
+
+class PrerenderScheduler:
+    '''
+    Renders frames in a background thread shortly before the predicted wake-up of a device.
+
+    render_frame is called without arguments and returns the frame (any object), config_key
+    returns a value identifying the configuration the frame depends on (e.g. the image path).
+    '''
+    def __init__(self, render_frame, config_key, lead_time=15, max_frame_age=90):
+        self.render_frame = render_frame
+        self.config_key = config_key
+        self.lead_time = lead_time
+        self.max_frame_age = max_frame_age
+        self.next_wakes = {}
+        self.frames = {}
+        self.counters = {
+            "renders": 0,
+            "render_errors": 0,
+            "on_time": 0,
+            "late": 0,
+            "last_lead_seconds": None,
+            "last_render_seconds": None,
+        }
+        self._lead_sum = 0.0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+        Starts the scheduler thread.
+        """
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="prerender", daemon=True)
+        self._thread.start()
+        logger.info("[Prerender] scheduler started with lead time %s s", self.lead_time)
+
+    def schedule(self, device_id, last_contact, refresh_time):
+        """
+        Predicts the next wake-up of the device from its last contact and refresh time.
+        """
+        with self._lock:
+            self.next_wakes[device_id] = last_contact + refresh_time
+            self._forget_missing(time.time())
+        self._wakeup.set()
+
+    def _forget_missing(self, now):
+        """
+        Removes the devices (and their frames) whose predicted wake-up is more than the maximum
+        frame age ago. Called with the lock held.
+        """
+        missing = [
+            device_id for device_id, wake in self.next_wakes.items()
+            if wake < now - self.max_frame_age
+        ]
+        for device_id in missing:
+            del self.next_wakes[device_id]
+            self.frames.pop(device_id, None)
+
+    def _next_render(self):
+        """
+        Returns the time and the device of the next scheduled render or None if no wake-up
+        without a frame is predicted. A frame stays until the contact or until the device is
+        forgotten, so every predicted wake-up is rendered once.
+        """
+        with self._lock:
+            self._forget_missing(time.time())
+            upcoming = [
+                (wake - self.lead_time, device_id)
+                for device_id, wake in self.next_wakes.items()
+                if device_id not in self.frames
+                or self.frames[device_id]["rendered_at"] < wake - self.lead_time
+            ]
+        return min(upcoming) if upcoming else None
+
+    def next_render_at(self):
+        """
+        Returns the time of the next scheduled render or None if no wake-up is predicted.
+        """
+        next_render = self._next_render()
+        return next_render[0] if next_render else None
+
+    def _run(self):
+        while True:
+            next_render = self._next_render()
+            timeout = None if next_render is None else next_render[0] - time.time()
+            if timeout is None or timeout > 0:
+                self._wakeup.wait(timeout)
+                self._wakeup.clear()
+                continue
+            self.render_now(next_render[1])
+
+    def render_now(self, device_id):
+        """
+        Renders a new frame and stores it for the next contact of the device.
+        """
+        start = time.time()
+        config_key = self.config_key()
+        try:
+            content = self.render_frame()
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            # keep the scheduler alive, the next contact renders on demand
+            logger.warning("[Prerender] rendering failed: %s", str(e))
+            with self._lock:
+                self.counters["render_errors"] += 1
+                self.frames[device_id] = {
+                    "rendered_at": start, "content": None, "config_key": None
+                }
+            return
+        finished = time.time()
+        with self._lock:
+            self.frames[device_id] = {
+                "rendered_at": finished,
+                "content": content,
+                "config_key": config_key,
+            }
+            self.counters["renders"] += 1
+            self.counters["last_render_seconds"] = round(finished - start, 3)
+        logger.debug("[Prerender] frame for %s rendered in %.3f s", device_id, finished - start)
+
+    def take_frame(self, device_id):
+        """
+        Returns and removes the prerendered frame of a contacting device, or None if there is no
+        frame that is fresh and matches the current configuration. In that case the caller
+        renders on demand. Updates the on-time/late statistics.
+        """
+        now = time.time()
+        with self._lock:
+            frame = self.frames.pop(device_id, None)
+            expected = device_id in self.next_wakes
+            usable = (
+                frame is not None
+                and frame["content"] is not None
+                and now - frame["rendered_at"] <= self.max_frame_age
+                and frame["config_key"] == self.config_key()
+            )
+            if usable:
+                lead = now - frame["rendered_at"]
+                self.counters["on_time"] += 1
+                self.counters["last_lead_seconds"] = round(lead, 3)
+                self._lead_sum += lead
+                return frame["content"]
+            if expected:
+                self.counters["late"] += 1
+            return None
+
+    def stats(self):
+        """
+        Returns the scheduler settings and statistics as a dict.
+        """
+        next_render_at = self.next_render_at()
+        with self._lock:
+            on_time = self.counters["on_time"]
+            return dict(
+                self.counters,
+                lead_time=self.lead_time,
+                max_frame_age=self.max_frame_age,
+                running=self._thread is not None,
+                devices=len(self.next_wakes),
+                average_lead_seconds=round(self._lead_sum / on_time, 3) if on_time else None,
+                next_render_in=(
+                    round(next_render_at - time.time(), 1) if next_render_at else None
+                ),
+            )
@@ -0,0 +1,110 @@
+'''
+This module provides the RenderCache class for memoizing rendered footer images.
+
+A rendered frame only depends on the source image content, the values shown in the footer
+(WiFi/battery percentage, battery icon) and the minute-resolution timestamp. Repeated device
+polls with the same inputs can therefore be answered with the already encoded BMP.
+
+Classes:
+    RenderCache: Byte-size bounded LRU cache for encoded frames with hit/miss counters.
+
+Usage example:
+    render_cache = RenderCache(max_bytes=4 * 1024 * 1024)
+    key = render_cache.make_key(source_bytes, 85, 42, '', '17.10.2026 14:05')
+    frame = render_cache.get(key)
+    if frame is None:
+        render_cache.put(key, render(...))
+'''
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger('__main__')
+logger.info('[RenderCache] loading module ')
+
+
+class RenderCache:
+    '''
+    Byte-size bounded LRU cache for encoded frames.
+
+    Entries are evicted in least recently used order as soon as the sum of the stored frame
+    sizes exceeds max_bytes. A single frame larger than max_bytes is never stored.
+    '''
+    def __init__(self, max_bytes=4 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def content_hash(data):
+        """
+        Returns a short digest of the given bytes, used to identify a source image.
+        """
+        return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+    def make_key(self, source_bytes, *footer_values):
+        """
+        Builds a cache key from the source image content and the values drawn into the footer.
+        """
+        return (self.content_hash(source_bytes),) + tuple(footer_values)
+
+    def get(self, key):
+        """
+        Returns the cached frame for the key or None, and updates the hit/miss counters.
+        """
+        with self._lock:
+            frame = self._entries.get(key)
+            if frame is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return frame
+
+    def put(self, key, frame):
+        """
+        Stores an encoded frame (bytes) and evicts the least recently used entries if needed.
+        """
+        size = len(frame)
+        if size > self.max_bytes:
+            logger.debug('[RenderCache] frame with %s bytes exceeds cache size, not cached', size)
+            return
+        with self._lock:
+            old_frame = self._entries.pop(key, None)
+            if old_frame is not None:
+                self.current_bytes -= len(old_frame)
+            self._entries[key] = frame
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= len(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Removes all cached frames. The hit/miss counters are kept.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        """
+        Returns the cache counters as a dict.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0,
+            }
@@ -0,0 +1,181 @@
+'''
+This module provides the RenderResources class holding the fonts and pre-rasterized glyphs used
+for drawing the image footer.
+
+Fonts are loaded once at startup. The fixed set of footer glyphs (WiFi, battery and charging
+icons, digits, '%', '.', ':' and space) is rasterized into a 1-bit glyph atlas, so a footer is
+drawn by blitting glyph bitmaps instead of running FreeType for every request. Texts with other
+characters are drawn with PIL as before. benchmarks/bench_footer_atlas.py checks that complete
+footers drawn with the atlas are pixel-identical to the PIL text rendering.
+
+Classes:
+    RenderResources: Loads fonts, builds the glyph atlas and draws footer texts.
+
+Usage example:
+    render_resources = RenderResources('/path/to/trmnlServer')
+    render_resources.draw_text(draw, (40, 450), '85 %', 'text_font', fill=0)
+'''
+import os
+import logging
+from PIL import Image, ImageDraw, ImageFont
+
+logger = logging.getLogger('__main__')
+logger.info('[RenderResources] loading module ')
+
+ICON_FONT_SIZE = 24
+TEXT_FONT_SIZE = 14
+NO_IMAGE_FONT_SIZE = 24
+
+# text font - try multiple options for cross-platform support
+TEXT_FONT_CANDIDATES = [
+    "arialbd.ttf",  # Windows
+    "arial.ttf",  # Windows
+    "/usr/share/fonts/ttf-dejavu/DejaVuSans-Bold.ttf",  # Alpine Linux
+    "/usr/share/fonts/ttf-dejavu/DejaVuSans.ttf",  # Alpine Linux
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",  # Debian/Ubuntu
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",  # Debian/Ubuntu
+]
+
+# glyphs drawn into the footer: wifi, battery levels, charging
+ICON_GLYPHS = "\uf1eb\uf240\uf241\uf242\uf243\uf244\uf0e7"
+TEXT_GLYPHS = "0123456789%.: "
+
+
+class GlyphAtlas:
+    '''
+    Pre-rasterized 1-bit glyphs of a single font.
+
+    Every glyph is stored as a mode '1' image together with its offset and advance, as well as
+    the kerning between all glyph pairs, which is everything needed to place the glyphs of a
+    string at the same positions as PIL does.
+    '''
+    def __init__(self, font, glyphs):
+        self.glyphs = {}
+        for glyph in glyphs:
+            mask, offset = font.getmask2(glyph, mode="1")
+            bitmap = Image.new("1", mask.size, 0)
+            if mask.size[0] and mask.size[1]:
+                ImageDraw.Draw(bitmap).text(
+                    (-offset[0], -offset[1]), glyph, fill=1, font=font
+                )
+            self.glyphs[glyph] = (bitmap, offset, font.getlength(glyph, mode="1"))
+        self.kerning = {}
+        for first in glyphs:
+            for second in glyphs:
+                kerning = (
+                    font.getlength(first + second, mode="1")
+                    - self.glyphs[first][2]
+                    - self.glyphs[second][2]
+                )
+                if kerning:
+                    self.kerning[(first, second)] = kerning
+
+    def covers(self, text):
+        """
+        Returns True if all characters of the text are part of the atlas.
+        """
+        return all(glyph in self.glyphs for glyph in text)
+
+    def layout(self, text):
+        """
+        Returns the glyph bitmaps of the text with their position relative to the text origin.
+        """
+        placed = []
+        pen = 0
+        previous = None
+        for glyph in text:
+            if previous is not None:
+                pen += self.kerning.get((previous, glyph), 0)
+            bitmap, offset, advance = self.glyphs[glyph]
+            placed.append((bitmap, (int(pen) + offset[0], offset[1])))
+            pen += advance
+            previous = glyph
+        return placed, int(pen)
+
+    def width(self, text):
+        """
+        Returns the width of the text bounding box, like ImageDraw.textbbox.
+        """
+        placed, advance = self.layout(text)
+        if not placed:
+            return 0
+        left = min(position[0] for _, position in placed)
+        right = max(advance, *(position[0] + bitmap.width for bitmap, position in placed))
+        return right - min(left, 0)
+
+
+class RenderResources:
+    '''
+    Holds the fonts and glyph atlases used for image rendering.
+    '''
+    def __init__(self, base_path):
+        self.base_path = base_path
+        self.fonts = {}
+        self.atlases = {}
+        self.load_fonts()
+        self.build_atlases()
+
+    def load_fonts(self):
+        """
+        Loads the icon font (FontAwesome), the footer text font and the font for the
+        'no image' placeholder. Missing fonts fall back to the PIL default font.
+        """
+        icon_font_path = os.path.join(self.base_path, "web", "fontawesome-webfont.ttf")
+        try:
+            self.fonts["icon_font"] = ImageFont.truetype(icon_font_path, ICON_FONT_SIZE)
+            logger.debug("[RenderResources] loaded FontAwesome from %s", icon_font_path)
+        except OSError as e:
+            logger.warning("[RenderResources] could not load FontAwesome: %s", str(e))
+            self.fonts["icon_font"] = ImageFont.load_default()
+
+        self.fonts["text_font"] = None
+        for font_path in TEXT_FONT_CANDIDATES:
+            try:
+                self.fonts["text_font"] = ImageFont.truetype(font_path, TEXT_FONT_SIZE)
+                logger.debug("[RenderResources] loaded text font: %s", font_path)
+                break
+            except OSError:
+                continue
+        if self.fonts["text_font"] is None:
+            logger.warning("[RenderResources] no system fonts available, using default")
+            self.fonts["text_font"] = ImageFont.load_default()
+
+        try:
+            self.fonts["no_image_font"] = ImageFont.truetype("DejaVuSans.ttf", NO_IMAGE_FONT_SIZE)
+        except IOError:
+            self.fonts["no_image_font"] = ImageFont.load_default()
+
+    def build_atlases(self):
+        """
+        Rasterizes the footer glyphs of the icon and text font.
+        """
+        for font_key, glyphs in (("icon_font", ICON_GLYPHS), ("text_font", TEXT_GLYPHS)):
+            font = self.fonts[font_key]
+            if not isinstance(font, ImageFont.FreeTypeFont):
+                logger.info("[RenderResources] no glyph atlas for non TrueType %s", font_key)
+                continue
+            self.atlases[font_key] = GlyphAtlas(font, glyphs)
+        logger.info("[RenderResources] glyph atlases ready for: %s", ", ".join(self.atlases))
+
+    def draw_text(self, draw, xy, text, font_key, fill):
+        """
+        Draws the text with the given font, using the glyph atlas if it covers the text.
+        """
+        atlas = self.atlases.get(font_key)
+        if atlas is None or not atlas.covers(text):
+            draw.text(xy, text, fill=fill, font=self.fonts[font_key])
+            return
+        placed, _ = atlas.layout(text)
+        for bitmap, position in placed:
+            if bitmap.width and bitmap.height:
+                draw.bitmap((xy[0] + position[0], xy[1] + position[1]), bitmap, fill=fill)
+
+    def text_width(self, draw, text, font_key):
+        """
+        Returns the width of the text bounding box, using the glyph atlas if possible.
+        """
+        atlas = self.atlases.get(font_key)
+        if atlas is not None and atlas.covers(text):
+            return atlas.width(text)
+        bbox = draw.textbbox((0, 0), text, font=self.fonts[font_key])
+        return bbox[2] - bbox[0]
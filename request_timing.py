@@ -0,0 +1,136 @@
+'''
+This module provides the stage timing of requests for Server-Timing headers and the slow
+request log.
+
+A RequestTimer is started for a request and set as the current timer of the context. Code
+along the request wraps its stages in stage(name); the durations are summed per stage name
+and formatted as Server-Timing header or as the stage breakdown of a slow request. Stages may
+be nested (e.g. the BMP encode inside the footer rendering), a nested stage is part of the
+duration of the outer one.
+
+Without a current timer (timing switched off, background threads) stage returns a shared
+no-op context manager, so the instrumentation costs one context variable lookup per stage.
+
+Classes:
+    RequestTimer: Collects the stage durations of one request.
+
+Functions:
+    start_timer: Starts a RequestTimer as the current timer.
+    stop_timer: Removes the current timer.
+    stage: Context manager timing a stage of the current request.
+
+Usage example:
+    timer = start_timer()
+    with stage('load_image'):
+        image = load_image(path)
+    response.headers['Server-Timing'] = timer.server_timing()
+    stop_timer()
+'''
+import time
+import logging
+import contextvars
+from contextlib import nullcontext
+
+logger = logging.getLogger('__main__')
+logger.info('[RequestTiming] loading module ')
+
+_current_timer = contextvars.ContextVar("request_timer", default=None)
+_NO_STAGE = nullcontext()
+
+
+class _Stage:
+    '''
+    Context manager adding the duration of its block to a stage of the timer.
+    '''
+    __slots__ = ("timer", "name", "start")
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.timer.add(self.name, time.perf_counter() - self.start)
+
+
+class RequestTimer:
+    '''
+    Collects the durations of the stages of one request, summed per stage name in the order of
+    their first occurrence.
+    '''
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages = {}
+
+    def add(self, name, duration):
+        """
+        Adds a duration in seconds to the stage with the given name.
+        """
+        total, count = self.stages.get(name, (0.0, 0))
+        self.stages[name] = (total + duration, count + 1)
+
+    def elapsed(self):
+        """
+        Returns the seconds since the start of the timer.
+        """
+        return time.perf_counter() - self.start
+
+    def server_timing(self, total=None):
+        """
+        Returns the stages as value of a Server-Timing header, durations in milliseconds, a
+        stage that occurred more than once with its count as description.
+        """
+        metrics = []
+        for name, (duration, count) in self.stages.items():
+            entry = f"{name};dur={duration * 1000:.2f}"
+            if count > 1:
+                entry += f';desc="{count}x"'
+            metrics.append(entry)
+        metrics.append(f"total;dur={(self.elapsed() if total is None else total) * 1000:.2f}")
+        return ", ".join(metrics)
+
+    def breakdown(self):
+        """
+        Returns the stages as text for the slow request log, e.g. 'load_image=12.3ms footer=45.6ms'.
+        """
+        return " ".join(
+            f"{name}={duration * 1000:.1f}ms" + (f"({count}x)" if count > 1 else "")
+            for name, (duration, count) in self.stages.items()
+        )
+
+
+def start_timer():
+    """
+    Starts a RequestTimer as the current timer of the context and returns it.
+    """
+    timer = RequestTimer()
+    _current_timer.set(timer)
+    return timer
+
+
+def stop_timer():
+    """
+    Removes the current timer of the context.
+    """
+    _current_timer.set(None)
+
+
+def current_timer():
+    """
+    Returns the current timer of the context or None.
+    """
+    return _current_timer.get()
+
+
+def stage(name):
+    """
+    Returns a context manager timing the block as stage of the current request, without a
+    current timer a no-op.
+    """
+    timer = _current_timer.get()
+    if timer is None:
+        return _NO_STAGE
+    return _Stage(timer, name)
@@ -0,0 +1,135 @@
+'''
+This module provides the SourceCache class for loading the source image of the display.
+
+Images from URLs are fetched through a pooled keep-alive requests.Session with conditional GET
+requests (If-None-Match/If-Modified-Since), so an unchanged upstream image answers with
+304 Not Modified and the cached bytes are reused. Local files are only read again if their
+modification time or size has changed.
+
+Classes:
+    SourceCache: Caches source images from URLs and local files.
+
+Usage example:
+    source_cache = SourceCache()
+    image_bytes = source_cache.load('https://dashboard.local/screen.bmp')
+'''
+import os
+import logging
+import threading
+from collections import OrderedDict
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger('__main__')
+logger.info('[SourceCache] loading module ')
+
+
+class SourceCache:
+    '''
+    Caches source images from URLs (validated with ETag/Last-Modified) and local files
+    (validated with modification time and size).
+    '''
+    def __init__(self, timeout=10, max_entries=4, pool_maxsize=4):
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_entries, pool_maxsize=pool_maxsize)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.counters = {
+            "http_downloads": 0,
+            "http_not_modified": 0,
+            "http_bytes": 0,
+            "file_reads": 0,
+            "file_unchanged": 0,
+        }
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def is_url(image_path):
+        """
+        Returns True if the image path is a http(s) URL.
+        """
+        return image_path.startswith("http://") or image_path.startswith("https://")
+
+    def load(self, image_path):
+        """
+        Returns the content of the image at the given URL or local path as bytes.
+        """
+        if self.is_url(image_path):
+            return self._load_url(image_path)
+        return self._load_file(image_path)
+
+    def _get_entry(self, image_path):
+        with self._lock:
+            entry = self._entries.get(image_path)
+            if entry is not None:
+                self._entries.move_to_end(image_path)
+            return entry
+
+    def _store_entry(self, image_path, entry):
+        with self._lock:
+            self._entries[image_path] = entry
+            self._entries.move_to_end(image_path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _load_url(self, image_path):
+        entry = self._get_entry(image_path)
+        headers = {}
+        if entry is not None:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+        response = self.session.get(image_path, timeout=self.timeout, headers=headers)
+        if response.status_code == 304 and entry is not None:
+            self.counters["http_not_modified"] += 1
+            logger.debug("[SourceCache] %s not modified, using cached image", image_path)
+            return entry["content"]
+        response.raise_for_status()  # Raise an exception for HTTP errors
+        content = response.content
+        self.counters["http_downloads"] += 1
+        self.counters["http_bytes"] += len(content)
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if etag or last_modified:
+            self._store_entry(
+                image_path,
+                {"etag": etag, "last_modified": last_modified, "content": content},
+            )
+        return content
+
+    def _load_file(self, image_path):
+        stat = os.stat(image_path)
+        entry = self._get_entry(image_path)
+        if (
+            entry is not None
+            and entry["mtime_ns"] == stat.st_mtime_ns
+            and entry["size"] == stat.st_size
+        ):
+            self.counters["file_unchanged"] += 1
+            return entry["content"]
+        with open(image_path, "rb") as image_file:
+            content = image_file.read()
+        self.counters["file_reads"] += 1
+        self._store_entry(
+            image_path,
+            {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "content": content},
+        )
+        return content
+
+    def clear(self):
+        """
+        Removes all cached images, the next load fetches or reads them again.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Returns the cache counters as a dict.
+        """
+        with self._lock:
+            return dict(self.counters, entries=len(self._entries))
@@ -0,0 +1,73 @@
+'''
+This module provides generators for streamed HTTP responses of long series.
+
+The rows are encoded and yielded in chunks of rows_per_chunk rows, so only one chunk of the
+response is held in memory at a time. A Flask Response built from one of the generators is sent
+with chunked transfer encoding. Peak memory therefore does not depend on the length of the
+series, as long as the rows themselves come from a generator.
+
+Functions:
+    json_array_chunks: Yields a JSON array of the given rows in chunks.
+    csv_chunks: Yields a CSV table (header and rows) of the given rows in chunks.
+
+Usage example:
+    return Response(json_array_chunks(iter_rows()), mimetype='application/json')
+'''
+import io
+import csv
+import json
+import logging
+from itertools import chain
+
+logger = logging.getLogger('__main__')
+logger.info('[Streaming] loading module ')
+
+ROWS_PER_CHUNK = 1000
+
+
+def json_array_chunks(rows, rows_per_chunk=ROWS_PER_CHUNK):
+    """
+    Yields the JSON array of the rows (dicts, compact and with sorted keys like jsonify) in
+    chunks of rows_per_chunk rows.
+    """
+    encoder = json.JSONEncoder(separators=(",", ":"), sort_keys=True)
+    yield "["
+    chunk = []
+    separator = ""
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= rows_per_chunk:
+            # one encoder call per chunk, without the brackets of the chunk list
+            yield separator + encoder.encode(chunk)[1:-1]
+            chunk.clear()
+            separator = ","
+    if chunk:
+        yield separator + encoder.encode(chunk)[1:-1]
+    yield "]\n"
+
+
+def csv_chunks(rows, fieldnames=None, rows_per_chunk=ROWS_PER_CHUNK):
+    """
+    Yields a CSV table of the rows (dicts) in chunks of rows_per_chunk rows. Without fieldnames
+    the columns are the keys of the first row, keys missing in a row are left empty.
+    """
+    rows = iter(rows)
+    if fieldnames is None:
+        first_row = next(rows, None)
+        if first_row is None:
+            return
+        fieldnames = list(first_row)
+        rows = chain([first_row], rows)
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames, extrasaction="ignore")
+    writer.writeheader()
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+        if count % rows_per_chunk == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
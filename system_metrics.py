@@ -0,0 +1,110 @@
+'''
+This module provides the SystemSampler class for sampling server metrics in the background.
+
+A sampler thread records CPU load, memory usage, open sockets and process statistics in a fixed
+interval and keeps a rolling window of the samples. Request handlers read the latest snapshot
+or the window in constant time instead of sampling themselves (e.g. the former blocking
+psutil.cpu_percent(interval=1) in /status).
+
+Classes:
+    SystemSampler: Background sampler with a rolling window of system metrics.
+
+Usage example:
+    system_sampler = SystemSampler(interval=5, window=720)
+    system_sampler.start()
+    cpu_load = system_sampler.latest()['cpu_percent']
+'''
+import time
+import logging
+import threading
+from collections import deque
+import psutil
+
+logger = logging.getLogger('__main__')
+logger.info('[SystemSampler] loading module ')
+
+
+class SystemSampler:
+    '''
+    Samples system and process metrics in a background thread into a rolling window. The
+    optional on_sample(snapshot) is called in the sampler thread after every sample, e.g. to
+    publish it.
+    '''
+    def __init__(self, interval=5, window=720, on_sample=None):
+        self.interval = interval
+        self.on_sample = on_sample
+        self.samples = deque(maxlen=window)
+        self.process = psutil.Process()
+        self._lock = threading.Lock()
+        self._thread = None
+        # the first call only initializes the cpu counters of psutil
+        psutil.cpu_percent(interval=None)
+        self.process.cpu_percent(interval=None)
+
+    def start(self):
+        """
+        Starts the sampler thread.
+        """
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="system-sampler", daemon=True)
+        self._thread.start()
+        logger.info("[SystemSampler] sampling every %s s", self.interval)
+
+    def _run(self):
+        while True:
+            try:
+                snapshot = self.sample()
+                if self.on_sample is not None:
+                    self.on_sample(snapshot)
+            except psutil.Error as e:
+                logger.warning("[SystemSampler] sampling failed: %s", str(e))
+            time.sleep(self.interval)
+
+    def _count_sockets(self):
+        try:
+            if hasattr(self.process, "net_connections"):
+                return len(self.process.net_connections(kind="inet"))
+            return len(self.process.connections(kind="inet"))
+        except psutil.AccessDenied:
+            return None
+
+    def sample(self):
+        """
+        Takes one sample (CPU load since the previous sample) and appends it to the window.
+        """
+        memory = psutil.virtual_memory()
+        with self.process.oneshot():
+            snapshot = {
+                "timestamp": round(time.time(), 3),
+                "cpu_percent": psutil.cpu_percent(interval=None),
+                "memory_percent": memory.percent,
+                "memory_available": memory.available,
+                "process_cpu_percent": self.process.cpu_percent(interval=None),
+                "process_rss": self.process.memory_info().rss,
+                "process_threads": self.process.num_threads(),
+                "open_sockets": self._count_sockets(),
+            }
+        with self._lock:
+            self.samples.append(snapshot)
+        return snapshot
+
+    def latest(self):
+        """
+        Returns the latest sample, taking a first one if the sampler has not run yet.
+        """
+        with self._lock:
+            if self.samples:
+                return self.samples[-1]
+        return self.sample()
+
+    def history(self, seconds=None):
+        """
+        Returns the samples of the rolling window, optionally only the ones of the last seconds.
+        """
+        with self._lock:
+            samples = list(self.samples)
+        if seconds is not None:
+            since = time.time() - seconds
+            samples = [sample for sample in samples if sample["timestamp"] >= since]
+        return samples
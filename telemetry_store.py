@@ -0,0 +1,371 @@
+'''
+This module provides the TelemetryStore class, an append-only time-series store for the battery
+voltage and WiFi RSSI reported by the client.
+
+Every sample is a fixed-size binary record (epoch seconds as uint32, voltage as float32, RSSI as
+int8). Records are appended in timestamp order, so the file itself is the timestamp index and
+range queries locate their first and last record with a binary search (O(log n)) instead of
+parsing the whole history. The former text format (db/clientData.txt) is imported once.
+
+Hourly and daily rollups (count, min, max, mean of voltage and RSSI) are built on first use and
+maintained with every append, so wide ranges can be answered from the rollups. Series can
+further be reduced with the Largest-Triangle-Three-Buckets (LTTB) algorithm.
+
+Classes:
+    TelemetryStore: Append-only binary store with timestamp range queries.
+
+Functions:
+    parse_timestamp: Converts a timestamp string (date, local time or ISO 8601) to epoch seconds.
+    lttb: Downsamples a series to a maximum number of points keeping its visual shape.
+
+Usage example:
+    telemetry_store = TelemetryStore('db/clientData.bin', legacy_file='db/clientData.txt')
+    telemetry_store.append([(time.time(), 3.95, -61)])
+    samples = telemetry_store.query(from_ts, to_ts)
+    hourly = telemetry_store.rollups('hour', from_ts, to_ts)
+'''
+import os
+import math
+import time
+import bisect
+import struct
+import logging
+import datetime
+import threading
+
+logger = logging.getLogger('__main__')
+logger.info('[TelemetryStore] loading module ')
+
+RECORD = struct.Struct("<Ifb")  # epoch seconds, battery voltage, rssi
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+READ_CHUNK_RECORDS = 65536
+ROLLUP_RESOLUTIONS = ("hour", "day")
+
+
+def parse_timestamp(value):
+    """
+    Converts a timestamp string to epoch seconds. Accepts dates ('2025-01-31'), local times
+    ('2025-01-31 12:00:00') and ISO 8601 with time zone ('2025-01-31T11:00:00.000Z').
+    Returns None for values that cannot be parsed.
+    """
+    if not value:
+        return None
+    try:
+        parsed = datetime.datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        return time.mktime(parsed.timetuple())
+    return parsed.timestamp()
+
+
+def format_timestamp(epoch):
+    """
+    Formats epoch seconds as local time string like the timestamps of the client data.
+    """
+    return time.strftime(TIMESTAMP_FORMAT, time.localtime(epoch))
+
+
+def _local_day_start(epoch):
+    """
+    Returns the epoch of the local midnight of the day containing epoch.
+    """
+    local = time.localtime(epoch)
+    return epoch - (local.tm_hour * 3600 + local.tm_min * 60 + local.tm_sec)
+
+
+def lttb(points, threshold, value=lambda point: point[1]):
+    """
+    Downsamples points (sequence ordered by point[0], the x value) to at most threshold points
+    with the Largest-Triangle-Three-Buckets algorithm. The first and last point are kept, from
+    every bucket in between the point spanning the largest triangle with its neighbours is
+    selected. value returns the y value of a point.
+    """
+    count = len(points)
+    if threshold >= count or threshold < 3:
+        return list(points[:threshold]) if threshold < 3 else list(points)
+    sampled = [points[0]]
+    bucket_size = (count - 2) / (threshold - 2)
+    selected = 0
+    for bucket in range(threshold - 2):
+        start = int(bucket * bucket_size) + 1
+        stop = int((bucket + 1) * bucket_size) + 1
+        # average point of the next bucket
+        next_start = stop
+        next_stop = min(int((bucket + 2) * bucket_size) + 1, count)
+        next_points = points[next_start:next_stop] or points[-1:]
+        average_x = sum(point[0] for point in next_points) / len(next_points)
+        average_y = sum(value(point) for point in next_points) / len(next_points)
+        selected_x, selected_y = points[selected][0], value(points[selected])
+        largest_area = -1
+        candidate = start
+        for index in range(start, stop):
+            area = abs(
+                (selected_x - average_x) * (value(points[index]) - selected_y)
+                - (selected_x - points[index][0]) * (average_y - selected_y)
+            )
+            if area > largest_area:
+                largest_area = area
+                candidate = index
+        sampled.append(points[candidate])
+        selected = candidate
+    sampled.append(points[-1])
+    return sampled
+
+
+class TelemetryStore:
+    '''
+    Append-only binary time-series store for battery voltage and RSSI samples.
+    '''
+    def __init__(self, data_file, legacy_file=None):
+        self.data_file = data_file
+        self._lock = threading.Lock()
+        self.count = 0
+        self.last_record = None
+        # records skipped by append because they cannot be stored (e.g. infinite voltage)
+        self.invalid = 0
+        # bucket start -> [count, voltage min, max, sum, rssi min, max, sum], built on first use
+        self._rollups = None
+        if not os.path.exists(self.data_file):
+            if legacy_file and os.path.exists(legacy_file):
+                self.import_legacy_text(legacy_file)
+            else:
+                open(self.data_file, "ab").close()  # pylint: disable=consider-using-with
+        self._refresh()
+
+    def _refresh(self):
+        size = os.path.getsize(self.data_file)
+        if size % RECORD.size:
+            logger.warning("[TelemetryStore] truncating incomplete record in %s", self.data_file)
+            with open(self.data_file, "r+b") as data_file_handle:
+                data_file_handle.truncate(size - size % RECORD.size)
+            size -= size % RECORD.size
+        self.count = size // RECORD.size
+        self.last_record = self._read_records(self.count - 1, self.count)[0] if self.count else None
+
+    def import_legacy_text(self, legacy_file):
+        """
+        Imports the text format '<timestamp> -- bVolt: <voltage>, rssi: <rssi>' once and renames
+        the text file to '<name>.imported'. The records are written to a temporary file that
+        replaces the data file only after a complete import, so an interrupted import is
+        repeated on the next start. Lines that cannot be decoded or parsed are skipped.
+        """
+        records = []
+        skipped = 0
+        with open(legacy_file, "r", encoding="utf-8", errors="replace") as legacy_file_handle:
+            for line in legacy_file_handle:
+                try:
+                    data = line.split(" -- ")
+                    epoch = datetime.datetime.fromisoformat(data[0]).timestamp()
+                    values = data[1].split(",")
+                    battery_voltage = float(values[0].split(": ")[1])
+                    rssi = int(values[1].split(": ")[1])
+                except (IndexError, ValueError):
+                    skipped += 1
+                    continue
+                records.append((int(epoch), battery_voltage, rssi))
+        records.sort(key=lambda record: record[0])
+        data_file = self.data_file
+        self.data_file = data_file + ".importing"
+        try:
+            open(self.data_file, "wb").close()  # pylint: disable=consider-using-with
+            written = self.append(records, fsync=True)
+            os.replace(self.data_file, data_file)
+        except BaseException:
+            if os.path.exists(self.data_file):
+                os.remove(self.data_file)
+            raise
+        finally:
+            self.data_file = data_file
+        os.replace(legacy_file, legacy_file + ".imported")
+        logger.info(
+            "[TelemetryStore] imported %s records from %s (%s skipped)",
+            written,
+            legacy_file,
+            skipped + len(records) - written,
+        )
+        return written
+
+    def append(self, records, fsync=False):
+        """
+        Appends (epoch, battery_voltage, rssi) records. Records older than the last stored record
+        and repeated last records are skipped. Records that do not fit the binary record (non
+        finite voltage, epoch out of range) are skipped and counted as invalid. With fsync the
+        data file is forced to disk after writing. Returns the number of written records.
+        """
+        with self._lock:
+            last = self.last_record
+            packed = bytearray()
+            for epoch, battery_voltage, rssi in records:
+                try:
+                    epoch = int(epoch)
+                    rssi = max(-128, min(127, int(rssi)))
+                    if not math.isfinite(battery_voltage):
+                        raise ValueError(f"battery voltage {battery_voltage}")
+                    record = RECORD.unpack(RECORD.pack(epoch, battery_voltage, rssi))
+                except (struct.error, OverflowError, ValueError, TypeError) as e:
+                    self.invalid += 1
+                    logger.warning("[TelemetryStore] skipped invalid record: %s", str(e))
+                    continue
+                if last is not None and (epoch < last[0] or record == last):
+                    continue
+                packed += RECORD.pack(*record)
+                last = record
+            if not packed and not fsync:
+                return 0
+            with open(self.data_file, "ab") as data_file_handle:
+                data_file_handle.write(packed)
+                if fsync:
+                    data_file_handle.flush()
+                    os.fsync(data_file_handle.fileno())
+            if not packed:
+                return 0
+            written = len(packed) // RECORD.size
+            self.count += written
+            self.last_record = last
+            if self._rollups is not None:
+                for record in RECORD.iter_unpack(packed):
+                    self._add_to_rollups(record)
+            return written
+
+    def _read_records(self, start, stop):
+        with open(self.data_file, "rb") as data_file_handle:
+            data_file_handle.seek(start * RECORD.size)
+            return list(RECORD.iter_unpack(data_file_handle.read((stop - start) * RECORD.size)))
+
+    def _bisect(self, data_file_handle, epoch, count, right=False):
+        """
+        Returns the index of the first record with a timestamp >= epoch (> epoch if right).
+        """
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            data_file_handle.seek(middle * RECORD.size)
+            timestamp = RECORD.unpack(data_file_handle.read(RECORD.size))[0]
+            if timestamp < epoch or (right and timestamp == epoch):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def index_range(self, from_ts=None, to_ts=None):
+        """
+        Returns the record index range [start, stop) of the timestamps between from_ts and to_ts
+        (inclusive, epoch seconds, None for open ends).
+        """
+        count = self.count
+        with open(self.data_file, "rb") as data_file_handle:
+            start = 0 if from_ts is None else self._bisect(data_file_handle, from_ts, count)
+            stop = (
+                count if to_ts is None
+                else self._bisect(data_file_handle, to_ts, count, right=True)
+            )
+        return start, max(start, stop)
+
+    def iter_range(self, from_ts=None, to_ts=None):
+        """
+        Yields the (epoch, battery_voltage, rssi) records between from_ts and to_ts in chunks,
+        without loading the whole range into memory.
+        """
+        start, stop = self.index_range(from_ts, to_ts)
+        with open(self.data_file, "rb") as data_file_handle:
+            data_file_handle.seek(start * RECORD.size)
+            while start < stop:
+                chunk = min(READ_CHUNK_RECORDS, stop - start)
+                for epoch, battery_voltage, rssi in RECORD.iter_unpack(
+                    data_file_handle.read(chunk * RECORD.size)
+                ):
+                    yield epoch, round(battery_voltage, 3), rssi
+                start += chunk
+
+    def query(self, from_ts=None, to_ts=None):
+        """
+        Returns the (epoch, battery_voltage, rssi) records between from_ts and to_ts as list.
+        """
+        return list(self.iter_range(from_ts, to_ts))
+
+    def last(self):
+        """
+        Returns the last stored record or None.
+        """
+        if self.last_record is None:
+            return None
+        epoch, battery_voltage, rssi = self.last_record
+        return epoch, round(battery_voltage, 3), rssi
+
+    def _add_to_rollups(self, record):
+        epoch, battery_voltage, rssi = record
+        hour_start = epoch - epoch % 3600
+        hourly = self._rollups["hour"]
+        if hour_start not in hourly:
+            # a new hour, the local day is determined once per hour bucket
+            hourly[hour_start] = [0, battery_voltage, battery_voltage, 0.0, rssi, rssi, 0]
+            self._rollups["hour_day"][hour_start] = _local_day_start(hour_start)
+        day_start = self._rollups["hour_day"][hour_start]
+        daily = self._rollups["day"]
+        if day_start not in daily:
+            daily[day_start] = [0, battery_voltage, battery_voltage, 0.0, rssi, rssi, 0]
+        for bucket in (hourly[hour_start], daily[day_start]):
+            bucket[0] += 1
+            bucket[1] = min(bucket[1], battery_voltage)
+            bucket[2] = max(bucket[2], battery_voltage)
+            bucket[3] += battery_voltage
+            bucket[4] = min(bucket[4], rssi)
+            bucket[5] = max(bucket[5], rssi)
+            bucket[6] += rssi
+
+    def build_rollups(self):
+        """
+        Builds the hourly and daily rollups from the stored records, if not built yet.
+        """
+        with self._lock:
+            if self._rollups is not None:
+                return
+            self._rollups = {"hour": {}, "day": {}, "hour_day": {}}
+            start = time.time()
+            with open(self.data_file, "rb") as data_file_handle:
+                while True:
+                    chunk = data_file_handle.read(READ_CHUNK_RECORDS * RECORD.size)
+                    if not chunk:
+                        break
+                    for record in RECORD.iter_unpack(chunk):
+                        self._add_to_rollups(record)
+            logger.info(
+                "[TelemetryStore] built rollups of %s records in %.2f s",
+                self.count,
+                time.time() - start,
+            )
+
+    def rollups(self, resolution, from_ts=None, to_ts=None):
+        """
+        Returns the 'hour' or 'day' buckets starting between from_ts and to_ts as list of
+        (bucket start, count, voltage min, max, mean, rssi min, max, mean).
+        """
+        if resolution not in ROLLUP_RESOLUTIONS:
+            raise ValueError(f"unknown resolution {resolution}")
+        self.build_rollups()
+        with self._lock:
+            buckets = self._rollups[resolution]
+            starts = list(buckets)
+            first = 0 if from_ts is None else bisect.bisect_left(starts, from_ts)
+            last = len(starts) if to_ts is None else bisect.bisect_right(starts, to_ts)
+            return [
+                (
+                    bucket_start,
+                    buckets[bucket_start][0],
+                    round(buckets[bucket_start][1], 3),
+                    round(buckets[bucket_start][2], 3),
+                    round(buckets[bucket_start][3] / buckets[bucket_start][0], 3),
+                    buckets[bucket_start][4],
+                    buckets[bucket_start][5],
+                    round(buckets[bucket_start][6] / buckets[bucket_start][0], 1),
+                )
+                for bucket_start in starts[first:last]
+            ]
+
+    def count_range(self, from_ts=None, to_ts=None):
+        """
+        Returns the number of records between from_ts and to_ts without reading them.
+        """
+        start, stop = self.index_range(from_ts, to_ts)
+        return stop - start
@@ -5,12 +5,22 @@ It includes functionalities for logging, persisting client data, modifying image
 web pages. The server supports SSL for secure communication.
 """
 # %%
+from cooperative import cooperative_mode_requested, enable_cooperative_mode, run_blocking
+
+# cooperative I/O under gevent: patch sockets, ssl and sleeps before anything else is imported
+if cooperative_mode_requested():
+    enable_cooperative_mode()
+# pylint: disable=wrong-import-order,wrong-import-position
+
 import datetime
 import ssl
 import os
+import math
 import sys
 import time
 import logging
+import tempfile
+import threading
 from datetime import timedelta
 from collections import deque
 import signal
@@ -18,13 +28,22 @@ import socket
 import ipaddress
 from io import BytesIO
 import pytz
-import requests
-import psutil
-from flask import Flask, request, jsonify, render_template_string, send_file
-from PIL import Image, ImageDraw, ImageFont
+from flask import (
+    Flask,
+    request,
+    jsonify,
+    render_template_string,
+    send_file,
+    has_request_context,
+    Response,
+    g,
+)
+from PIL import Image, ImageDraw
 from werkzeug.serving import WSGIRequestHandler
 from gevent.pywsgi import WSGIServer
 from gevent.ssl import SSLContext
+from gevent.event import Event
+from keep_alive import KeepAliveHandler
 
 
 class QuietWSGIServer(WSGIServer):
@@ -32,6 +51,17 @@ class QuietWSGIServer(WSGIServer):
     A WSGI server that suppresses specific SSL handshake errors.
     """
 
+    # persistent connections, so the image request of a wake reuses the /api/display connection
+    handler_class = KeepAliveHandler
+
+    def handle(self, sock, address):
+        """
+        Handle the connection of a client (TLS or plain HTTP).
+        """
+        # send small TLS records and responses without waiting for delayed ACKs (Nagle)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return super().handle(sock, address)
+
     def wrap_socket_and_handle(self, client_socket, address):
         """
         Wrap the socket and handle the request, suppressing specific SSL alerts.
@@ -68,29 +98,74 @@ from cryptography import x509
 from cryptography.x509.oid import NameOID
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives import serialization
-from cryptography.hazmat.primitives.asymmetric import rsa
-from config import ConfigManager
+from cryptography.hazmat.primitives.asymmetric import rsa, ec
+from config import ConfigManager, LOG_LEVELS, SSL_KEY_TYPES
+from render_cache import RenderCache
+from render_resources import RenderResources
+from bmp_encoder import encode_image_1bpp_bmp
+from source_cache import SourceCache
+from prerender import PrerenderScheduler
+from system_metrics import SystemSampler
+from telemetry_store import TelemetryStore, parse_timestamp, format_timestamp, lttb
+from log_files import LogRotator, tail_lines
+from group_commit import GroupCommitWriter
+from log_store import LogStore, DeviceLogStore, parse_device_log, decode_cursor
+from streaming import json_array_chunks, csv_chunks
+from metrics import MetricsRegistry, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from request_timing import start_timer, stop_timer, current_timer, stage
+from access_log import AccessLog, queue_logging
+from event_bus import EventBus, format_event
 
 ###################################################################################################
 SERVER_PORT = 83
 
-LOG_PERSISTANCE_INTERVAL = 20  # Number of entries before persisting to file
+LOG_PERSISTANCE_INTERVAL = 20  # max number of entries the writer commits at once
 LOG_SHOW_LAST_LINES = 20
 
 FOOTER_HEIGHT = 35  # modified BMP gets footer with this size
 BACKGROUND_TYPE = 0  # footer background: white - 1 black - 0
+RENDER_CACHE_MAX_BYTES = 4 * 1024 * 1024  # upper bound for cached footer images
+PRERENDER_LEAD_TIME = 15  # seconds to render the image before the predicted client wake-up
+PRERENDER_MAX_FRAME_AGE = 90  # seconds a prerendered image is used, otherwise render on demand
+SYSTEM_SAMPLE_INTERVAL = 5  # seconds between two samples of the server metrics
+SYSTEM_SAMPLE_WINDOW = 720  # number of kept samples of the server metrics (1 hour)
+BATTERY_LTTB_DEFAULT_POINTS = 500  # points of a LTTB downsampled battery series by default
+BATTERY_LTTB_RAW_LIMIT = 50000  # above this number of samples LTTB runs on hourly rollups
+LOG_ROTATE_MAX_BYTES = 5 * 1024 * 1024  # rotate server.log above this size
+LOG_ROTATE_MAX_AGE = 7 * 24 * 3600  # rotate server.log after this many seconds
+LOG_ROTATE_BACKUPS = 5  # number of kept rotated segments per file
+LOG_ROTATE_COMPRESS = True  # gzip the rotated segments
+WRITER_MAX_DELAY = 1.0  # seconds a queued log/client entry waits at most for its commit
+WRITER_QUEUE_SIZE = 1000  # queued entries before submitting waits for the writer (backpressure)
+WRITER_FSYNC_POLICY = "interval"  # 'always', 'interval' or 'never'
+WAKE_PENDING_MAX = 1000  # device addresses waiting for the image request of their wake
+WRITER_FSYNC_INTERVAL = 5.0  # seconds between two fsyncs of a file with policy 'interval'
+LOG_STORE_RETENTION = 30 * 24 * 3600  # seconds the structured server log keeps its entries
+CONFIG_WATCH_INTERVAL = 2  # seconds between two checks of config.yaml for external changes
+TLS_NUM_TICKETS = 2  # TLS 1.3 session tickets sent per full handshake for resumption
+KEEP_ALIVE_IDLE_TIMEOUT = 5.0  # seconds a persistent connection waits for its next request
+KEEP_ALIVE_MAX_REQUESTS = 100  # requests served on one connection before it is closed
+CLIENT_VOLTAGE_RANGE = (0.0, 10.0)  # accepted Battery-Voltage header values in volts
+CLIENT_RSSI_RANGE = (-128, 127)  # RSSI header values are clamped to this range (int8)
+EVENTS_QUEUE_SIZE = 100  # queued events per dashboard stream, older ones are dropped
+EVENTS_MAX_SUBSCRIBERS = 20  # open /events streams, more are answered with 503
+EVENTS_HEARTBEAT = 15  # seconds without events after which a stream sends a keep-alive
+EVENTS_RETRY = 5000  # milliseconds the browser waits before it reconnects a stream
 
 ###################################################################################################
 ###################################################################################################
-LOGLEVEL = logging.DEBUG
+LOGLEVEL = logging.DEBUG  # until the configured log_level is applied
 logger = logging.getLogger(__name__)
 formatter = logging.Formatter(
     "%(asctime)s %(levelname)s %(message)s", "%Y-%m-%d %H:%M:%S"
 )
 streamhandler = logging.StreamHandler(sys.stdout)
 streamhandler.setFormatter(formatter)
-logger.addHandler(streamhandler)
+# the log lines are written to stdout by a listener thread, not by the request handlers
+log_queue_handler, log_listener = queue_logging(streamhandler)
+logger.addHandler(log_queue_handler)
 logger.setLevel(LOGLEVEL)
+log_listener.start()
 
 
 class SSLFilter(logging.Filter):
@@ -127,6 +202,19 @@ def get_ip_address():
     return ip
 
 
+def server_url(path):
+    """
+    Get the URL of a path on this server with the scheme and port the current request came in
+    on, so a device talking plain HTTP to the LAN listener also loads its images over it.
+    Outside of a request the URL points to the HTTPS listener.
+    """
+    scheme, port = "https", SERVER_PORT
+    if has_request_context():
+        scheme = request.scheme
+        port = request.environ.get("SERVER_PORT") or port
+    return f"{scheme}://{get_ip_address()}:{port}{path}"
+
+
 # get the ip address of the server after startup of script
 server_ip = get_ip_address()
 logger.info("Server will be running on IP: %s and port: %s", server_ip, SERVER_PORT)
@@ -135,34 +223,94 @@ app = Flask(__name__)
 
 
 @app.before_request
-def log_request_info():
+def start_request_timer():
     """
-    Log information about every incoming request.
+    Remember the start of the request for the request metrics and start the stage timer (for
+    the Server-Timing header or the stage breakdown of the slow request log).
     """
-    logger.info(
-        "[Request] %s %s from %s - User-Agent: %s",
-        request.method,
-        request.path,
-        request.remote_addr,
-        request.headers.get("User-Agent", "N/A"),
-    )
+    g.request_start = time.perf_counter()
+    if config_manager.config["request_timing"] or config_manager.config["slow_request_ms"]:
+        start_timer()
 
 
 @app.after_request
-def log_response_info(response):
+def log_access(response):
     """
-    Log information about every outgoing response.
+    Queue one access log line for the request (sampled, errors and slow requests always).
     """
-    logger.info(
-        "[Response] %s %s - Status: %s",
+    elapsed = time.perf_counter() - g.request_start
+    slow_request_ms = config_manager.config["slow_request_ms"]
+    access_log.log(
         request.method,
-        request.path,
+        request.full_path.rstrip("?"),
         response.status_code,
+        elapsed,
+        always=bool(slow_request_ms) and elapsed * 1000 >= slow_request_ms,
+        bytes=response.content_length,
+        remote=request.remote_addr,
+        device=request.headers.get("ID"),
+        ua=request.headers.get("User-Agent"),
     )
     return response
 
 
+@app.after_request
+def add_server_timing(response):
+    """
+    Add the stage durations of the request as Server-Timing header (only with request_timing,
+    the header is sent to every client) and write requests slower than slow_request_ms with
+    their stage breakdown to the slow request log.
+    """
+    timer = current_timer()
+    if timer is None:
+        return response
+    elapsed = timer.elapsed()
+    if config_manager.config["request_timing"]:
+        response.headers["Server-Timing"] = timer.server_timing(elapsed)
+    slow_request_ms = config_manager.config["slow_request_ms"]
+    if slow_request_ms and elapsed * 1000 >= slow_request_ms:
+        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        entry = (
+            f"{request.method} {request.full_path.rstrip('?')} {response.status_code} "
+            f"{elapsed * 1000:.1f}ms from {request.headers.get('ID', request.remote_addr)}"
+            f" -- {timer.breakdown()}"
+        )
+        logger.warning("[Slow request] %s", entry)
+        writer.submit("slow_log", f"{timestamp} -- {entry}\n")
+    return response
+
+
+@app.teardown_request
+def stop_request_timer(_error=None):
+    """
+    Remove the stage timer of the finished request.
+    """
+    stop_timer()
+
+
+@app.after_request
+def observe_request(response):
+    """
+    Record count and duration of the request per route, and the duration of a device wake when
+    the image request follows its /api/display request.
+    """
+    end = time.perf_counter()
+    route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    labels = {"route": route, "method": request.method, "status": response.status_code}
+    metric_requests.inc(**labels)
+    metric_request_seconds.observe(end - g.request_start, **labels)
+    if route == "/api/display":
+        add_pending_wake(request.remote_addr, g.request_start)
+    elif route in WAKE_IMAGE_ROUTES and request.remote_addr in pending_wakes:
+        metric_wake_seconds.observe(end - pending_wakes.pop(request.remote_addr))
+    return response
+
+
 start_time = time.time()
+# server metrics sampled in the background, read by /status and /status/history
+system_sampler = SystemSampler(
+    interval=SYSTEM_SAMPLE_INTERVAL, window=SYSTEM_SAMPLE_WINDOW
+)
 
 base_path = os.path.dirname(os.path.abspath(__file__))
 # get param to set a specific path for log, db, cert
@@ -188,24 +336,44 @@ else:
     current_dir = base_path
 
 config_manager = ConfigManager(current_dir)
+# one line per request, sampled and written to stdout by a listener thread
+access_log = AccessLog(streamhandler)
+access_log.start()
+
+
+def apply_log_settings():
+    """
+    Apply log level and access log sample rate of the configuration, invalid values fall back
+    to INFO and logging every request.
+    """
+    level = str(config_manager.config["log_level"]).upper()
+    if level not in LOG_LEVELS:
+        logger.warning("[Config] invalid log_level '%s', using INFO", level)
+        level = "INFO"
+    logger.setLevel(level)
+    sample_rate = config_manager.config["access_log_sample_rate"]
+    access_log.sample_rate = sample_rate if 0 <= sample_rate <= 1 else 1.0
+
+
+apply_log_settings()
+
+KeepAliveHandler.idle_timeout = KEEP_ALIVE_IDLE_TIMEOUT
+KeepAliveHandler.max_requests = KEEP_ALIVE_MAX_REQUESTS
 
 ## persistance
-# List to store logs
-logs = []
 log_file = os.path.join(current_dir, "logs/server.log")
-db_file = os.path.join(current_dir, "db/clientData.txt")
-db_client_log_file = os.path.join(current_dir, "db/clientLog.txt")
+slow_log_file = os.path.join(current_dir, "logs/slow_requests.log")
+log_store_file = os.path.join(current_dir, "db/serverLog.sqlite3")
+db_file = os.path.join(current_dir, "db/clientData.bin")
+db_legacy_file = os.path.join(current_dir, "db/clientData.txt")
+device_log_file = os.path.join(current_dir, "db/deviceLog.sqlite3")
 
 global_state = {
     ## initialize last shown image
     "image": {
         "bmp_send_switch": True,
-        "current_image_url": (
-            "https://" + get_ip_address() + ":" + str(SERVER_PORT) + "/image/dummy.bmp"
-        ),
-        "current_image_url_adapted": (
-            "https://" + get_ip_address() + ":" + str(SERVER_PORT) + "/image/dummy.bmp"
-        ),
+        "current_image_url": server_url("/image/dummy.bmp"),
+        "current_image_url_adapted": server_url("/image/dummy.bmp"),
         # In-memory object to store the last sent image as a blob
         "current_orig_image": None,
         "current_send_image": BytesIO(),
@@ -214,6 +382,16 @@ global_state = {
     "client": {"battery_voltage": 0, "battery_voltage_max": 0},
 }
 
+# SSL context of the server (set in main) for the session statistics
+tls_state = {"context": None, "key_type": None}
+
+# incremented when the client status changes or new telemetry is committed to the store, used
+# for the ETags of the dashboard endpoints together with the config generation and the latest
+# system sample
+generations = {"client": 0, "telemetry": 0}
+# distinguishes the ETags of a restarted server, whose generations start at 0 again
+ETAG_PREFIX = f"{int(start_time * 1000):x}"
+
 # start client data
 last_client_data = {
     "refresh_rate": 900,
@@ -225,148 +403,368 @@ last_client_data = {
 client_data_db = {"battery_voltage": None, "rssi": None, "timestamp": None}
 # In-memory database to store the last 30 battery voltage and timestamp pairs
 client_data_db = deque(maxlen=30)
-client_log_db = deque(maxlen=30)
+# persisted battery voltage and rssi samples, the former text file is imported once
+telemetry_store = TelemetryStore(db_file, legacy_file=db_legacy_file)
+# encoded footer images, keyed by source image content, footer values and minute timestamp
+render_cache = RenderCache(max_bytes=RENDER_CACHE_MAX_BYTES)
+# fonts and glyph atlas for the footer, loaded once at startup
+render_resources = RenderResources(base_path)
+# source images from URL or local file with pooled HTTP session and conditional requests
+source_cache = SourceCache()
+# size and age based rotation of the text log files
+server_log_rotator = LogRotator(
+    log_file, LOG_ROTATE_MAX_BYTES, LOG_ROTATE_MAX_AGE, LOG_ROTATE_BACKUPS, LOG_ROTATE_COMPRESS
+)
+slow_log_rotator = LogRotator(
+    slow_log_file, LOG_ROTATE_MAX_BYTES, LOG_ROTATE_MAX_AGE, LOG_ROTATE_BACKUPS,
+    LOG_ROTATE_COMPRESS,
+)
+# structured server log with indexes on time, context and device
+log_store = LogStore(log_store_file, retention=LOG_STORE_RETENTION)
+# parsed log entries posted by the devices, deduplicated on retransmission
+device_log_store = DeviceLogStore(device_log_file, retention=LOG_STORE_RETENTION)
+## metrics
+# request, render, image and writer metrics in the Prometheus text format, served by /metrics
+metrics = MetricsRegistry(prefix="trmnl_")
+metric_requests = metrics.counter(
+    "http_requests_total", "HTTP requests by route, method and status.",
+    ("route", "method", "status"),
+)
+metric_request_seconds = metrics.histogram(
+    "http_request_duration_seconds",
+    "Time until the response of a request is returned by the app, by route, method and status.",
+    ("route", "method", "status"),
+)
+metric_wake_seconds = metrics.histogram(
+    "device_wake_duration_seconds",
+    "Time from the start of /api/display to the end of the image request of the same device.",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+metric_render_seconds = metrics.histogram(
+    "footer_render_duration_seconds",
+    "Time of add_footer_to_image, by render cache result (hit or miss).",
+    ("cache",),
+)
+metric_fetch_seconds = metrics.histogram(
+    "image_fetch_duration_seconds", "Time of load_image, by source (url or file).", ("source",)
+)
+metric_fetch_bytes = metrics.counter(
+    "image_fetch_bytes_total", "Bytes of the images returned by load_image, by source.",
+    ("source",),
+)
+metric_commit_seconds = metrics.histogram(
+    "writer_commit_duration_seconds", "Time of one group commit (and fsync) of a sink.", ("sink",)
+)
+metric_commit_entries = metrics.histogram(
+    "writer_commit_entries", "Number of entries written by one group commit of a sink.",
+    ("sink",), buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+)
+# start of the last /api/display request per device address, ended by its image request, the
+# oldest first
+pending_wakes = {}
+WAKE_IMAGE_ROUTES = ("/image/screen.bmp", "/image/screen1.bmp")
 
 
-def get_last_n_lines_from_log(file_path, n):
+def add_pending_wake(address, start):
     """
-    Retrieve the last n lines from the log file and combine them with formatted logs.
+    Stores the start of a wake of the address. Wakes older than the refresh time, which never
+    got their image request, and the oldest above WAKE_PENDING_MAX addresses are dropped.
     """
-    try:
-        with open(file_path, "r", encoding="utf-8") as file:
-            lines = file.readlines()
-            file_logs = lines[-n:] if len(lines) >= n else lines
-    except FileNotFoundError:
-        file_logs = []
+    pending_wakes.pop(address, None)
+    pending_wakes[address] = start
+    oldest_start = start - config_manager.config["refresh_time"]
+    while len(pending_wakes) > 1:
+        oldest = next(iter(pending_wakes))
+        if pending_wakes[oldest] >= oldest_start and len(pending_wakes) <= WAKE_PENDING_MAX:
+            break
+        del pending_wakes[oldest]
 
-    formatted_logs = [
-        f"{log['timestamp']} -- [{log['context']}] -- {log['info']}\n" for log in logs
-    ]
-    combined_logs = file_logs + formatted_logs
-    return combined_logs
 
+def observe_commit(sink, entries, seconds):
+    """
+    Records duration and size of a group commit of the writer thread. A commit of client data
+    increments the telemetry generation, the store and its rollups contain the new points now.
+    """
+    metric_commit_seconds.observe(seconds, sink=sink)
+    if entries:
+        metric_commit_entries.observe(entries, sink=sink)
+        if sink == "client_data":
+            generations["telemetry"] += 1
+
+
+# device contacts, telemetry, log lines and status snapshots pushed to the dashboard (/events)
+event_bus = EventBus(
+    queue_size=EVENTS_QUEUE_SIZE, max_subscribers=EVENTS_MAX_SUBSCRIBERS, event_factory=Event
+)
+
+# request handlers only queue log and client entries, the writer thread commits them in groups
+writer = GroupCommitWriter(
+    max_batch=LOG_PERSISTANCE_INTERVAL,
+    max_delay=WRITER_MAX_DELAY,
+    queue_size=WRITER_QUEUE_SIZE,
+    fsync_policy=WRITER_FSYNC_POLICY,
+    fsync_interval=WRITER_FSYNC_INTERVAL,
+    on_commit=observe_commit,
+)
+writer.register("server_log", server_log_rotator.append)
+writer.register("log_store", log_store.insert)
+writer.register("client_data", telemetry_store.append)
+writer.register("device_log", device_log_store.insert)
+writer.register("slow_log", slow_log_rotator.append)
+writer.start()
+
+metrics.gauge("writer_queue_depth", "Entries queued for the writer thread.",
+              lambda: writer.stats()["queued"])
+metrics.gauge(
+    "writer_entries_total", "Entries of the writer thread by state.",
+    lambda: {(state,): writer.counters[state]
+             for state in ("submitted", "written", "backpressure", "dropped", "errors")},
+    ("state",), kind="counter",
+)
+metrics.gauge(
+    "store_entries", "Entries held in memory or on disk by store.",
+    lambda: {
+        ("render_cache",): render_cache.stats()["entries"],
+        ("source_cache",): source_cache.stats()["entries"],
+        ("system_samples",): len(system_sampler.samples),
+        ("client_data_recent",): len(client_data_db),
+        ("client_data",): telemetry_store.count,
+        ("prerender_devices",): len(prerender_scheduler.next_wakes),
+        ("pending_wakes",): len(pending_wakes),
+    },
+    ("store",),
+)
+metrics.gauge("render_cache_bytes", "Bytes of the encoded images in the render cache.",
+              lambda: render_cache.stats()["bytes"])
+metrics.gauge("event_subscribers", "Open /events streams.",
+              lambda: event_bus.stats()["subscribers"])
+metrics.gauge(
+    "events_total", "Events of the event bus by state.",
+    lambda: {(state,): value for state, value in event_bus.stats().items()
+             if state in ("published", "delivered", "dropped", "rejected")},
+    ("state",), kind="counter",
+)
+metrics.gauge("connections_open", "Open HTTP connections.",
+              lambda: KeepAliveHandler.connection_stats.counters["open"])
+metrics.gauge(
+    "connections_total", "HTTP connections accepted.",
+    lambda: KeepAliveHandler.connection_stats.counters["connections"], kind="counter",
+)
+metrics.gauge(
+    "connection_requests_total", "HTTP requests by connection reuse.",
+    lambda: {
+        ("false",): KeepAliveHandler.connection_stats.counters["requests"]
+        - KeepAliveHandler.connection_stats.counters["reused_requests"],
+        ("true",): KeepAliveHandler.connection_stats.counters["reused_requests"],
+    },
+    ("reused",), kind="counter",
+)
 
-def persist_log():
+
+def conditional_response(etag, build_response):
     """
-    Persist the logs to the log file and clear the in-memory logs.
+    Answers a request whose If-None-Match contains the ETag with 304 Not Modified, otherwise
+    returns the response of build_response(). Both carry the ETag and 'Cache-Control: no-cache',
+    so the browser revalidates its copy with every request.
     """
-    with open(log_file, "a", encoding="utf-8") as log_file_handle:
-        for log in logs:
-            log_file_handle.write(
-                f"{log['timestamp']} -- [{log['context']}] -- {log['info']}\n"
-            )
-    logs.clear()
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = build_response()
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+def get_last_n_lines_from_log(file_path, n):
+    """
+    Retrieve the last n lines from the log file. Entries are committed by the writer thread
+    within WRITER_MAX_DELAY seconds.
+    """
+    return tail_lines(file_path, n)
 
 
 def add_log_entry(log_context, info):
     """
-    Add a log entry to the in-memory logs and persist if the interval is reached.
+    Queue a log entry for the server log file and the structured server log. Inside a request
+    the entry is tagged with the device (ID header or client address).
     """
-    log_entry = {
-        "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "context": log_context,
-        "info": info,
-    }
-    logs.append(log_entry)
-    if len(logs) >= LOG_PERSISTANCE_INTERVAL:
-        persist_log()
+    with stage("log"):
+        now = time.time()
+        timestamp = datetime.datetime.fromtimestamp(now).strftime("%Y-%m-%d %H:%M:%S")
+        writer.submit("server_log", f"{timestamp} -- [{log_context}] -- {info}\n")
+        device = (
+            request.headers.get("ID", request.remote_addr) if has_request_context() else None
+        )
+        writer.submit("log_store", (now, log_context, device, str(info)))
+        event_bus.publish(
+            "log", {"timestamp": timestamp, "context": f"[{log_context}]", "info": str(info)}
+        )
+
+
+def parse_client_values(refresh_rate, battery_voltage, rssi):
+    """
+    Converts the Refresh-Rate, Battery-Voltage and RSSI headers of a device. Returns None if one
+    is missing or invalid or the voltage is not finite or outside CLIENT_VOLTAGE_RANGE, the
+    RSSI is clamped to CLIENT_RSSI_RANGE.
+    """
+    try:
+        refresh_rate, battery_voltage, rssi = int(refresh_rate), float(battery_voltage), int(rssi)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    if not (
+        math.isfinite(battery_voltage)
+        and CLIENT_VOLTAGE_RANGE[0] <= battery_voltage <= CLIENT_VOLTAGE_RANGE[1]
+    ):
+        return None
+    return refresh_rate, battery_voltage, max(CLIENT_RSSI_RANGE[0], min(CLIENT_RSSI_RANGE[1], rssi))
 
 
 def add_client_data_entry(battery_voltage, rssi):
     """
-    Add a client data entry to the in-memory database and persist if the interval is reached.
+    Add a client data entry to the in-memory database and queue it for the telemetry store.
+    Values that cannot be stored are rejected (see parse_client_values).
     """
+    if parse_client_values(0, battery_voltage, rssi) is None:
+        logger.warning("[Client] rejected client data: %s V, %s dBm", battery_voltage, rssi)
+        return
+    rssi = max(CLIENT_RSSI_RANGE[0], min(CLIENT_RSSI_RANGE[1], int(rssi)))
     # get the last entry from the client_data_db and compare battery_voltage new and old values
-    if client_data_db:
-        last_entry = client_data_db[-1]
-        if last_entry["battery_voltage"] != battery_voltage:
-            entry = {
-                "battery_voltage": battery_voltage,
-                "rssi": rssi,
-                "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            }
-            client_data_db.append(entry)
-    else:
-        entry = {
-            "battery_voltage": battery_voltage,
-            "rssi": rssi,
-            "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        }
-        client_data_db.append(entry)
-    if len(client_data_db) >= LOG_PERSISTANCE_INTERVAL:
-        persist_client_data()
+    if client_data_db and client_data_db[-1]["battery_voltage"] == battery_voltage:
+        return
+    entry = {
+        "battery_voltage": battery_voltage,
+        "rssi": rssi,
+        "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    client_data_db.append(entry)
+    writer.submit("client_data", (parse_timestamp(entry["timestamp"]), battery_voltage, rssi))
+    event_bus.publish("telemetry", entry)
 
 
-def persist_client_data():
+def add_client_log_entries(device, logs_array):
     """
-    Persist the client data to the database file and clear the in-memory database,
-    keeping only the last entry.
+    Parse the log entries posted by a device and queue them as one batch for the device log.
+    Returns the number of valid entries.
     """
-    with open(db_file, "a", encoding="utf-8") as db_file_handle:
-        for entry in client_data_db:
-            db_file_handle.write(
-                f"{entry['timestamp']} -- bVolt: {entry['battery_voltage']}, "
-                f"rssi: {entry['rssi']}\n"
-            )
-    if len(client_data_db) > 1:
-        last_entry = client_data_db.pop()
-        client_data_db.clear()
-        client_data_db.append(last_entry)
+    received = time.time()
+    rows = [parse_device_log(log_entry, device, received) for log_entry in logs_array]
+    rows = [row for row in rows if row is not None]
+    if rows:
+        writer.submit("device_log", rows)
+    return len(rows)
 
 
-def add_client_log_entry(log_entry):
+def iter_client_data(from_ts=None, to_ts=None):
     """
-    Add a log entry to the client log database and persist if the interval is reached.
+    Yield client data between from_ts and to_ts (epoch seconds, None for open ends) from the
+    telemetry store followed by the in-memory data that is not persisted yet.
     """
-    # Append the new entry to the client_log_db
-    client_log_db.append(log_entry)
-    if len(client_log_db) >= LOG_PERSISTANCE_INTERVAL:
-        persist_client_log_data()
+    last_stored = telemetry_store.last()
+    for epoch, battery_voltage, rssi in telemetry_store.iter_range(from_ts, to_ts):
+        yield {
+            "battery_voltage": battery_voltage,
+            "rssi": rssi,
+            "timestamp": format_timestamp(epoch),
+        }
+    for entry in list(client_data_db):
+        epoch = parse_timestamp(entry["timestamp"])
+        if last_stored is not None and epoch <= last_stored[0]:
+            continue
+        if (from_ts is None or epoch >= from_ts) and (to_ts is None or epoch <= to_ts):
+            yield entry
 
 
-def persist_client_log_data():
+def reading_client_data(from_ts=None, to_ts=None):
+    """
+    Read client data between from_ts and to_ts (epoch seconds, None for open ends) from the
+    telemetry store and combine it with the in-memory data that is not persisted yet.
     """
-    Appends the entries from the client_log_db to the specified log file and retains only the
-    last entry in the client_log_db.
+    return list(iter_client_data(from_ts, to_ts))
 
-    This function opens the log file in append mode and writes each entry from the client_log_db
-    to the file. After writing, if there is more than one entry in the client_log_db, it retains
-    only the last entry and clears the rest.
+
+def reading_client_data_rollups(resolution, from_ts=None, to_ts=None):
+    """
+    Read the hourly or daily rollups of the client data between from_ts and to_ts. Every bucket
+    contains the mean battery voltage and rssi, their minimum and maximum and the sample count.
     """
-    with open(db_client_log_file, "a", encoding="utf-8") as log_file_handle:
-        for entry in client_log_db:
-            log_file_handle.write(f"{entry}\n")
-    if len(client_log_db) > 1:
-        last_entry = client_log_db.pop()
-        client_log_db.clear()
-        client_log_db.append(last_entry)
+    return [
+        {
+            "timestamp": format_timestamp(bucket_start),
+            "battery_voltage": voltage_mean,
+            "battery_voltage_min": voltage_min,
+            "battery_voltage_max": voltage_max,
+            "rssi": rssi_mean,
+            "rssi_min": rssi_min,
+            "rssi_max": rssi_max,
+            "count": count,
+        }
+        for (
+            bucket_start,
+            count,
+            voltage_min,
+            voltage_max,
+            voltage_mean,
+            rssi_min,
+            rssi_max,
+            rssi_mean,
+        ) in telemetry_store.rollups(resolution, from_ts, to_ts)
+    ]
 
 
-def reading_client_data():
+def reading_client_data_lttb(max_points, from_ts=None, to_ts=None):
     """
-    Read client data from the file and combine it with in-memory data.
+    Read the client data between from_ts and to_ts downsampled with LTTB to max_points, based
+    on the battery voltage. Very long ranges are downsampled from the hourly means.
     """
-    client_data_db_read = []
-    if os.path.exists(db_file):
-        with open(db_file, "r", encoding="utf-8") as db_file_handle:
-            lines = db_file_handle.readlines()
-            for line in lines:
-                data = line.split(" -- ")
-                battery_voltage = float(data[1].split(",")[0].split(": ")[1])
-                rssi = int(data[1].split(",")[1].split(": ")[1])
-                timestamp = data[0]
-                entry = {
+    if telemetry_store.count_range(from_ts, to_ts) > BATTERY_LTTB_RAW_LIMIT:
+        series = [
+            (parse_timestamp(entry["timestamp"]), entry)
+            for entry in reading_client_data_rollups("hour", from_ts, to_ts)
+        ]
+    else:
+        series = [
+            (
+                epoch,
+                {
+                    "timestamp": format_timestamp(epoch),
                     "battery_voltage": battery_voltage,
                     "rssi": rssi,
-                    "timestamp": timestamp,
-                }
-                client_data_db_read.append(entry)
-    # combine client_data_db and client_data_db_read only if more than 1 entry in client_data_db
-    if len(client_data_db) > 1:
-        client_data_db_read.extend(client_data_db)
-    # sort data in client_data_db by timestamp
-    client_data_db_read = sorted(client_data_db_read, key=lambda x: x["timestamp"])
-    return client_data_db_read
+                },
+            )
+            for epoch, battery_voltage, rssi in telemetry_store.iter_range(from_ts, to_ts)
+        ]
+    return [
+        entry
+        for _, entry in lttb(series, max_points, value=lambda point: point[1]["battery_voltage"])
+    ]
+
+
+def downsample_client_data(from_ts, to_ts, resolution, max_points):
+    """
+    Read the client data between from_ts and to_ts in the requested resolution ('raw', 'hour',
+    'day' or 'lttb'). With max_points the response is limited to this number of points: raw
+    data switches to the finest rollup that fits, rollups are reduced further with LTTB.
+    Raw data is returned as generator, so long ranges are never held in memory at once.
+    """
+    if resolution == "lttb":
+        return reading_client_data_lttb(max_points or BATTERY_LTTB_DEFAULT_POINTS, from_ts, to_ts)
+    if resolution == "raw":
+        if max_points is None or telemetry_store.count_range(from_ts, to_ts) <= max_points:
+            return iter_client_data(from_ts, to_ts)
+        resolution = "hour"
+    buckets = reading_client_data_rollups(resolution, from_ts, to_ts)
+    if max_points is not None and len(buckets) > max_points and resolution == "hour":
+        buckets = reading_client_data_rollups("day", from_ts, to_ts)
+    if max_points is not None and len(buckets) > max_points:
+        series = [(parse_timestamp(entry["timestamp"]), entry) for entry in buckets]
+        buckets = [
+            entry
+            for _, entry in lttb(
+                series, max_points, value=lambda point: point[1]["battery_voltage"]
+            )
+        ]
+    return buckets
 
 
 ###################################################################################################
@@ -392,9 +790,30 @@ def get_battery_icon(battery):
 def add_footer_to_image(src_image, wifi_percentage, battery_percentage):
     """
     Adds a footer to an image with WiFi and battery percentages, and the current date and time.
+    Rendered images are memoized in the render cache, so repeated calls within the same minute
+    and with the same values return the already encoded image.
     """
+    render_start = time.perf_counter()
+    # Get the current time in the configured time zone
+    time_zone = pytz.timezone(config_manager.config["time_zone"])
+    date_time = datetime.datetime.now(time_zone).strftime("%d.%m.%Y %H:%M")
+
+    src_bytes = src_image.getvalue()
+    cache_key = render_cache.make_key(
+        src_bytes,
+        round(wifi_percentage),
+        round(battery_percentage),
+        get_battery_icon(battery_percentage),
+        date_time,
+    )
+    cached_image = render_cache.get(cache_key)
+    if cached_image is not None:
+        logger.debug("[image modification] using cached footer image")
+        metric_render_seconds.observe(time.perf_counter() - render_start, cache="hit")
+        return BytesIO(cached_image)
+
     # Load the source image
-    img = Image.open(BytesIO(src_image.getvalue()))
+    img = Image.open(BytesIO(src_bytes))
     # Resize the source image to make space for the footer
     img = img.crop((0, 0, img.width, img.height - FOOTER_HEIGHT))
     # Create a new image with extra space for the footer
@@ -406,45 +825,6 @@ def add_footer_to_image(src_image, wifi_percentage, battery_percentage):
     # Initialize ImageDraw
     d = ImageDraw.Draw(new_img)
     logger.debug("[image modification] adding footer to image")
-    # Load fonts
-    # Load icon font (FontAwesome)
-    icon_font_path = os.path.join(base_path, "web", "fontawesome-webfont.ttf")
-    icon_font = None
-    try:
-        icon_font = ImageFont.truetype(icon_font_path, 24)
-        logger.debug("[image modification] loaded FontAwesome from %s", icon_font_path)
-    except Exception as e:
-        logger.warning("[image modification] could not load FontAwesome: %s", str(e))
-        icon_font = ImageFont.load_default()
-
-    # Load text font - try multiple options for cross-platform support
-    text_font = None
-    font_candidates = [
-        "arialbd.ttf",  # Windows
-        "arial.ttf",  # Windows
-        "/usr/share/fonts/ttf-dejavu/DejaVuSans-Bold.ttf",  # Alpine Linux
-        "/usr/share/fonts/ttf-dejavu/DejaVuSans.ttf",  # Alpine Linux
-        "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",  # Debian/Ubuntu
-        "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",  # Debian/Ubuntu
-    ]
-
-    for font_path in font_candidates:
-        try:
-            text_font = ImageFont.truetype(font_path, 14)
-            logger.debug("[image modification] loaded text font: %s", font_path)
-            break
-        except:
-            continue
-
-    if text_font is None:
-        logger.warning("[image modification] no system fonts available, using default")
-        text_font = ImageFont.load_default()
-
-    fonts = {
-        "icon_font": icon_font,
-        "text_font": text_font,
-    }
-
     # Define positions
     positions = {
         "text_line_height": 7,
@@ -484,59 +864,60 @@ def add_footer_to_image(src_image, wifi_percentage, battery_percentage):
         # )
 
     # Draw WiFi icon \uf1eb and percentage
-    d.text(
+    render_resources.draw_text(
+        d,
         positions["wifi_icon_position"],
         "\uf1eb",
+        "icon_font",
         fill=BACKGROUND_TYPE * -1,
-        font=fonts["icon_font"],
     )
-    d.text(
+    render_resources.draw_text(
+        d,
         positions["wifi_text_position"],
         f"{round(wifi_percentage)} %",
+        "text_font",
         fill=BACKGROUND_TYPE * -1,
-        font=fonts["text_font"],
     )
 
     # Draw battery icon and percentage
     if battery_percentage == 255:
-        d.text(
+        render_resources.draw_text(
+            d,
             positions["battery_icon_position"],
             "\uf244",
+            "icon_font",
             fill=BACKGROUND_TYPE * -1,
-            font=fonts["icon_font"],
         )
-        d.text(
+        render_resources.draw_text(
+            d,
             (
                 positions["battery_icon_position"][0] + 10,
                 positions["battery_icon_position"][1],
             ),
             "\uf0e7",
+            "icon_font",
             fill=BACKGROUND_TYPE * -1,
-            font=fonts["icon_font"],
         )
     else:
-        d.text(
+        render_resources.draw_text(
+            d,
             positions["battery_icon_position"],
             get_battery_icon(battery_percentage),
+            "icon_font",
             fill=BACKGROUND_TYPE * -1,
-            font=fonts["icon_font"],
         )
-        d.text(
+        render_resources.draw_text(
+            d,
             positions["battery_text_position"],
             f"{round(battery_percentage)} %",
+            "text_font",
             fill=BACKGROUND_TYPE * -1,
-            font=fonts["text_font"],
         )
 
-    # Get the current time in the configured time zone
-    time_zone = pytz.timezone(config_manager.config["time_zone"])
-    date_time = datetime.datetime.now(time_zone).strftime("%d.%m.%Y %H:%M")
-
     # Calculate text width for right alignment
     try:
-        bbox = d.textbbox((0, 0), date_time, font=fonts["text_font"])
-        text_width = bbox[2] - bbox[0]
-    except:
+        text_width = render_resources.text_width(d, date_time, "text_font")
+    except AttributeError:
         # Fallback for older PIL versions
         text_width = len(date_time) * 8  # Rough estimate
 
@@ -557,24 +938,20 @@ def add_footer_to_image(src_image, wifi_percentage, battery_percentage):
             radius=5,
         )
 
-    d.text(
+    render_resources.draw_text(
+        d,
         (date_time_x, date_time_y),
         date_time,
+        "text_font",
         fill=BACKGROUND_TYPE * -1,
-        font=fonts["text_font"],
     )
 
-    # Save the new image to a BytesIO object
-    img_io = BytesIO()
-    new_img.save(img_io, format="BMP")
-    img_io.seek(0)
-
-    # Manually adjust the BMP header
-    img_io.seek(54)
-    img_io.write(bytes([0, 0, 0, 0, 255, 255, 255, 0]))
-    img_io.seek(0)
-
-    return img_io
+    # Encode the new image as 1-bit BMP (black/white palette)
+    with stage("encode"):
+        encoded_image = encode_image_1bpp_bmp(new_img)
+    render_cache.put(cache_key, encoded_image)
+    metric_render_seconds.observe(time.perf_counter() - render_start, cache="miss")
+    return BytesIO(encoded_image)
 
 
 def get_and_modify_image(image_blob):
@@ -585,7 +962,8 @@ def get_and_modify_image(image_blob):
     # Example usage
     wifi_percentage = get_wifi_signal_strength(last_client_data["rssi"])
     battery_percentage = get_battery_state(last_client_data["battery_voltage"])
-    return add_footer_to_image(image_blob, wifi_percentage, battery_percentage)
+    with stage("footer"):
+        return add_footer_to_image(image_blob, wifi_percentage, battery_percentage)
 
 
 def get_no_image():
@@ -602,11 +980,7 @@ def get_no_image():
     # Initialize ImageDraw
     d = ImageDraw.Draw(img)
 
-    # Load font
-    try:
-        text_font = ImageFont.truetype("DejaVuSans.ttf", 24)
-    except IOError:
-        text_font = ImageFont.load_default()
+    text_font = render_resources.fonts["no_image_font"]
 
     # Define text position and content
     text = "No image available"
@@ -619,11 +993,8 @@ def get_no_image():
     # Draw text on the image
     d.text(text_position, text, fill=0, font=text_font)  # fill=0 for black
 
-    # Save the image to a BytesIO object
-    img_io = BytesIO()
-    img.save(img_io, format="BMP")
-    img_io.seek(0)
-    return img_io
+    # Encode the image as 1-bit BMP
+    return BytesIO(encode_image_1bpp_bmp(img))
 
 
 # calculate battery state
@@ -668,13 +1039,83 @@ def get_wifi_signal_strength(rssi):
 def load_image(image_path):
     """
     Load an image from a local file path or a URL.
+    URLs are revalidated with conditional requests and local files are only read again after
+    a change, unchanged images are served from the source cache.
     """
-    if image_path.startswith("http://") or image_path.startswith("https://"):
-        response = requests.get(image_path, timeout=10)
-        response.raise_for_status()  # Raise an exception for HTTP errors
-        return BytesIO(response.content)
-    with open(image_path, "rb") as image_file:
-        return BytesIO(image_file.read())
+    source = "url" if source_cache.is_url(image_path) else "file"
+    with stage("load_image"), metric_fetch_seconds.time(source=source):
+        image_bytes = source_cache.load(image_path)
+    metric_fetch_bytes.inc(len(image_bytes), source=source)
+    return BytesIO(image_bytes)
+
+
+def load_display_source():
+    """
+    Loads the configured source image, the dummy image if it does not exist. Returns a BytesIO.
+    """
+    try:
+        return load_image(config_manager.config["image_path"])
+    except FileNotFoundError:
+        dummy_path = os.path.join(current_dir, "web/dummy.bmp")
+        with open(dummy_path, "rb") as image_file:
+            return BytesIO(image_file.read())
+
+
+def compose_display_frame(orig_image):
+    """
+    Renders the image sent to the client from the source image, with the footer of the values
+    of the current client contact. Returns the original and the image to send as a tuple of
+    BytesIO objects. In cooperative mode the rendering runs in the blocking thread pool.
+    """
+    if config_manager.config["image_modification"]:
+        return orig_image, run_blocking(get_and_modify_image, orig_image)
+    return orig_image, orig_image
+
+
+def render_display_frame():
+    """
+    Loads the configured source image and renders the image sent to the client.
+    """
+    return compose_display_frame(load_display_source())
+
+
+def get_frame_config_key():
+    """
+    Returns the configuration values a prerendered source image depends on.
+    """
+    return (config_manager.config["image_path"],)
+
+
+def on_config_change(changed_keys):
+    """
+    Invalidates the render and source caches if a setting changed that the images depend on
+    and applies changed log settings.
+    """
+    image_keys = {
+        "image_path",
+        "image_modification",
+        "time_zone",
+        "battery_max_voltage",
+        "battery_min_voltage",
+    }
+    if image_keys.intersection(changed_keys):
+        render_cache.clear()
+        source_cache.clear()
+        logger.info("[Config] image settings changed, render and source caches cleared")
+    if {"log_level", "access_log_sample_rate"}.intersection(changed_keys):
+        apply_log_settings()
+
+
+config_manager.add_listener(on_config_change)
+
+# loads the source image shortly before the predicted next wake-up of the client, the footer
+# with the values of the wake is added on contact
+prerender_scheduler = PrerenderScheduler(
+    load_display_source,
+    get_frame_config_key,
+    lead_time=PRERENDER_LEAD_TIME,
+    max_frame_age=PRERENDER_MAX_FRAME_AGE,
+)
 
 
 ###################################################################################################
@@ -814,7 +1255,7 @@ def api_setup():
             "status": 200,
             "api_key": api_key,
             "friendly_id": friendly_id,
-            "image_url": (f"https://{get_ip_address()}:{SERVER_PORT}/image/dummy.bmp"),
+            "image_url": server_url("/image/dummy.bmp"),
             "message": f"Device {friendly_id} registered successfully",
         }
 
@@ -847,12 +1288,18 @@ def display():
     headers = request.headers
     # print(headers)
 
-    # Log the request with timestamp and context
-    add_log_entry(
-        "Request received at /api/display",
-        f"Headers: {dict(headers)},URL: {request.url}",
-    )
-    logger.info("[API] /api/display - URL: %s", request.url)
+    # Log the request with timestamp and context, the full headers only for debugging
+    if logger.isEnabledFor(logging.DEBUG):
+        add_log_entry(
+            "Request received at /api/display",
+            f"Headers: {dict(headers)},URL: {request.url}",
+        )
+    else:
+        add_log_entry(
+            "Request received at /api/display",
+            f"ID: {headers.get('ID')}, Battery-Voltage: {headers.get('Battery-Voltage')}, "
+            f"RSSI: {headers.get('RSSI')}, Refresh-Rate: {headers.get('Refresh-Rate')}",
+        )
 
     # Example of accessing specific headers
     # client_id = headers.get('ID')
@@ -863,44 +1310,34 @@ def display():
     rssi = headers.get("RSSI")
 
     if refresh_rate is not None or battery_voltage is not None or rssi is not None:
-        # store the values for refresh_rate, battery_voltage, rssi in last_client_data
-        last_client_data["refresh_rate"] = int(refresh_rate)
-        last_client_data["battery_voltage"] = float(battery_voltage)
-        last_client_data["rssi"] = int(rssi)
-        last_client_data["last_contact"] = time.time()
+        client_values = parse_client_values(refresh_rate, battery_voltage, rssi)
+        if client_values is None:
+            add_log_entry(
+                "Invalid client data at /api/display",
+                f"Battery-Voltage: {battery_voltage}, RSSI: {rssi}, Refresh-Rate: {refresh_rate}",
+            )
+        else:
+            # store the values for refresh_rate, battery_voltage, rssi in last_client_data
+            (
+                last_client_data["refresh_rate"],
+                last_client_data["battery_voltage"],
+                last_client_data["rssi"],
+            ) = client_values
+            last_client_data["last_contact"] = time.time()
 
-        add_client_data_entry(float(battery_voltage), int(rssi))
+            add_client_data_entry(client_values[1], client_values[2])
 
     # Respond with a JSON containing status and url
     # Determine the image URL based on the current request count
     if global_state["image"]["bmp_send_switch"]:
-        global_state["image"]["current_image_url"] = (
-            "https://"
-            + get_ip_address()
-            + ":"
-            + str(SERVER_PORT)
-            + "/image/original.bmp"
-        )
-        global_state["image"]["current_image_url_adapted"] = (
-            "https://" + get_ip_address() + ":" + str(SERVER_PORT) + "/image/screen.bmp"
-        )
+        global_state["image"]["current_image_url"] = server_url("/image/original.bmp")
+        global_state["image"]["current_image_url_adapted"] = server_url("/image/screen.bmp")
         global_state["image"]["bmp_send_switch"] = False
     else:
-        global_state["image"]["current_image_url"] = (
-            "https://"
-            + get_ip_address()
-            + ":"
-            + str(SERVER_PORT)
-            + "/image/original1.bmp"
-        )
-        global_state["image"]["current_image_url_adapted"] = (
-            "https://"
-            + get_ip_address()
-            + ":"
-            + str(SERVER_PORT)
-            + "/image/screen1.bmp"
-        )
+        global_state["image"]["current_image_url"] = server_url("/image/original1.bmp")
+        global_state["image"]["current_image_url_adapted"] = server_url("/image/screen1.bmp")
         global_state["image"]["bmp_send_switch"] = True
+    generations["client"] += 1
 
     response = {
         "status": 0,
@@ -908,33 +1345,35 @@ def display():
         "filename": datetime.datetime.now().strftime("%Y-%m-%dT%H:%M:%S"),
         "update_firmware": False,
         "maximum_compatibility": True,
-        "firmware_url": "https://" + server_ip + ":" + str(SERVER_PORT) + "/fw/update",
+        "firmware_url": server_url("/fw/update"),
         "refresh_rate": config_manager.config["refresh_time"],
         "reset_firmware": False,
         "special_function": "",
         "action": "",
     }
-    # generate the footer image as a in memory image as time of requested at client if configured
-    try:
-        global_state["image"]["current_orig_image"] = load_image(
-            config_manager.config["image_path"]
-        )
-    except FileNotFoundError:
-        dummy_path = os.path.join(current_dir, "web/dummy.bmp")
-        with open(dummy_path, "rb") as image_file:
-            global_state["image"]["current_orig_image"] = BytesIO(image_file.read())
-
-    if config_manager.config["image_modification"]:
-        global_state["image"]["current_send_image"] = get_and_modify_image(
-            global_state["image"]["current_orig_image"]
-        )
-    else:
-        global_state["image"]["current_send_image"] = global_state["image"][
-            "current_orig_image"
-        ]
+    # use the source image loaded ahead of this wake-up, otherwise load it now, and generate
+    # the footer image as a in memory image as time of requested at client if configured
+    device_id = headers.get("ID", request.remote_addr)
+    source_image = prerender_scheduler.take_frame(device_id)
+    with stage("render"):
+        if source_image is None:
+            frame = render_display_frame()
+        else:
+            frame = compose_display_frame(source_image)
+    (
+        global_state["image"]["current_orig_image"],
+        global_state["image"]["current_send_image"],
+    ) = frame
+    prerender_scheduler.schedule(
+        device_id, time.time(), config_manager.config["refresh_time"]
+    )
 
-    add_log_entry("send json /api/display", f"response: {response}")
-    return jsonify(response)
+    if event_bus.has_subscribers():
+        event_bus.publish("contact", status_snapshot()["client"])
+    if logger.isEnabledFor(logging.DEBUG):
+        add_log_entry("send json /api/display", f"response: {response}")
+    with stage("json"):
+        return jsonify(response)
 
 
 @app.route("/api/log", methods=["POST"])
@@ -942,21 +1381,17 @@ def api_log():
     """
     Handles the /api/log endpoint to log client data.
 
-    This function processes a JSON request containing log entries,
-    adds each log entry to the client log, and prints it. Additionally,
-    it logs the request with a timestamp and context.
+    This function processes a JSON request containing log entries and queues them as one batch
+    for the device log. Additionally, it logs the request with a timestamp and context.
     """
-    content = request.json
-    log_data = content.get("log")
-    if log_data:
-        logs_array = log_data.get("logs_array")
-        if logs_array:
-            for log_entry in logs_array:
-                add_client_log_entry(log_entry)
-                print(log_entry)
+    content = request.get_json(silent=True) or {}
+    log_data = content.get("log") if isinstance(content, dict) else None
+    logs_array = log_data.get("logs_array") if isinstance(log_data, dict) else None
+    device = request.headers.get("ID", request.remote_addr)
+    received = add_client_log_entries(device, logs_array) if isinstance(logs_array, list) else 0
 
     # Log the request with timestamp and context
-    add_log_entry("Request received at /api/log", f"Content: {content}")
+    add_log_entry("Request received at /api/log", f"{received} log entries from {device}")
     return jsonify({"status": "logged"}), 200
 
 
@@ -968,14 +1403,48 @@ def get_settings():
     This function returns a JSON response containing the current configuration
     settings, including the path to the BMP file, the refresh rate, and the
     image manipulation settings.
+
+    The ETag is the config generation, unchanged settings are answered with 304 Not Modified.
     """
     # get the current path to BMP file
-    return jsonify(
-        {
-            "config_image_path": config_manager.config["image_path"],
-            "config_refresh_time": config_manager.config["refresh_time"],
-            "config_manipulate_image": config_manager.config["image_modification"],
-        }
+    return conditional_response(
+        f"{ETAG_PREFIX}-{config_manager.generation}",
+        lambda: jsonify(
+            {
+                "config_image_path": config_manager.config["image_path"],
+                "config_refresh_time": config_manager.config["refresh_time"],
+                "config_manipulate_image": config_manager.config["image_modification"],
+            }
+        ),
+    )
+
+
+@app.route("/settings", methods=["POST"])
+def update_settings():
+    """
+    Update several settings with one write of the configuration.
+
+    The JSON payload maps setting names of config.yaml ('image_path', 'image_modification',
+    'refresh_time', 'battery_max_voltage', 'battery_min_voltage', 'time_zone', 'log_level',
+    'access_log_sample_rate', ...) to their new values. Either all settings are applied or, if
+    one of them is invalid (checked by the config manager), none.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not data:
+        return jsonify({"status": "error", "message": "Invalid settings"}), 400
+    try:
+        changed = config_manager.update(data)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    return (
+        jsonify(
+            {
+                "status": "success",
+                "changed": changed,
+                "settings": {key: config_manager.config[key] for key in data},
+            }
+        ),
+        200,
     )
 
 
@@ -992,7 +1461,10 @@ def update_refresh_time():
     new_refresh_time = data.get("refresh_rate")
 
     if new_refresh_time is not None:
-        config_manager.set_refresh_time(new_refresh_time)
+        try:
+            config_manager.set_refresh_time(new_refresh_time)
+        except ValueError:
+            return jsonify({"status": "error", "message": "Invalid refresh rate"}), 400
         return (
             jsonify(
                 {
@@ -1020,7 +1492,10 @@ def update_image_modification():
     image_modification = data.get("image_modification")
 
     if image_modification is not None:
-        config_manager.set_image_modification(image_modification)
+        try:
+            config_manager.set_image_modification(image_modification)
+        except ValueError:
+            return jsonify({"status": "error", "message": "Invalid new_image_path"}), 400
         return (
             jsonify(
                 {
@@ -1047,7 +1522,10 @@ def update_image_path():
     new_image_path = data.get("bmp_path")
 
     if new_image_path is not None:
-        config_manager.set_image_path(new_image_path)
+        try:
+            config_manager.set_image_path(new_image_path)
+        except ValueError:
+            return jsonify({"status": "error", "message": "Invalid new_image_path"}), 400
         return (
             jsonify(
                 {
@@ -1068,7 +1546,35 @@ def log_view():
     This function reads the last 30 lines from the specified log file,
     formats them as plain text, and returns the formatted logs along
     with an HTTP status code and content type.
-    """
+
+    With one of the query parameters 'since', 'until' (date, local time or ISO 8601 timestamp),
+    'context' (prefix), 'device', 'limit' or 'cursor' the structured server log is queried
+    instead and the matching entries are returned as JSON, newest first, with the cursor of the
+    next page. An invalid cursor is answered with 400.
+    """
+    query_params = ("since", "until", "context", "device", "limit", "cursor")
+    if any(param in request.args for param in query_params):
+        since = parse_timestamp(request.args.get("since"))
+        until = parse_timestamp(request.args.get("until"))
+        limit = request.args.get("limit", default=100, type=int)
+        invalid_time = any(
+            param in request.args and value is None
+            for param, value in (("since", since), ("until", until))
+        )
+        cursor = request.args.get("cursor")
+        if invalid_time or limit is None or limit < 1 or (cursor and decode_cursor(cursor) is None):
+            return jsonify({"status": "error", "message": "Invalid since/until/limit/cursor"}), 400
+        entries, next_cursor = log_store.query(
+            since=since,
+            until=until,
+            context=request.args.get("context"),
+            device=request.args.get("device"),
+            limit=limit,
+            cursor=cursor,
+        )
+        for entry in entries:
+            entry["timestamp"] = format_timestamp(entry["ts"])
+        return jsonify({"entries": entries, "next_cursor": next_cursor}), 200
     # Get the last 30 lines from the log file
     last_30_lines = get_last_n_lines_from_log(log_file, LOG_SHOW_LAST_LINES)
     # Format logs as plain text
@@ -1076,6 +1582,68 @@ def log_view():
     return formatted_logs, 200, {"Content-Type": "text/plain"}
 
 
+@app.route("/server/devicelog", methods=["GET"])
+def device_log_view():
+    """
+    Returns the log entries posted by the devices, newest first, with the cursor of the next
+    page. Optional query parameters: 'device', 'since' and 'until' (date, local time or
+    ISO 8601 timestamp of the entry creation), 'limit' and 'cursor'.
+    """
+    since = parse_timestamp(request.args.get("since"))
+    until = parse_timestamp(request.args.get("until"))
+    limit = request.args.get("limit", default=100, type=int)
+    invalid_time = any(
+        param in request.args and value is None
+        for param, value in (("since", since), ("until", until))
+    )
+    cursor = request.args.get("cursor")
+    if invalid_time or limit is None or limit < 1 or (cursor and decode_cursor(cursor) is None):
+        return jsonify({"status": "error", "message": "Invalid since/until/limit/cursor"}), 400
+    entries, next_cursor = device_log_store.query(
+        since=since,
+        until=until,
+        device=request.args.get("device"),
+        limit=limit,
+        cursor=cursor,
+    )
+    for entry in entries:
+        entry["timestamp"] = format_timestamp(entry["created"])
+    return (
+        jsonify(
+            {
+                "entries": entries,
+                "next_cursor": next_cursor,
+                "stats": device_log_store.stats(),
+            }
+        ),
+        200,
+    )
+
+
+def parse_battery_query():
+    """
+    Parse the query parameters of the battery endpoints. Returns (from_ts, to_ts, resolution,
+    max_points), from_ts is False for an invalid range and resolution None if resolution or
+    max_points are invalid.
+    """
+    from_ts, to_ts = None, None
+    if request.args.get("from") is not None and request.args.get("to") is not None:
+        from_ts = parse_timestamp(request.args.get("from"))
+        to_ts = parse_timestamp(request.args.get("to"))
+        if from_ts is None or to_ts is None:
+            return False, None, "raw", None
+    if request.args.get("all") is None and from_ts is None:
+        today = datetime.datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        from_ts = time.mktime(today.timetuple())
+    resolution = request.args.get("resolution", "raw")
+    max_points = request.args.get("max_points", type=int)
+    if resolution not in ("raw", "hour", "day", "lttb") or (
+        max_points is not None and max_points < 3
+    ):
+        resolution = None
+    return from_ts, to_ts, resolution, max_points
+
+
 @app.route("/server/battery", methods=["GET"])
 def battery_view():
     """
@@ -1084,111 +1652,291 @@ def battery_view():
     The function supports three types of queries:
     1. If the 'all' query parameter is provided, it returns all entries.
     2. If the 'from' and 'to' query parameters are provided, it returns entries within the
-       specified timestamp range.
+       specified timestamp range (date, local time or ISO 8601 timestamp).
     3. If no query parameters are provided, it returns entries for the current day.
+
+    The optional 'resolution' parameter ('raw', 'hour', 'day', 'lttb') returns hourly/daily
+    buckets with mean, min and max or a LTTB downsampled series, 'max_points' limits the
+    number of returned points.
+
+    The JSON array is streamed in chunks, so long ranges are never held in memory at once.
+    The ETag is built from the telemetry generation (incremented when the writer committed new
+    points), the queried range (the default range changes at midnight), the resolution and
+    max_points. Unchanged data is answered with 304 Not Modified.
+    """
+    from_ts, to_ts, resolution, max_points = parse_battery_query()
+    if from_ts is False:
+        return jsonify([]), 200
+    if resolution is None:
+        return jsonify({"status": "error", "message": "Invalid resolution/max_points"}), 400
+    return conditional_response(
+        f"{ETAG_PREFIX}-{generations['telemetry']}-{from_ts}-{to_ts}-{resolution}-{max_points}",
+        lambda: Response(
+            json_array_chunks(downsample_client_data(from_ts, to_ts, resolution, max_points)),
+            200,
+            mimetype="application/json",
+        ),
+    )
+
+
+@app.route("/server/battery.csv", methods=["GET"])
+def battery_csv_view():
     """
-    client_data_db_read = reading_client_data()
-    # Format logs as plain text
-    today = datetime.datetime.now().strftime("%Y-%m-%d")
-    response_data = []
-    if request.args.get("all") is not None:
-        response_data = [
+    Exports battery data as CSV file, streamed in chunks. Supports the same query parameters as
+    /server/battery ('all', 'from'/'to', 'resolution', 'max_points').
+    """
+    from_ts, to_ts, resolution, max_points = parse_battery_query()
+    if resolution is None:
+        return jsonify({"status": "error", "message": "Invalid resolution/max_points"}), 400
+    fieldnames = ["timestamp", "battery_voltage", "rssi"]
+    if resolution in ("hour", "day") or (resolution == "raw" and max_points is not None):
+        fieldnames += [
+            "battery_voltage_min",
+            "battery_voltage_max",
+            "rssi_min",
+            "rssi_max",
+            "count",
+        ]
+    response_data = [] if from_ts is False else downsample_client_data(
+        from_ts, to_ts, resolution, max_points
+    )
+    return Response(
+        csv_chunks(response_data, fieldnames),
+        200,
+        mimetype="text/csv",
+        headers={"Content-Disposition": "attachment; filename=battery.csv"},
+    )
+
+
+@app.route("/server/cache", methods=["GET"])
+def cache_view():
+    """
+    Returns the counters of the footer render cache (entries, size, hits, misses, evictions)
+    and of the source image cache (downloads, not modified responses, file reads).
+    """
+    return (
+        jsonify(
             {
-                "timestamp": entry["timestamp"],
-                "battery_voltage": entry["battery_voltage"],
-                "rssi": entry["rssi"],
+                "render_cache": render_cache.stats(),
+                "source_cache": source_cache.stats(),
             }
-            for entry in client_data_db_read
-        ]
-    elif request.args.get("from") is not None and request.args.get("to") is not None:
+        ),
+        200,
+    )
 
-        from_timestamp = request.args.get("from")
-        to_timestamp = request.args.get("to")
-        if from_timestamp and to_timestamp:
-            response_data = [
-                {
-                    "timestamp": entry["timestamp"],
-                    "battery_voltage": entry["battery_voltage"],
-                    "rssi": entry["rssi"],
-                }
-                for entry in client_data_db_read
-                if from_timestamp <= entry["timestamp"] <= to_timestamp
-            ]
-    else:
-        response_data = [
+
+@app.route("/server/prerender", methods=["GET"])
+def prerender_view():
+    """
+    Returns the settings and statistics of the prerender scheduler (lead time, on-time/late
+    frames, render duration, next scheduled render).
+    """
+    return jsonify(prerender_scheduler.stats()), 200
+
+
+@app.route("/server/tls", methods=["GET"])
+def tls_view():
+    """
+    Returns the key type of the certificate and the session statistics of the SSL context
+    (full handshakes, resumed sessions from the cache, misses, timeouts).
+    """
+    context = tls_state["context"]
+    return (
+        jsonify(
             {
-                "timestamp": entry["timestamp"],
-                "battery_voltage": entry["battery_voltage"],
-                "rssi": entry["rssi"],
+                "key_type": tls_state["key_type"],
+                "num_tickets": context.num_tickets if context is not None else None,
+                "session_stats": context.session_stats() if context is not None else None,
             }
-            for entry in client_data_db_read
-            if entry["timestamp"].startswith(today)
-        ]
-    return jsonify(response_data), 200
+        ),
+        200,
+    )
 
 
-@app.route("/status", methods=["GET"])
-def get_status():
+@app.route("/server/writer", methods=["GET"])
+def writer_view():
     """
-    Retrieve the current status of the server and client.
+    Returns the settings and counters of the group commit writer (queued, written and dropped
+    entries, commits, fsyncs, backpressure).
+    """
+    return jsonify(writer.stats()), 200
 
-    This function gathers various metrics about the server's uptime, CPU load,
-    and current time. It also retrieves client data, including battery voltage,
-    WiFi signal strength, and the last contact timestamp. If the client data is
-    not available, it reads the last stored data from a file.
+
+@app.route("/metrics", methods=["GET"])
+def metrics_view():
+    """
+    Returns the metrics in the Prometheus text format: requests and latency per route and status,
+    device wake duration, footer render and image fetch time, writer commits, queue depths and
+    store sizes.
+    """
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+
+@app.route("/server/connections", methods=["GET"])
+def connections_view():
+    """
+    Returns the counters of the persistent connections (connections, requests, requests on an
+    already open connection, resumed TLS sessions, connections closed idle or at their limit).
+    """
+    return jsonify(KeepAliveHandler.connection_stats.stats()), 200
+
+
+def status_snapshot(system_sample=None):
     """
-    uptime_seconds = time.time() - start_time
+    Returns the current status of the server and client as dict, the payload of /status and of
+    the status events.
+
+    Server values, uptime and current time are those of the given or the latest sample of the
+    system sampler, so the snapshot only changes with a new sample or a client contact. If no
+    client data is available yet, the last stored data is read from the telemetry store.
+    """
+    if system_sample is None:
+        system_sample = system_sampler.latest()
+    uptime_seconds = max(0, system_sample["timestamp"] - start_time)
     uptime_timedelta = timedelta(seconds=uptime_seconds)
     uptime_str = str(uptime_timedelta).split(".", maxsplit=1)[0]  # Remove microseconds
-    cpu_load = psutil.cpu_percent(interval=1)
-    current_time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+    cpu_load = system_sample["cpu_percent"]
+    current_time = time.strftime(
+        "%Y-%m-%d %H:%M:%S", time.localtime(system_sample["timestamp"])
+    )
     # global client_data_db
     # client date are not available use last stored data from file
     if last_client_data["last_contact"] == 0:
-        client_data_db_read = reading_client_data()
-        try:
-            last_client_data["battery_voltage"] = client_data_db_read[-1][
-                "battery_voltage"
-            ]
-            last_client_data["rssi"] = client_data_db_read[-1]["rssi"]
-            last_client_data["last_contact"] = client_data_db_read[-1]["timestamp"]
-        except (IndexError, KeyError):
+        last_stored = telemetry_store.last()
+        if last_stored is not None:
+            (
+                last_client_data["last_contact"],
+                last_client_data["battery_voltage"],
+                last_client_data["rssi"],
+            ) = last_stored
+        else:
             last_client_data["battery_voltage"] = 0
             last_client_data["rssi"] = 0
             last_client_data["last_contact"] = 1735686000
 
-    return jsonify(
-        {
-            "server": {
-                "uptime": uptime_str,
-                "cpu_load": round(cpu_load, 1),
-                "current_time": current_time,
-            },
-            "client": {
-                "battery_voltage": round(last_client_data["battery_voltage"], 2),
-                "battery_voltage_max": config_manager.config["battery_max_voltage"],
-                "battery_voltage_min": config_manager.config["battery_min_voltage"],
-                "battery_state": get_battery_state(last_client_data["battery_voltage"]),
-                "wifi_signal": last_client_data["rssi"],
-                "wifi_signal_strength": get_wifi_signal_strength(
-                    last_client_data["rssi"]
-                ),
-                "refresh_time": last_client_data["refresh_rate"],
-                "last_contact": last_client_data["last_contact"],
-                "current_image_url": global_state["image"]["current_image_url"],
-                "current_image_url_adapted": global_state["image"][
-                    "current_image_url_adapted"
-                ],
-            },
-            "client_data_db": [
-                {
-                    "battery_voltage": entry["battery_voltage"],
-                    "rssi": entry["rssi"],
-                    "timestamp": entry["timestamp"],
-                }
-                for entry in client_data_db
-            ],
-        }
+    return {
+        "server": {
+            "uptime": uptime_str,
+            "cpu_load": round(cpu_load, 1),
+            "current_time": current_time,
+            "sample_timestamp": system_sample["timestamp"],
+            "memory_percent": system_sample["memory_percent"],
+            "process_rss": system_sample["process_rss"],
+            "open_sockets": system_sample["open_sockets"],
+        },
+        "client": {
+            "battery_voltage": round(last_client_data["battery_voltage"], 2),
+            "battery_voltage_max": config_manager.config["battery_max_voltage"],
+            "battery_voltage_min": config_manager.config["battery_min_voltage"],
+            "battery_state": get_battery_state(last_client_data["battery_voltage"]),
+            "wifi_signal": last_client_data["rssi"],
+            "wifi_signal_strength": get_wifi_signal_strength(last_client_data["rssi"]),
+            "refresh_time": last_client_data["refresh_rate"],
+            "last_contact": last_client_data["last_contact"],
+            "current_image_url": global_state["image"]["current_image_url"],
+            "current_image_url_adapted": global_state["image"]["current_image_url_adapted"],
+        },
+        "client_data_db": [
+            {
+                "battery_voltage": entry["battery_voltage"],
+                "rssi": entry["rssi"],
+                "timestamp": entry["timestamp"],
+            }
+            for entry in client_data_db
+        ],
+    }
+
+
+def publish_status(system_sample):
+    """
+    Publishes a status snapshot with every new sample of the system sampler, only if a
+    dashboard is subscribed.
+    """
+    if event_bus.has_subscribers():
+        event_bus.publish("status", status_snapshot(system_sample))
+
+
+system_sampler.on_sample = publish_status
+
+
+@app.route("/status", methods=["GET"])
+def get_status():
+    """
+    Retrieve the current status of the server and client.
+
+    This function gathers various metrics about the server's uptime, CPU load,
+    and current time. It also retrieves client data, including battery voltage,
+    WiFi signal strength, and the last contact timestamp.
+
+    The ETag is built from the timestamp of the latest system sample and the client, telemetry
+    and config generations, an unchanged status is answered with 304 Not Modified.
+    """
+    system_sample = system_sampler.latest()
+    etag = (
+        f"{ETAG_PREFIX}-{system_sample['timestamp']}-{generations['client']}-"
+        f"{generations['telemetry']}-{config_manager.generation}"
+    )
+    return conditional_response(etag, lambda: jsonify(status_snapshot(system_sample)))
+
+
+@app.route("/events", methods=["GET"])
+def events_view():
+    """
+    Server-Sent Events stream for the web dashboard.
+
+    The stream starts with a status snapshot and then pushes the events of the event bus:
+    'contact' (client status of a device contact), 'telemetry' (new battery/RSSI point), 'log'
+    (new server log line) and 'status' (snapshot with every system sample). Without events a
+    keep-alive comment is sent every EVENTS_HEARTBEAT seconds, which also detects closed
+    connections. Answers 503 if EVENTS_MAX_SUBSCRIBERS streams are already open.
+    """
+    subscription = event_bus.subscribe()
+    if subscription is None:
+        return jsonify({"status": "error", "message": "Too many event subscribers"}), 503
+    first_message = f"retry: {EVENTS_RETRY}\n\n" + format_event("status", status_snapshot())
+
+    def stream():
+        try:
+            yield first_message
+            while True:
+                messages = subscription.get(timeout=EVENTS_HEARTBEAT)
+                yield "".join(messages) if messages else ": keep-alive\n\n"
+        finally:
+            event_bus.unsubscribe(subscription)
+
+    return Response(
+        stream(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/server/events", methods=["GET"])
+def events_stats_view():
+    """
+    Returns the number of open /events streams, their queued events and the counters of the
+    event bus (published, delivered, dropped for slow streams, rejected streams).
+    """
+    return jsonify(event_bus.stats()), 200
+
+
+@app.route("/status/history", methods=["GET"])
+def get_status_history():
+    """
+    Returns the recent window of sampled server metrics (CPU, memory, open sockets, process).
+
+    The optional query parameter 'seconds' limits the response to the samples of the last
+    seconds.
+    """
+    seconds = request.args.get("seconds", type=int)
+    return (
+        jsonify(
+            {
+                "interval": system_sampler.interval,
+                "samples": system_sampler.history(seconds),
+            }
+        ),
+        200,
     )
 
 
@@ -1232,9 +1980,9 @@ def handle_exit(signum, frame):
         + "' !"
     )
     print("Signal received, persisting logs and client data...")
-    persist_log()
-    persist_client_data()
-    persist_client_log_data()
+    writer.close()
+    access_log.stop()
+    log_listener.stop()
     print("Data persisted. Exiting...")
     sys.exit(0)
 
@@ -1294,15 +2042,24 @@ class SSLRequestHandler(WSGIRequestHandler):
 #     app.run(host='0.0.0.0', port=SERVER_PORT, ssl_context=context, debug=False)
 
 
-def generate_self_signed_cert(cert_file, key_file, server_ip):
+def generate_self_signed_cert(cert_file, key_file, server_ip, key_type="rsa"):
     """
     Generate a self-signed certificate and key using the cryptography library.
+    The key is RSA 4096 ('rsa') or ECDSA P-256 ('ecdsa'), the latter is much faster to generate
+    and makes every full TLS handshake cheaper for the server and the device.
+    Both files are written to temporary files first and then replace the existing ones, so a
+    failure leaves an existing certificate and key untouched.
     """
     # Generate key
-    key = rsa.generate_private_key(
-        public_exponent=65537,
-        key_size=4096,
-    )
+    if key_type == "ecdsa":
+        key = ec.generate_private_key(ec.SECP256R1())
+    elif key_type == "rsa":
+        key = rsa.generate_private_key(
+            public_exponent=65537,
+            key_size=4096,
+        )
+    else:
+        raise ValueError(f"unknown ssl_key_type '{key_type}'")
 
     # Generate cert
     subject = issuer = x509.Name(
@@ -1343,16 +2100,64 @@ def generate_self_signed_cert(cert_file, key_file, server_ip):
     os.makedirs(os.path.dirname(cert_file), exist_ok=True)
 
     # Write to disk
-    with open(key_file, "wb") as f:
-        f.write(
+    contents = (
+        (
+            key_file,
             key.private_bytes(
                 encoding=serialization.Encoding.PEM,
                 format=serialization.PrivateFormat.TraditionalOpenSSL,
                 encryption_algorithm=serialization.NoEncryption(),
+            ),
+        ),
+        (cert_file, cert.public_bytes(serialization.Encoding.PEM)),
+    )
+    temp_files = []
+    try:
+        for path, content in contents:
+            # mkstemp creates the file readable by the owner only
+            file_descriptor, temp_file = tempfile.mkstemp(
+                prefix=".", suffix=".pem", dir=os.path.dirname(path)
             )
-        )
-    with open(cert_file, "wb") as f:
-        f.write(cert.public_bytes(serialization.Encoding.PEM))
+            temp_files.append(temp_file)
+            with os.fdopen(file_descriptor, "wb") as f:
+                f.write(content)
+        for (path, _), temp_file in zip(contents, temp_files):
+            os.replace(temp_file, path)
+    finally:
+        for temp_file in temp_files:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+
+
+def get_key_type(key_file):
+    """
+    Returns the type of the private key in key_file ('rsa', 'ecdsa') or None if it cannot be
+    read.
+    """
+    try:
+        with open(key_file, "rb") as f:
+            key = serialization.load_pem_private_key(f.read(), password=None)
+    except (OSError, ValueError, TypeError):
+        return None
+    if isinstance(key, rsa.RSAPrivateKey):
+        return "rsa"
+    if isinstance(key, ec.EllipticCurvePrivateKey):
+        return "ecdsa"
+    return None
+
+
+def create_ssl_context(cert_file, key_file):
+    """
+    Create the server SSL context with session resumption: TLS 1.3 session tickets and the
+    server side session cache (TLS 1.2), so a returning device skips the full handshake.
+    """
+    context = SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(certfile=cert_file, keyfile=key_file)
+    context.options &= ~ssl.Options.OP_NO_TICKET
+    context.num_tickets = TLS_NUM_TICKETS
+    tls_state["context"] = context
+    tls_state["key_type"] = get_key_type(key_file)
+    return context
 
 
 if __name__ == "__main__":
@@ -1361,12 +2166,28 @@ if __name__ == "__main__":
     cert_file = os.path.join(current_dir, "ssl/cert.pem")
     key_file = os.path.join(current_dir, "ssl/key.pem")
 
-    if not os.path.exists(cert_file) or not os.path.exists(key_file):
+    ssl_key_type = config_manager.config["ssl_key_type"]
+    certificate_exists = os.path.exists(cert_file) and os.path.exists(key_file)
+    if ssl_key_type not in SSL_KEY_TYPES:
+        # an invalid setting must never replace a working certificate
+        logger.error("[Main] invalid ssl_key_type '%s', keeping the certificate", ssl_key_type)
+        ssl_key_type = "rsa"
+        regenerate = not certificate_exists
+    elif not certificate_exists:
         logger.debug("[Main] cert.pem and key.pem not found, generating new ones")
+        regenerate = True
+    else:
+        regenerate = get_key_type(key_file) not in (ssl_key_type, None)
+        if regenerate:
+            logger.info(
+                "[Main] ssl_key_type changed to %s, generating new certificate", ssl_key_type
+            )
+    if regenerate:
         try:
-            generate_self_signed_cert(cert_file, key_file, server_ip)
+            generate_self_signed_cert(cert_file, key_file, server_ip, ssl_key_type)
         except Exception as e:
             logger.error(f"[Main] Failed to generate certificates: {e}")
+        if not os.path.exists(cert_file) or not os.path.exists(key_file):
             # Fallback to openssl if cryptography fails for some reason
             os.system(
                 f"openssl req -x509 -newkey rsa:4096 -keyout {key_file} -out {cert_file} "
@@ -1375,9 +2196,18 @@ if __name__ == "__main__":
             )
 
     # Run HTTPS server on port SERVER_PORT
-    context = SSLContext(ssl.PROTOCOL_TLS_SERVER)
-    context.load_cert_chain(certfile=cert_file, keyfile=key_file)
+    context = create_ssl_context(cert_file, key_file)
+    prerender_scheduler.start()
+    system_sampler.start()
+    config_manager.watch(CONFIG_WATCH_INTERVAL)
+    # build the telemetry rollups in the background, the first wide battery query is fast
+    threading.Thread(target=telemetry_store.build_rollups, daemon=True).start()
     logger.debug("[Main] Starting the server with gevent and SSL")
+    http_port = config_manager.config["http_port"]
+    if http_port:
+        # plain HTTP listener for a trusted LAN, same app and state as the HTTPS listener
+        logger.info("[Main] Serving plain HTTP on port %s", http_port)
+        QuietWSGIServer(("0.0.0.0", http_port), app, log=None, error_log=logger).start()
     http_server = QuietWSGIServer(
         ("0.0.0.0", SERVER_PORT), app, ssl_context=context, log=None, error_log=logger
     )